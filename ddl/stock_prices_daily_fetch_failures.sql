@@ -0,0 +1,13 @@
+-- Per-code fetch failure record (no-data responses) with retry back-off.
+DROP TABLE IF EXISTS `stock_prices_daily_fetch_failures`;
+CREATE TABLE `stock_prices_daily_fetch_failures` (
+    code VARCHAR(8) NOT NULL,
+    failure_count INT NOT NULL,
+    next_retry_date DATE NOT NULL,
+    last_reason VARCHAR(64) NOT NULL,
+    first_failed_at DATETIME NOT NULL,
+    last_failed_at DATETIME NOT NULL,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    PRIMARY KEY (code),
+    KEY idx_next_retry_date (next_retry_date)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
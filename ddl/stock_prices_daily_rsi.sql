@@ -5,6 +5,10 @@ CREATE TABLE `stock_prices_daily_rsi` (
     code VARCHAR(12) NOT NULL,
     `window` INT NOT NULL DEFAULT 14,
     rsi DOUBLE,
+    -- 差分計算を続けるためのWilder平滑化の状態（その日時点の平均上昇幅・平均下落幅・終値）
+    avg_gain DOUBLE,
+    avg_loss DOUBLE,
+    close_price DOUBLE,
     created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
     PRIMARY KEY (trade_date, code, `window`),
@@ -0,0 +1,14 @@
+-- Exchange calendar, one row per calendar day (generated by scripts/build_trading_calendar.py).
+-- business_day_seq counts business days up to and including cal_date, so a holiday
+-- shares the sequence number of the business day before it.
+DROP TABLE IF EXISTS `trading_calendar`;
+CREATE TABLE `trading_calendar` (
+  `cal_date` DATE NOT NULL,
+  `is_business_day` TINYINT(1) NOT NULL,
+  `business_day_seq` INT NOT NULL,
+  `prev_business_date` DATE NULL,
+  `next_business_date` DATE NULL,
+  `updated_at` TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+  PRIMARY KEY (`cal_date`),
+  KEY `idx_trading_calendar_seq` (`is_business_day`, `business_day_seq`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
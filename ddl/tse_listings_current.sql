@@ -0,0 +1,17 @@
+-- Latest listing row per code (maintained by scripts/fetch_tse_list.py).
+DROP TABLE IF EXISTS `tse_listings_current`;
+CREATE TABLE `tse_listings_current` (
+  `code` VARCHAR(8) NOT NULL,
+  `listing_date` DATE NOT NULL,
+  `name` VARCHAR(255) NOT NULL,
+  `market` VARCHAR(255) NOT NULL,
+  `sector33_code` VARCHAR(16) NOT NULL,
+  `sector33_name` VARCHAR(255) NOT NULL,
+  `sector17_code` VARCHAR(16) NOT NULL,
+  `sector17_name` VARCHAR(255) NOT NULL,
+  `scale_code` VARCHAR(16) NOT NULL,
+  `scale_name` VARCHAR(255) NOT NULL,
+  `updated_at` TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+  PRIMARY KEY (`code`),
+  KEY `idx_tse_listings_current_market` (`market`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
@@ -3,7 +3,7 @@ from datetime import timedelta
 from django.db import connection
 from django.shortcuts import render
 
-from .common import calculate_exchange_business_days
+from .common import build_gap_day_labels, fetch_business_day_set
 
 
 def stock_price_chart(request, code):
@@ -80,8 +80,7 @@ def stock_price_chart(request, code):
     if rows:
         start_date = rows[0][0]
         end_date = rows[-1][0]
-        business_days = calculate_exchange_business_days(start_date, end_date)
-        business_day_set = set(business_days)
+        business_day_set = fetch_business_day_set(start_date, end_date)
         filtered_rows = [row for row in rows if row[0] in business_day_set]
 
     for trade_date, open_price, high_price, low_price, close_price, ma5, ma25 in filtered_rows:
@@ -123,13 +122,9 @@ def stock_price_chart(request, code):
 
             week_start += timedelta(days=7)
 
-        current = start_date
-        while current <= end_date:
-            if current not in business_day_set:
-                non_business_day_labels.append(current.strftime('%Y-%m-%d'))
-            elif current not in chart_day_set:
-                missing_plot_day_labels.append(current.strftime('%Y-%m-%d'))
-            current += timedelta(days=1)
+        non_business_day_labels, missing_plot_day_labels = build_gap_day_labels(
+            start_date, end_date, business_day_set, chart_day_set
+        )
 
     return render(
         request,
@@ -3,7 +3,7 @@ from datetime import timedelta
 from django.db import connection
 from django.shortcuts import render
 
-from .common import calculate_exchange_business_days, shift_exchange_business_day
+from .common import build_gap_day_labels, fetch_business_day_set, shift_exchange_business_day
 
 
 def stock_xgb_forecast_chart(request, code):
@@ -126,8 +126,7 @@ def stock_xgb_forecast_chart(request, code):
     if price_rows:
         start_date = price_rows[0][0]
         end_date = price_rows[-1][0]
-        business_days = calculate_exchange_business_days(start_date, end_date)
-        business_day_set = set(business_days)
+        business_day_set = fetch_business_day_set(start_date, end_date)
         filtered_price_rows = [row for row in price_rows if row[0] in business_day_set]
 
     for trade_date, open_price, high_price, low_price, close_price, ma5, ma25 in filtered_price_rows:
@@ -176,8 +175,7 @@ def stock_xgb_forecast_chart(request, code):
             timeline_end = future_end
 
     if timeline_start is not None and timeline_end is not None:
-        business_days = calculate_exchange_business_days(timeline_start, timeline_end)
-        business_day_set = set(business_days)
+        business_day_set = fetch_business_day_set(timeline_start, timeline_end)
 
         price_day_set = {row[0] for row in filtered_price_rows}
         forecast_day_set = set()
@@ -214,13 +212,9 @@ def stock_xgb_forecast_chart(request, code):
 
             week_start += timedelta(days=7)
 
-        current = timeline_start
-        while current <= timeline_end:
-            if current not in business_day_set:
-                non_business_day_labels.append(current.strftime("%Y-%m-%d"))
-            elif current not in visible_day_set:
-                missing_plot_day_labels.append(current.strftime("%Y-%m-%d"))
-            current += timedelta(days=1)
+        non_business_day_labels, missing_plot_day_labels = build_gap_day_labels(
+            timeline_start, timeline_end, business_day_set, visible_day_set
+        )
 
     return render(
         request,
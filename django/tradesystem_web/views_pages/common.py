@@ -1,11 +1,21 @@
+import logging
 import sys
 from pathlib import Path
 
+import numpy as np
+from django.db import DatabaseError, connection
+
 COMMON_DIR = Path(__file__).resolve().parents[3] / 'scripts' / 'common'
 if str(COMMON_DIR) not in sys.path:
     sys.path.append(str(COMMON_DIR))
 
-from exchange_calendar import calculate_exchange_business_days, shift_exchange_business_day
+from exchange_calendar import (
+    calculate_exchange_business_days,
+    shift_exchange_business_day,
+    shift_exchange_business_days,
+)
+
+logger = logging.getLogger(__name__)
 
 
 def format_market_label(market):
@@ -20,3 +30,54 @@ def format_market_label(market):
         .replace('（内国株式）', '（内）')
         .replace('（外国株式）', '（外）')
     )
+
+
+def fetch_business_day_set(start_date, end_date):
+    """期間内（両端含む）の営業日の集合を返す。
+
+    trading_calendar（scripts/build_trading_calendar.py で生成）が期間の全暦日を
+    持っていればそこから取得し、未作成・期間不足の場合は取引所カレンダーで算出する。
+    どちらも scripts/common/exchange_calendar.py の休場日定義に基づく。
+    """
+    rows = []
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT cal_date, is_business_day
+                FROM trading_calendar
+                WHERE cal_date BETWEEN %s AND %s
+                """,
+                [start_date, end_date],
+            )
+            rows = cursor.fetchall()
+    except DatabaseError:
+        logger.warning(
+            'trading_calendar を参照できないため営業日を算出します: %s〜%s',
+            start_date,
+            end_date,
+            exc_info=True,
+        )
+        return set(calculate_exchange_business_days(start_date, end_date))
+
+    if len(rows) == (end_date - start_date).days + 1:
+        return {cal_date for cal_date, is_business_day in rows if is_business_day}
+    logger.warning(
+        'trading_calendar が期間を網羅していないため営業日を算出します: %s〜%s',
+        start_date,
+        end_date,
+    )
+    return set(calculate_exchange_business_days(start_date, end_date))
+
+
+def build_gap_day_labels(start_date, end_date, business_day_set, plotted_day_set):
+    """期間内の休場日ラベルと、営業日なのに描画データがない日のラベルを返す。"""
+    days = np.arange(np.datetime64(start_date, 'D'), np.datetime64(end_date, 'D') + 1)
+    business_days = np.array(list(business_day_set), dtype='datetime64[D]')
+    plotted_days = np.array(list(plotted_day_set), dtype='datetime64[D]')
+    is_business_day = np.isin(days, business_days)
+    is_plotted = np.isin(days, plotted_days)
+    labels = np.datetime_as_string(days, unit='D')
+    non_business_day_labels = labels[~is_business_day].tolist()
+    missing_plot_day_labels = labels[is_business_day & ~is_plotted].tolist()
+    return non_business_day_labels, missing_plot_day_labels
@@ -59,17 +59,7 @@ def _rankings_arima_forecast_rate(request, direction):
                 f.predicted_close,
                 ((f.predicted_close - d.`close`) / d.`close`) * 100 AS forecast_rate
             FROM stock_prices_daily_arima_forecast f
-            JOIN (
-                SELECT t.code, t.name, t.market
-                FROM tse_listings t
-                JOIN (
-                    SELECT code, MAX(listing_date) AS latest_listing_date
-                    FROM tse_listings
-                    GROUP BY code
-                ) latest
-                  ON latest.code = t.code
-                 AND latest.latest_listing_date = t.listing_date
-            ) l ON l.code = f.code
+            JOIN tse_listings_current l ON l.code = f.code
             LEFT JOIN stock_prices_daily d
               ON d.code = f.code
              AND d.trade_date = f.forecast_base_date
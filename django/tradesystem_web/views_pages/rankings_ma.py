@@ -54,17 +54,7 @@ def _rankings_ma_estimate(request, direction):
                 l.name,
                 l.market
             FROM stock_prices_daily_ma m
-            JOIN (
-                SELECT t.code, t.name, t.market
-                FROM tse_listings t
-                JOIN (
-                    SELECT code, MAX(listing_date) AS latest_listing_date
-                    FROM tse_listings
-                    GROUP BY code
-                ) latest
-                  ON latest.code = t.code
-                 AND latest.latest_listing_date = t.listing_date
-            ) l ON l.code = m.code
+            JOIN tse_listings_current l ON l.code = m.code
             WHERE m.trade_date = %s
               AND m.ma5 IS NOT NULL
               AND m.ma25 IS NOT NULL
@@ -73,17 +73,7 @@ def _rankings_macd(request, direction):
                 l.name,
                 l.market
             FROM stock_prices_daily_macd m
-            JOIN (
-                SELECT t.code, t.name, t.market
-                FROM tse_listings t
-                JOIN (
-                    SELECT code, MAX(listing_date) AS latest_listing_date
-                    FROM tse_listings
-                    GROUP BY code
-                ) latest
-                  ON latest.code = t.code
-                 AND latest.latest_listing_date = t.listing_date
-            ) l ON l.code = m.code
+            JOIN tse_listings_current l ON l.code = m.code
             WHERE m.trade_date = %s
               AND m.window_short = %s
               AND m.window_long = %s
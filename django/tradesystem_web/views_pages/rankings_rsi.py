@@ -61,17 +61,7 @@ def _rankings_rsi(request, direction):
                 l.name,
                 l.market
             FROM stock_prices_daily_rsi r
-            JOIN (
-                SELECT t.code, t.name, t.market
-                FROM tse_listings t
-                JOIN (
-                    SELECT code, MAX(listing_date) AS latest_listing_date
-                    FROM tse_listings
-                    GROUP BY code
-                ) latest
-                  ON latest.code = t.code
-                 AND latest.latest_listing_date = t.listing_date
-            ) l ON l.code = r.code
+            JOIN tse_listings_current l ON l.code = r.code
             WHERE r.trade_date = %s
               AND r.`window` = %s
               AND r.rsi IS NOT NULL
@@ -72,17 +72,7 @@ def _rankings_xgb_forecast_rate(request, direction):
                 x.actual_return,
                 (x.predicted_return * 100) AS forecast_rate
             FROM stock_prices_daily_xgb_forecast x
-            JOIN (
-                SELECT t.code, t.name, t.market
-                FROM tse_listings t
-                JOIN (
-                    SELECT code, MAX(listing_date) AS latest_listing_date
-                    FROM tse_listings
-                    GROUP BY code
-                ) latest
-                  ON latest.code = t.code
-                 AND latest.latest_listing_date = t.listing_date
-            ) l ON l.code = x.code
+            JOIN tse_listings_current l ON l.code = x.code
             WHERE x.trade_date = %s
               AND x.horizon = %s
               AND x.model_version = %s
@@ -3,7 +3,7 @@ from django.core.paginator import Paginator
 from django.db import connection
 from django.shortcuts import render
 
-from .common import format_market_label, shift_exchange_business_day
+from .common import format_market_label, shift_exchange_business_days
 
 
 def results_arima_forecast(request):
@@ -30,30 +30,14 @@ def results_arima_forecast(request):
 
     latest_base_date = latest_base_date_row[0] if latest_base_date_row else None
 
-    header_h1_date = (
-        shift_exchange_business_day(latest_base_date, 1)
+    # h1〜h5 の見出し日付を1回の配列演算で求める
+    header_dates = (
+        shift_exchange_business_days(latest_base_date, range(1, 6)).tolist()
         if latest_base_date is not None
-        else None
+        else [None] * 5
     )
-    header_h2_date = (
-        shift_exchange_business_day(latest_base_date, 2)
-        if latest_base_date is not None
-        else None
-    )
-    header_h3_date = (
-        shift_exchange_business_day(latest_base_date, 3)
-        if latest_base_date is not None
-        else None
-    )
-    header_h4_date = (
-        shift_exchange_business_day(latest_base_date, 4)
-        if latest_base_date is not None
-        else None
-    )
-    header_h5_date = (
-        shift_exchange_business_day(latest_base_date, 5)
-        if latest_base_date is not None
-        else None
+    header_h1_date, header_h2_date, header_h3_date, header_h4_date, header_h5_date = (
+        header_dates
     )
 
     cache_key = (
@@ -99,17 +83,7 @@ def results_arima_forecast(request):
                         MAX(CASE WHEN f.horizon = 4 THEN f.predicted_close END) AS h4_close,
                         MAX(CASE WHEN f.horizon = 5 THEN f.target_trade_date END) AS h5_trade_date,
                         MAX(CASE WHEN f.horizon = 5 THEN f.predicted_close END) AS h5_close
-                    FROM (
-                        SELECT t.code, t.name, t.market
-                        FROM tse_listings t
-                        JOIN (
-                            SELECT code, MAX(listing_date) AS latest_listing_date
-                            FROM tse_listings
-                            GROUP BY code
-                        ) latest
-                          ON latest.code = t.code
-                         AND latest.latest_listing_date = t.listing_date
-                    ) l
+                    FROM tse_listings_current l
                     LEFT JOIN stock_prices_daily_arima_forecast f
                       ON f.code = l.code
                      AND f.forecast_base_date = %s
@@ -145,17 +119,7 @@ def results_arima_forecast(request):
                         NULL AS h4_close,
                         NULL AS h5_trade_date,
                         NULL AS h5_close
-                    FROM (
-                        SELECT t.code, t.name, t.market
-                        FROM tse_listings t
-                        JOIN (
-                            SELECT code, MAX(listing_date) AS latest_listing_date
-                            FROM tse_listings
-                            GROUP BY code
-                        ) latest
-                          ON latest.code = t.code
-                         AND latest.latest_listing_date = t.listing_date
-                    ) l
+                    FROM tse_listings_current l
                     WHERE 1 = 1
                 """
                 params = []
@@ -3,7 +3,7 @@ from django.core.paginator import Paginator
 from django.db import connection
 from django.shortcuts import render
 
-from .common import shift_exchange_business_day, format_market_label
+from .common import shift_exchange_business_days, format_market_label
 
 
 def results_xgb_forecast(request):
@@ -33,30 +33,14 @@ def results_xgb_forecast(request):
     latest_trade_date = latest_row[0] if latest_row else None
     latest_model_version = latest_row[1] if latest_row else None
 
-    header_h1_date = (
-        shift_exchange_business_day(latest_trade_date, 1)
+    # h1〜h5 の見出し日付を1回の配列演算で求める
+    header_dates = (
+        shift_exchange_business_days(latest_trade_date, range(1, 6)).tolist()
         if latest_trade_date is not None
-        else None
+        else [None] * 5
     )
-    header_h2_date = (
-        shift_exchange_business_day(latest_trade_date, 2)
-        if latest_trade_date is not None
-        else None
-    )
-    header_h3_date = (
-        shift_exchange_business_day(latest_trade_date, 3)
-        if latest_trade_date is not None
-        else None
-    )
-    header_h4_date = (
-        shift_exchange_business_day(latest_trade_date, 4)
-        if latest_trade_date is not None
-        else None
-    )
-    header_h5_date = (
-        shift_exchange_business_day(latest_trade_date, 5)
-        if latest_trade_date is not None
-        else None
+    header_h1_date, header_h2_date, header_h3_date, header_h4_date, header_h5_date = (
+        header_dates
     )
 
     cache_key = (
@@ -81,17 +65,7 @@ def results_xgb_forecast(request):
                         MAX(CASE WHEN x.horizon = 3 THEN x.predicted_close END) AS h3_close,
                         MAX(CASE WHEN x.horizon = 4 THEN x.predicted_close END) AS h4_close,
                         MAX(CASE WHEN x.horizon = 5 THEN x.predicted_close END) AS h5_close
-                    FROM (
-                        SELECT t.code, t.name, t.market
-                        FROM tse_listings t
-                        JOIN (
-                            SELECT code, MAX(listing_date) AS latest_listing_date
-                            FROM tse_listings
-                            GROUP BY code
-                        ) latest
-                          ON latest.code = t.code
-                         AND latest.latest_listing_date = t.listing_date
-                    ) l
+                    FROM tse_listings_current l
                     LEFT JOIN stock_prices_daily_xgb_forecast x
                       ON x.code = l.code
                      AND x.trade_date = %s
@@ -125,17 +99,7 @@ def results_xgb_forecast(request):
                         NULL AS h3_close,
                         NULL AS h4_close,
                         NULL AS h5_close
-                    FROM (
-                        SELECT t.code, t.name, t.market
-                        FROM tse_listings t
-                        JOIN (
-                            SELECT code, MAX(listing_date) AS latest_listing_date
-                            FROM tse_listings
-                            GROUP BY code
-                        ) latest
-                          ON latest.code = t.code
-                         AND latest.latest_listing_date = t.listing_date
-                    ) l
+                    FROM tse_listings_current l
                     WHERE 1 = 1
                 """
                 params = []
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""MySQLドライバ（mysqlclient / PyMySQL）の行デコード性能を比較する。"""
+
+import argparse
+import logging
+import time
+from typing import List, Tuple
+
+from common.db import available_drivers, get_connection, load_driver
+from common.logger import get_logger
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="同じ結果セットを各ドライバで読み込み、rows/secを比較する。"
+    )
+    parser.add_argument("--table", default="stock_prices_daily")
+    parser.add_argument("--rows", type=int, default=200000, help="読み込む行数。")
+    parser.add_argument(
+        "--repeat", type=int, default=3, help="各条件の試行回数（最良値を採用）。"
+    )
+    parser.add_argument(
+        "--drivers",
+        default="",
+        help="比較するドライバをカンマ区切りで指定（mysqldb,pymysql）。"
+        "省略時は導入済みの全ドライバ。",
+    )
+    return parser.parse_args()
+
+
+def read_rows(
+    driver: str, sql: str, rows: int, decimal_as_float: bool, streaming: bool
+) -> Tuple[float, int]:
+    # 接続確立を除いた、クエリ実行から全行のデコード完了までの時間を計測する
+    conn = get_connection(decimal_as_float=decimal_as_float, driver=driver)
+    try:
+        cursor_class = load_driver(driver).ss_cursor if streaming else None
+        started = time.perf_counter()
+        count = 0
+        with conn.cursor(cursor_class) as cursor:
+            cursor.execute(sql, (rows,))
+            if streaming:
+                while True:
+                    batch = cursor.fetchmany(5000)
+                    if not batch:
+                        break
+                    count += len(batch)
+            else:
+                count = len(cursor.fetchall())
+        return time.perf_counter() - started, count
+    finally:
+        conn.close()
+
+
+def main() -> None:
+    args = parse_args()
+    logger = get_logger("bench_db_drivers", level=logging.INFO)
+
+    if args.rows <= 0 or args.repeat <= 0:
+        raise ValueError("--rows と --repeat は1以上を指定してください。")
+    drivers: List[str] = (
+        [name.strip() for name in args.drivers.split(",") if name.strip()]
+        if args.drivers
+        else available_drivers()
+    )
+    logger.info("比較対象ドライバ: %s", ", ".join(drivers))
+
+    sql = f"""
+        SELECT trade_date, code, `open`, high, low, `close`, volume
+        FROM `{args.table}`
+        LIMIT %s
+    """
+    for streaming in (False, True):
+        for decimal_as_float in (False, True):
+            for driver in drivers:
+                best = None
+                count = 0
+                for _ in range(args.repeat):
+                    elapsed, count = read_rows(
+                        driver, sql, args.rows, decimal_as_float, streaming
+                    )
+                    best = elapsed if best is None else min(best, elapsed)
+                logger.info(
+                    "%-8s cursor=%-9s decimal=%-7s 行数=%d 所要=%.3fs rows/sec=%.0f",
+                    driver,
+                    "streaming" if streaming else "buffered",
+                    "float" if decimal_as_float else "Decimal",
+                    count,
+                    best,
+                    count / best if best else 0.0,
+                )
+
+
+if __name__ == "__main__":
+    main()
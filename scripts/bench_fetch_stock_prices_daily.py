@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""日足株価取得のスループットをローカルスタブサーバーで計測する。"""
+
+import argparse
+import logging
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import List, Sequence, Tuple
+
+from common.logger import get_logger
+from common.rate_limiter import TokenBucket
+from fetch_stock_prices_daily import (
+    IngestTask,
+    create_session,
+    fetch_delta_batch,
+    fetch_single,
+    split_delta_tasks,
+)
+from yahoo_chart_stub_server import StubConfig, chart_url_for, spark_url_for, start_server
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="fetch_stock_prices_daily.py の取得処理をスタブサーバーに対して計測する。"
+    )
+    parser.add_argument("--code-count", type=int, default=200)
+    parser.add_argument(
+        "--workers",
+        default="1,4,8",
+        help="計測するワーカー数をカンマ区切りで指定。",
+    )
+    parser.add_argument("--rate", type=float, default=0.0, help="0以下で制限なし。")
+    parser.add_argument("--burst", type=float, default=5.0)
+    parser.add_argument("--timeout", type=int, default=30)
+    parser.add_argument(
+        "--chart-url",
+        default="",
+        help="起動済みスタブサーバーのURL。省略時は内蔵サーバーを起動する。",
+    )
+    parser.add_argument("--spark-url", default="")
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=0,
+        help="1以上で差分取得（複数銘柄まとめ取得）を計測する。",
+    )
+    parser.add_argument("--spark-close-only", action="store_true")
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--rate-429", type=float, default=0.0)
+    parser.add_argument("--bars", type=int, default=250)
+    parser.add_argument(
+        "--full-history",
+        action="store_true",
+        help="period1=0 の全期間取得として計測する（省略時は直近10日分）。",
+    )
+    return parser.parse_args()
+
+
+def percentile(values: Sequence[float], ratio: float) -> float:
+    # 最近傍順位法でパーセンタイルを求める
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, math.ceil(ratio * len(ordered)) - 1))
+    return ordered[index]
+
+
+def run_once(
+    tasks: List[IngestTask],
+    workers: int,
+    args: argparse.Namespace,
+    chart_url: str,
+    spark_url: str,
+    logger,
+) -> Tuple[float, int, List[float]]:
+    session = create_session(workers)
+    limiter = TokenBucket(args.rate, args.burst) if args.rate > 0 else None
+    fetch_options = {
+        "timeout": args.timeout,
+        "logger": logger,
+        "session": session,
+        "limiter": limiter,
+        "chart_url": chart_url,
+        "spark_url": spark_url,
+    }
+
+    def timed_fetch(batch: List[IngestTask]) -> Tuple[int, List[float]]:
+        # 差分取得で揃わなかった銘柄の個別取得も含めて1銘柄あたりの所要時間とする
+        started = time.perf_counter()
+        if len(batch) == 1 and args.batch_size <= 0:
+            results, fallback = fetch_single(batch[0], **fetch_options)
+        else:
+            results, fallback = fetch_delta_batch(batch, **fetch_options)
+        for task in fallback:
+            more, _ = fetch_single(task, **fetch_options)
+            results.extend(more)
+        latency = time.perf_counter() - started
+        return sum(len(result[1]) for result in results), [latency] * len(batch)
+
+    if args.batch_size > 0:
+        singles, batches = split_delta_tasks(tasks, 5, args.batch_size)
+        units = [[task] for task in singles] + batches
+    else:
+        units = [[task] for task in tasks]
+
+    started = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(timed_fetch, units))
+    finally:
+        session.close()
+    elapsed = time.perf_counter() - started
+
+    total_rows = sum(row_count for row_count, _ in results)
+    latencies = [latency for _, unit_latencies in results for latency in unit_latencies]
+    return elapsed, total_rows, latencies
+
+
+def main() -> None:
+    args = parse_args()
+    logger = get_logger("bench_fetch_stock_prices_daily", level=logging.INFO)
+
+    worker_counts = [int(value) for value in args.workers.split(",") if value.strip()]
+    if not worker_counts or any(count <= 0 for count in worker_counts):
+        raise ValueError("--workers は1以上の整数をカンマ区切りで指定してください。")
+
+    server = None
+    chart_url = args.chart_url
+    spark_url = args.spark_url
+    if not chart_url:
+        config = StubConfig(
+            args.latency_ms, args.jitter_ms, args.rate_429, args.bars, args.spark_close_only
+        )
+        server = start_server("127.0.0.1", 0, config)
+        chart_url = chart_url_for(server)
+        spark_url = spark_url_for(server)
+    logger.info("スタブURL: %s / %s", chart_url, spark_url)
+
+    jst = timezone(timedelta(hours=9))
+    today_jst = datetime.now(tz=jst).date()
+    end_ts = int(datetime.combine(today_jst, datetime.min.time(), tzinfo=jst).timestamp())
+    start_ts = 0 if args.full_history else end_ts - 10 * 86400
+    missing_days = None if args.full_history else 1
+
+    codes = [str(1000 + idx) for idx in range(args.code_count)]
+    tasks = [IngestTask(code, start_ts, end_ts, missing_days) for code in codes]
+
+    try:
+        for workers in worker_counts:
+            elapsed, total_rows, latencies = run_once(
+                tasks, workers, args, chart_url, spark_url, logger
+            )
+            logger.info(
+                "workers=%3d 銘柄数=%d 行数=%d 所要=%.2fs codes/sec=%.1f rows/sec=%.1f "
+                "p50=%.1fms p99=%.1fms",
+                workers,
+                len(codes),
+                total_rows,
+                elapsed,
+                len(codes) / elapsed if elapsed > 0 else 0.0,
+                total_rows / elapsed if elapsed > 0 else 0.0,
+                percentile(latencies, 0.50) * 1000,
+                percentile(latencies, 0.99) * 1000,
+            )
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""取引所の営業日カレンダーを trading_calendar テーブルに生成する。"""
+
+import argparse
+from datetime import date
+
+from common.bulk_writer import BulkWriter
+from common.db import get_connection
+from common.exchange_calendar import (
+    CALENDAR_START,
+    CALENDAR_YEARS_AHEAD,
+    EXTRA_HOLIDAYS_FILE,
+    load_extra_holidays,
+)
+from common.logger import get_logger
+from common.trading_calendar import (
+    CALENDAR_COLUMNS,
+    TRADING_CALENDAR_TABLE,
+    build_calendar_rows,
+)
+
+
+def parse_args() -> argparse.Namespace:
+    today = date.today()
+    parser = argparse.ArgumentParser(
+        description="common/exchange_calendar.py の休場日定義から営業日カレンダーテーブルを作成する。"
+        "土日・年末年始以外の休場日は common/extra_holidays.txt に記載する。"
+    )
+    parser.add_argument("--table", default=TRADING_CALENDAR_TABLE)
+    parser.add_argument(
+        "--start-date",
+        type=date.fromisoformat,
+        default=CALENDAR_START,
+        help="生成開始日（YYYY-MM-DD）。",
+    )
+    parser.add_argument(
+        "--end-date",
+        type=date.fromisoformat,
+        default=date(today.year + CALENDAR_YEARS_AHEAD, 12, 31),
+        help="生成終了日（YYYY-MM-DD）。",
+    )
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    logger = get_logger("build_trading_calendar")
+
+    if args.start_date > args.end_date:
+        raise ValueError("--start-date は --end-date 以前を指定してください。")
+
+    rows = build_calendar_rows(args.start_date, args.end_date)
+    business_days = sum(row[1] for row in rows)
+
+    conn = get_connection()
+    try:
+        # 営業日通番は開始日から数えるため、期間外の古い行を残さず作り直す
+        with conn.cursor() as cursor:
+            cursor.execute(f"DELETE FROM `{args.table}`")
+        with BulkWriter(conn, args.table, CALENDAR_COLUMNS, commit_rows=0) as writer:
+            writer.add(rows)
+    finally:
+        conn.close()
+
+    logger.info("生成期間: %s 〜 %s", args.start_date, args.end_date)
+    logger.info("暦日数: %d", len(rows))
+    logger.info("営業日数: %d", business_days)
+    logger.info(
+        "追加休場日数: %d（%s）", len(load_extra_holidays()), EXTRA_HOLIDAYS_FILE
+    )
+
+
+if __name__ == "__main__":
+    main()
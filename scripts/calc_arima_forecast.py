@@ -2,22 +2,45 @@
 """Forecast stock close prices with ARIMA and store to MySQL."""
 
 import argparse
+import logging
 import math
 import warnings
-from typing import Iterable, List, Optional, Sequence, Tuple
+from typing import Dict, List, Optional, Sequence, Tuple
 
+import numpy as np
 import pymysql
 from statsmodels.tsa.arima.model import ARIMA
 from statsmodels.tools.sm_exceptions import ConvergenceWarning
 
-from common.db import get_connection
-from common.exchange_calendar import shift_exchange_business_day
-from common.logger import get_logger
+from common.bulk_writer import CodeBatchWriter
+from common.db import ConnectionPool, fetch_arrays, get_connection
+from common.exchange_calendar import shift_exchange_business_days
+from common.load_control import LoadController, run_adaptive
+from common.logger import LOG_LEVEL, StepTimer, get_logger, log_fields
 
 
 PREDICTED_CLOSE_MAX = 999999999.999999
 PREDICTED_CLOSE_MIN = -999999999.999999
 
+# 書込先テーブルの列と、重複時に更新する列
+TARGET_COLUMNS = [
+    "forecast_base_date",
+    "code",
+    "horizon",
+    "target_trade_date",
+    "predicted_close",
+    "model_order",
+    "train_points",
+    "aic",
+]
+UPDATE_COLUMNS = [
+    "target_trade_date",
+    "predicted_close",
+    "model_order",
+    "train_points",
+    "aic",
+]
+
 
 def parse_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser(
@@ -35,6 +58,23 @@ def parse_args() -> argparse.Namespace:
     parser.add_argument("--min-observations", type=int, default=60)
     parser.add_argument("--order", default="5,1,0")
     parser.add_argument("--fallback-order", default="1,1,1")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="同時に予測する銘柄数の上限。負荷に応じて1〜上限で増減する。",
+    )
+    parser.add_argument(
+        "--log-queue",
+        action="store_true",
+        help="ログの標準出力・ファイル書込を別スレッドで行い、計算ループを待たせない。",
+    )
+    parser.add_argument(
+        "--structured-log",
+        action="store_true",
+        help="銘柄ごとに処理時間等を key=value 形式の1行で出力し、"
+        "詳細ログ（DEBUG）を抑止する。",
+    )
     return parser.parse_args()
 
 
@@ -63,7 +103,8 @@ def fetch_recent_close_prices(
     table: str,
     code: str,
     lookback: int,
-) -> List[Tuple]:
+) -> Dict[str, np.ndarray]:
+    # 日付と終値（float64配列）を古い順に返す
     sql = f"""
         SELECT t.trade_date, t.`close`
         FROM (
@@ -76,9 +117,7 @@ def fetch_recent_close_prices(
         ) t
         ORDER BY t.trade_date
     """
-    with conn.cursor() as cursor:
-        cursor.execute(sql, (code, lookback))
-        return list(cursor.fetchall())
+    return fetch_arrays(conn, sql, (code, lookback), {"close": np.float64})
 
 
 def forecast_close_prices(
@@ -102,18 +141,9 @@ def forecast_close_prices(
                 enforce_stationarity=False,
                 enforce_invertibility=False,
             )
-            with warnings.catch_warnings(record=True) as caught_warnings:
-                warnings.simplefilter("always", ConvergenceWarning)
-                result = model.fit()
-
-            for caught in caught_warnings:
-                if issubclass(caught.category, ConvergenceWarning):
-                    logger.warning(
-                        "%s ARIMA収束警告: order=%s, message=%s",
-                        code,
-                        f"{order[0]},{order[1]},{order[2]}",
-                        str(caught.message),
-                    )
+            # 警告フィルタはプロセス全体で共有されワーカースレッド間で銘柄を取り違えるため、
+            # 収束は捕捉した警告ではなく fit 結果の mle_retvals で判定する
+            result = model.fit()
 
             retvals = getattr(result, "mle_retvals", None)
             if isinstance(retvals, dict) and not retvals.get("converged", True):
@@ -145,6 +175,10 @@ def build_rows(
 ) -> List[Tuple]:
     rows: List[Tuple] = []
     order_text = f"{order[0]},{order[1]},{order[2]}"
+    # 各horizonの予測対象日を1回の配列演算で求める
+    target_trade_dates = shift_exchange_business_days(
+        forecast_base_date, np.arange(1, len(predicted_values) + 1)
+    ).tolist()
 
     for step, predicted_close in enumerate(predicted_values, start=1):
         if not math.isfinite(predicted_close):
@@ -167,13 +201,12 @@ def build_rows(
             )
             continue
 
-        target_trade_date = shift_exchange_business_day(forecast_base_date, step)
         rows.append(
             (
                 forecast_base_date,
                 code,
                 step,
-                target_trade_date,
+                target_trade_dates[step - 1],
                 predicted_close,
                 order_text,
                 train_points,
@@ -184,44 +217,89 @@ def build_rows(
     return rows
 
 
-def upsert_rows(
+def process_code(
     conn: pymysql.Connection,
-    table: str,
-    rows: Iterable[Tuple],
-) -> int:
-    sql = f"""
-        INSERT INTO `{table}`
-        (
-            `forecast_base_date`,
-            `code`,
-            `horizon`,
-            `target_trade_date`,
-            `predicted_close`,
-            `model_order`,
-            `train_points`,
-            `aic`
+    args: argparse.Namespace,
+    code: str,
+    primary_order: Tuple[int, int, int],
+    fallback_order: Tuple[int, int, int],
+    logger,
+    timer: Optional[StepTimer] = None,
+) -> Optional[List[Tuple]]:
+    # 1銘柄分の予測行を返す（予測しなかった場合はNone）
+    timer = timer or StepTimer()
+    prices = fetch_recent_close_prices(
+        conn, args.source_table, code, args.lookback
+    )
+    timer.lap("fetch")
+    trade_dates = prices["trade_date"]
+    if len(trade_dates) < args.min_observations:
+        logger.info(
+            "%s データ不足: %d件 (必要: %d件)",
+            code,
+            len(trade_dates),
+            args.min_observations,
         )
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-        ON DUPLICATE KEY UPDATE
-            `target_trade_date` = VALUES(`target_trade_date`),
-            `predicted_close` = VALUES(`predicted_close`),
-            `model_order` = VALUES(`model_order`),
-            `train_points` = VALUES(`train_points`),
-            `aic` = VALUES(`aic`)
-    """
-    with conn.cursor() as cursor:
-        row_list = list(rows)
-        if not row_list:
-            return 0
-        cursor.executemany(sql, row_list)
-        inserted = cursor.rowcount
-    conn.commit()
-    return inserted
+        return None
+
+    closes = prices["close"][~np.isnan(prices["close"])]
+    if len(closes) < args.min_observations:
+        logger.info(
+            "%s 終値不足: %d件 (必要: %d件)",
+            code,
+            len(closes),
+            args.min_observations,
+        )
+        return None
+
+    forecast_base_date = trade_dates[-1]
+    try:
+        predicted_values, used_order, aic = forecast_close_prices(
+            closes=closes,
+            horizon=args.horizon,
+            primary_order=primary_order,
+            fallback_order=fallback_order,
+            code=code,
+            logger=logger,
+        )
+    except Exception as exc:
+        logger.warning("%s ARIMA予測失敗: %s", code, exc)
+        return None
+    timer.lap("fit")
+
+    rows = build_rows(
+        code=code,
+        forecast_base_date=forecast_base_date,
+        predicted_values=predicted_values,
+        order=used_order,
+        train_points=len(closes),
+        aic=aic,
+        logger=logger,
+    )
+    timer.lap("build")
+
+    if not rows:
+        logger.warning("%s 有効な予測値がないため保存をスキップ", code)
+        return None
+
+    logger.debug(
+        "%s 予測完了: horizon=%d, order=%s, rows=%d",
+        code,
+        args.horizon,
+        f"{used_order[0]},{used_order[1]},{used_order[2]}",
+        len(rows),
+    )
+    return rows
 
 
 def main() -> None:
     args = parse_args()
-    logger = get_logger("calc_arima_forecast")
+    # 構造化ログ指定時は詳細（DEBUG）を出さず、銘柄ごとの1行にまとめる
+    logger = get_logger(
+        "calc_arima_forecast",
+        level=logging.INFO if args.structured_log else LOG_LEVEL,
+        queued=args.log_queue,
+    )
 
     if args.horizon <= 0:
         raise ValueError("--horizon は1以上を指定してください。")
@@ -229,88 +307,87 @@ def main() -> None:
         raise ValueError("--lookback は1以上を指定してください。")
     if args.min_observations <= 1:
         raise ValueError("--min-observations は2以上を指定してください。")
+    if args.workers <= 0:
+        raise ValueError("--workers は1以上を指定してください。")
 
     primary_order = parse_order(args.order)
     fallback_order = parse_order(args.fallback_order)
+    # 収束は銘柄ごとに mle_retvals で判定してログに出すため、ワーカー起動前に
+    # statsmodels の収束警告（どの銘柄か分からない）を抑止しておく
+    warnings.filterwarnings("ignore", category=ConvergenceWarning)
 
     conn = get_connection()
+    # ワーカーは読込・予測のみを行い、書込はこのスレッドでまとめて行う
+    pool = ConnectionPool(args.workers, decimal_as_float=True)
     try:
         codes = resolve_codes(conn, args.codes)
         total_codes = len(codes)
         predicted_codes = 0
         total_rows = 0
-        inserted_rows = 0
 
-        for code in codes:
-            price_rows = fetch_recent_close_prices(
-                conn, args.source_table, code, args.lookback
-            )
-            if len(price_rows) < args.min_observations:
-                logger.info(
-                    "%s データ不足: %d件 (必要: %d件)",
-                    code,
-                    len(price_rows),
-                    args.min_observations,
-                )
-                continue
+        def log_write_error(code: str, exc: Exception) -> None:
+            logger.exception("%s 保存失敗: %s", code, exc)
 
-            closes = [float(row[1]) for row in price_rows if row[1] is not None]
-            if len(closes) < args.min_observations:
-                logger.info(
-                    "%s 終値不足: %d件 (必要: %d件)",
-                    code,
-                    len(closes),
-                    args.min_observations,
-                )
-                continue
+        # 複数銘柄分をまとめて書き込み、失敗時は銘柄ごとに書き直して他の銘柄は保存する
+        writer = CodeBatchWriter(
+            conn,
+            args.target_table,
+            TARGET_COLUMNS,
+            UPDATE_COLUMNS,
+            on_error=log_write_error,
+        )
 
-            forecast_base_date = price_rows[-1][0]
+        def run_code(code: str) -> Optional[List[Tuple]]:
+            timer = StepTimer()
+            status = "error"
+            rows: Optional[List[Tuple]] = None
             try:
-                predicted_values, used_order, aic = forecast_close_prices(
-                    closes=closes,
-                    horizon=args.horizon,
-                    primary_order=primary_order,
-                    fallback_order=fallback_order,
-                    code=code,
-                    logger=logger,
-                )
-            except Exception as exc:
-                logger.warning("%s ARIMA予測失敗: %s", code, exc)
-                continue
-
-            rows = build_rows(
-                code=code,
-                forecast_base_date=forecast_base_date,
-                predicted_values=predicted_values,
-                order=used_order,
-                train_points=len(closes),
-                aic=aic,
-                logger=logger,
-            )
+                with pool.connection() as worker_conn:
+                    rows = process_code(
+                        worker_conn,
+                        args,
+                        code,
+                        primary_order,
+                        fallback_order,
+                        logger,
+                        timer,
+                    )
+                status = "ok" if rows else "skip"
+                return rows
+            finally:
+                if args.structured_log:
+                    first = dict(zip(TARGET_COLUMNS, rows[0])) if rows else {}
+                    log_fields(
+                        logger,
+                        "arima_code",
+                        code=code,
+                        status=status,
+                        rows=len(rows) if rows else 0,
+                        order=first.get("model_order"),
+                        train_points=first.get("train_points"),
+                        aic=first.get("aic"),
+                        **timer.fields(),
+                    )
 
-            if not rows:
-                logger.warning("%s 有効な予測値がないため保存をスキップ", code)
+        # モデル推定はCPUを占有するため、負荷・温度に応じて並列度を調整する
+        controller = LoadController(args.workers, logger=logger)
+        for code, result in run_adaptive(run_code, codes, controller):
+            if result is None:
                 continue
-
-            inserted = upsert_rows(conn, args.target_table, rows)
-
             predicted_codes += 1
-            total_rows += len(rows)
-            inserted_rows += inserted
-            logger.info(
-                "%s 予測完了: horizon=%d, order=%s, rows=%d, inserted=%d",
-                code,
-                args.horizon,
-                f"{used_order[0]},{used_order[1]},{used_order[2]}",
-                len(rows),
-                inserted,
-            )
+            total_rows += len(result)
+            writer.add(code, result)
+        writer.commit()
+        inserted_rows = writer.affected_rows
+        predicted_codes -= len(writer.failed_codes)
 
         logger.info("対象銘柄数: %d", total_codes)
         logger.info("予測成功銘柄数: %d", predicted_codes)
         logger.info("予測レコード数: %d", total_rows)
         logger.info("インサートレコード数: %d", inserted_rows)
+        logger.info("保存失敗銘柄数: %d", len(writer.failed_codes))
     finally:
+        pool.close_all()
         conn.close()
 
 
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""Calculate moving averages, RSI and MACD in one pass and store to MySQL."""
+
+import argparse
+
+from common.indicators import (
+    ALL_INDICATORS,
+    IndicatorOptions,
+    add_engine_arguments,
+    engine_options,
+    run_indicators,
+)
+from common.logger import get_logger
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="銘柄ごとに終値を1回だけ読み込み、移動平均・RSI・MACDをまとめて計算する。"
+    )
+    add_engine_arguments(parser)
+    parser.add_argument(
+        "--indicators",
+        default=",".join(ALL_INDICATORS),
+        help="計算する指標をカンマ区切りで指定（ma,rsi,macd）。",
+    )
+    parser.add_argument("--ma-table", default="stock_prices_daily_ma")
+    parser.add_argument("--rsi-table", default="stock_prices_daily_rsi")
+    parser.add_argument("--macd-table", default="stock_prices_daily_macd")
+    parser.add_argument("--ma-window-short", type=int, default=5)
+    parser.add_argument("--ma-window-long", type=int, default=25)
+    parser.add_argument("--rsi-window", type=int, default=14)
+    parser.add_argument("--macd-window-short", type=int, default=12)
+    parser.add_argument("--macd-window-long", type=int, default=26)
+    parser.add_argument("--macd-window-signal", type=int, default=9)
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    logger = get_logger("calc_indicators")
+
+    options = IndicatorOptions(
+        indicators=tuple(
+            name.strip() for name in args.indicators.split(",") if name.strip()
+        ),
+        ma_table=args.ma_table,
+        rsi_table=args.rsi_table,
+        macd_table=args.macd_table,
+        ma_window_short=args.ma_window_short,
+        ma_window_long=args.ma_window_long,
+        rsi_window=args.rsi_window,
+        macd_window_short=args.macd_window_short,
+        macd_window_long=args.macd_window_long,
+        macd_window_signal=args.macd_window_signal,
+        **engine_options(args),
+    )
+    run_indicators(options, logger)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,7 +2,8 @@
 """Train XGBoost regressors and persist 1-5 business-day close forecasts."""
 
 import argparse
-from typing import Dict, Iterable, List, Tuple
+import logging
+from typing import Dict, List, Optional, Tuple
 
 import numpy as np
 import pandas as pd
@@ -10,8 +11,17 @@ import pymysql
 from sklearn.metrics import mean_absolute_error, mean_squared_error
 from xgboost import XGBRegressor
 
-from common.db import get_connection
-from common.logger import get_logger
+from common.bulk_writer import CodeBatchWriter
+from common.db import (
+    QUERY_SUMMARY_TOP,
+    SLOW_QUERY_MS,
+    ConnectionPool,
+    QueryStats,
+    fetch_frame,
+    get_connection,
+)
+from common.load_control import LoadController, run_adaptive
+from common.logger import LOG_LEVEL, StepTimer, get_logger, log_fields
 
 
 NUMERIC_COLUMNS = [
@@ -55,6 +65,29 @@ MA_TABLE = "stock_prices_daily_ma"
 RSI_TABLE = "stock_prices_daily_rsi"
 MACD_TABLE = "stock_prices_daily_macd"
 TARGET_TABLE = "stock_prices_daily_xgb_forecast"
+# 予測保存テーブルの列と、重複時に更新する列。
+TARGET_COLUMNS = [
+    "trade_date",
+    "code",
+    "horizon",
+    "model_version",
+    "trained_end_date",
+    "base_close",
+    "predicted_close",
+    "actual_close",
+    "actual_return",
+    "predicted_return",
+    "error_rate",
+]
+UPDATE_COLUMNS = [
+    "trained_end_date",
+    "base_close",
+    "predicted_close",
+    "actual_close",
+    "actual_return",
+    "predicted_return",
+    "error_rate",
+]
 
 # RSI算出時に参照する期間（日数）。
 RSI_WINDOW = 14
@@ -95,6 +128,35 @@ def parse_args() -> argparse.Namespace:
         default="",
         help="銘柄コードをカンマ区切りで指定。省略時はDBから取得。",
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="同時に学習する銘柄数の上限。負荷に応じて1〜上限で増減する。",
+    )
+    parser.add_argument(
+        "--slow-query-ms",
+        type=float,
+        default=SLOW_QUERY_MS,
+        help="この時間（ミリ秒）以上かかったSQLを警告ログに出す。0以下で無効。",
+    )
+    parser.add_argument(
+        "--query-summary-top",
+        type=int,
+        default=QUERY_SUMMARY_TOP,
+        help="終了時に合計時間の多い順で集計表示するSQLの件数。",
+    )
+    parser.add_argument(
+        "--log-queue",
+        action="store_true",
+        help="ログの標準出力・ファイル書込を別スレッドで行い、学習ループを待たせない。",
+    )
+    parser.add_argument(
+        "--structured-log",
+        action="store_true",
+        help="銘柄ごとに処理時間・評価値を key=value 形式の1行で出力し、"
+        "horizon別の詳細ログ（DEBUG）を抑止する。",
+    )
     return parser.parse_args()
 
 
@@ -170,26 +232,9 @@ def fetch_feature_rows(conn: pymysql.Connection, codes: List[str]) -> pd.DataFra
     ]
     params.extend(codes)
 
-    with conn.cursor() as cursor:
-        cursor.execute(sql, tuple(params))
-        rows = cursor.fetchall()
-
-    columns = [
-        "trade_date",
-        "code",
-        "open",
-        "high",
-        "low",
-        "close",
-        "volume",
-        "ma5",
-        "ma25",
-        "rsi",
-        "macd",
-        "macd_signal",
-        "histogram",
-    ]
-    return pd.DataFrame(rows, columns=columns)
+    # サーバー側カーソルで分割して読み、数値列はバッチごとにfloat64配列へ変換する
+    # （接続が decimal_as_float の場合はDecimalを経由しない）
+    return fetch_frame(conn, sql, tuple(params), float_columns=NUMERIC_COLUMNS)
 
 
 def build_feature_dataset(df: pd.DataFrame) -> pd.DataFrame:
@@ -367,32 +412,6 @@ def make_future_persist_row(
     )
 
 
-def upsert_rows(
-    conn: pymysql.Connection,
-    table: str,
-    rows: Iterable[Tuple],
-) -> int:
-    sql = f"""
-    INSERT INTO `{table}`
-    (`trade_date`, `code`, `horizon`, `model_version`, `trained_end_date`,
-     `base_close`, `predicted_close`, `actual_close`, `actual_return`, `predicted_return`, `error_rate`)
-    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-    ON DUPLICATE KEY UPDATE
-        `trained_end_date` = VALUES(`trained_end_date`),
-        `base_close` = VALUES(`base_close`),
-        `predicted_close` = VALUES(`predicted_close`),
-        `actual_close` = VALUES(`actual_close`),
-        `actual_return` = VALUES(`actual_return`),
-        `predicted_return` = VALUES(`predicted_return`),
-        `error_rate` = VALUES(`error_rate`)
-    """
-    with conn.cursor() as cursor:
-        cursor.executemany(sql, list(rows))
-        affected = cursor.rowcount
-    conn.commit()
-    return affected
-
-
 def validate_config() -> None:
     if not HORIZONS:
         raise ValueError("horizons が空です。")
@@ -410,21 +429,28 @@ def process_one_code(
     conn: pymysql.Connection,
     logger,
     code: str,
-) -> Dict[str, float]:
+    timer: Optional[StepTimer] = None,
+    progress_level: int = logging.INFO,
+) -> Tuple[Dict[str, float], List[Tuple]]:
+    # 学習・予測のみを行い、保存する行は呼び出し元でまとめて書き込む
+    # horizon 別の進捗は progress_level で出力する（構造化ログ時はDEBUG）
+    timer = timer or StepTimer()
     features = fetch_feature_rows(conn, [code])
+    timer.lap("fetch")
     if features.empty:
         logger.warning("[%s] 入力データが0件のためスキップします。", code)
-        return {"status": 0.0, "affected": 0.0, "horizon_count": 0.0}
+        return {"status": 0.0, "rows": 0.0, "horizon_count": 0.0}, []
 
     feature_dataset = build_feature_dataset(features)
+    timer.lap("features")
     if feature_dataset.empty:
         logger.warning("[%s] 特徴量データが0件のためスキップします。", code)
-        return {"status": 0.0, "affected": 0.0, "horizon_count": 0.0}
+        return {"status": 0.0, "rows": 0.0, "horizon_count": 0.0}, []
 
     latest_rows = feature_dataset.dropna(subset=["close"]).copy()
     if latest_rows.empty:
         logger.warning("[%s] 最新株価行がないためスキップします。", code)
-        return {"status": 0.0, "affected": 0.0, "horizon_count": 0.0}
+        return {"status": 0.0, "rows": 0.0, "horizon_count": 0.0}, []
 
     latest_rows = latest_rows.sort_values("trade_date")
     latest_feature_row = latest_rows.iloc[-1]
@@ -435,10 +461,10 @@ def process_one_code(
     latest_feature_values = filled_features.iloc[-1]
     if latest_feature_values.isna().any():
         logger.warning("[%s] 最新株価日の特徴量補完後も欠損が残るためスキップします。", code)
-        return {"status": 0.0, "affected": 0.0, "horizon_count": 0.0}
+        return {"status": 0.0, "rows": 0.0, "horizon_count": 0.0}, []
     latest_feature_matrix = pd.DataFrame([latest_feature_values], columns=FEATURE_COLUMNS)
 
-    affected_total = 0
+    persist_rows: List[Tuple] = []
     metrics_per_horizon: List[Dict[str, float]] = []
 
     for horizon in HORIZONS:
@@ -470,15 +496,16 @@ def process_one_code(
 
         pred_close = model.predict(x_test)
         metrics = evaluate_predictions(y_test, pred_close)
+        timer.lap("train")
 
-        logger.info("[%s][h=%d] train rows: %d", code, horizon, len(x_train))
-        logger.info("[%s][h=%d] test rows: %d", code, horizon, len(x_test))
-        logger.info("[%s][h=%d] mae: %.6f", code, horizon, metrics["mae"])
-        logger.info("[%s][h=%d] rmse: %.6f", code, horizon, metrics["rmse"])
+        logger.log(progress_level, "[%s][h=%d] train rows: %d", code, horizon, len(x_train))
+        logger.log(progress_level, "[%s][h=%d] test rows: %d", code, horizon, len(x_test))
+        logger.log(progress_level, "[%s][h=%d] mae: %.6f", code, horizon, metrics["mae"])
+        logger.log(progress_level, "[%s][h=%d] rmse: %.6f", code, horizon, metrics["rmse"])
         if np.isnan(metrics["mape"]):
-            logger.info("[%s][h=%d] mape: N/A", code, horizon)
+            logger.log(progress_level, "[%s][h=%d] mape: N/A", code, horizon)
         else:
-            logger.info("[%s][h=%d] mape: %.6f", code, horizon, metrics["mape"])
+            logger.log(progress_level, "[%s][h=%d] mape: %.6f", code, horizon, metrics["mape"])
 
         trained_end_date = train_df["trade_date"].max().date()
         rows = make_persist_rows(
@@ -488,9 +515,8 @@ def process_one_code(
             trained_end_date,
             pred_close,
         )
-        affected = upsert_rows(conn, TARGET_TABLE, rows)
-        affected_total += affected
-        logger.info("[%s][h=%d] 予測保存件数(affected rows): %d", code, horizon, affected)
+        persist_rows.extend(rows)
+        logger.log(progress_level, "[%s][h=%d] 予測保存件数: %d", code, horizon, len(rows))
 
         full_matrix = dataset.dropna(subset=FEATURE_COLUMNS + [TARGET_COLUMN]).copy()
         if len(full_matrix) < MIN_TRAIN_ROWS:
@@ -507,6 +533,7 @@ def process_one_code(
         future_model = build_model()
         future_model.fit(full_matrix[FEATURE_COLUMNS], full_matrix[TARGET_COLUMN].astype(float))
         future_pred_close = float(future_model.predict(latest_feature_matrix)[0])
+        timer.lap("future")
         future_trained_end_date = full_matrix["trade_date"].max().date()
         future_row = make_future_persist_row(
             latest_trade_date,
@@ -517,38 +544,48 @@ def process_one_code(
             latest_base_close,
             future_pred_close,
         )
-        future_affected = upsert_rows(conn, TARGET_TABLE, [future_row])
-        affected_total += future_affected
-        logger.info(
-            "[%s][h=%d] 最新基準日(%s)→将来予測保存(affected rows): %d",
+        persist_rows.append(future_row)
+        logger.log(
+            progress_level,
+            "[%s][h=%d] 最新基準日(%s)→将来予測を保存対象に追加",
             code,
             horizon,
             latest_trade_date,
-            future_affected,
         )
 
         metrics_per_horizon.append(metrics)
 
     if not metrics_per_horizon:
-        return {"status": 0.0, "affected": float(affected_total), "horizon_count": 0.0}
+        return {"status": 0.0, "rows": 0.0, "horizon_count": 0.0}, []
 
     result: Dict[str, float] = {
         "status": 1.0,
-        "affected": float(affected_total),
+        "rows": float(len(persist_rows)),
         "horizon_count": float(len(metrics_per_horizon)),
         "mae": float(np.mean([row["mae"] for row in metrics_per_horizon])),
         "rmse": float(np.mean([row["rmse"] for row in metrics_per_horizon])),
         "mape": float(np.nanmean([row["mape"] for row in metrics_per_horizon])),
     }
-    return result
+    return result, persist_rows
 
 
 def main() -> None:
     args = parse_args()
-    logger = get_logger("calc_xgboost_signal")
+    # 構造化ログ指定時は horizon 別の詳細（DEBUG）を出さず、銘柄ごとの1行にまとめる
+    logger = get_logger(
+        "calc_xgboost_signal",
+        level=logging.INFO if args.structured_log else LOG_LEVEL,
+        queued=args.log_queue,
+    )
     validate_config()
-
-    conn = get_connection()
+    if args.workers <= 0:
+        raise ValueError("--workers は1以上を指定してください。")
+
+    # 全接続のSQLを計測し、低速SQLの警告と終了時の集計に使う
+    stats = QueryStats(logger, args.slow_query_ms)
+    conn = get_connection(stats=stats)
+    # ワーカーは読込・学習のみを行い、書込はこのスレッドでまとめて行う
+    pool = ConnectionPool(args.workers, decimal_as_float=True, stats=stats)
     try:
         codes = resolve_codes(conn, args.codes)
         logger.info("対象銘柄数: %d", len(codes))
@@ -559,30 +596,79 @@ def main() -> None:
         success_count = 0
         skipped_count = 0
         failed_count = 0
-        affected_total = 0
         metrics_rows: List[Dict[str, float]] = []
 
-        for idx, code in enumerate(codes, start=1):
-            logger.info("銘柄処理開始 (%d/%d): %s", idx, len(codes), code)
+        def log_write_error(code: str, exc: Exception) -> None:
+            logger.exception("[%s] 保存失敗: %s", code, exc)
+
+        # 複数銘柄分をまとめて書き込み、失敗時は銘柄ごとに書き直して他の銘柄は保存する
+        writer = CodeBatchWriter(
+            conn, TARGET_TABLE, TARGET_COLUMNS, UPDATE_COLUMNS, on_error=log_write_error
+        )
+        # 銘柄ごとの進捗はINFOで出し、構造化ログ時は銘柄ごとの1行にまとめる
+        progress_level = logging.DEBUG if args.structured_log else logging.INFO
+
+        def run_code(
+            item: Tuple[int, str]
+        ) -> Optional[Tuple[Dict[str, float], List[Tuple]]]:
+            idx, code = item
+            logger.log(progress_level, "銘柄処理開始 (%d/%d): %s", idx, len(codes), code)
+            timer = StepTimer()
+            summary: Dict[str, float] = {}
             try:
-                result = process_one_code(conn, logger, code)
+                with pool.connection() as worker_conn:
+                    summary, rows = process_one_code(
+                        worker_conn, logger, code, timer, progress_level
+                    )
+                return summary, rows
             except Exception as exc:
-                failed_count += 1
                 logger.exception("[%s] 処理失敗: %s", code, exc)
+                return None
+            finally:
+                if args.structured_log:
+                    if not summary:
+                        status = "error"
+                    else:
+                        status = "ok" if int(summary["status"]) == 1 else "skip"
+                    log_fields(
+                        logger,
+                        "xgb_code",
+                        code=code,
+                        status=status,
+                        rows=int(summary.get("rows", 0)),
+                        horizons=int(summary.get("horizon_count", 0)),
+                        mae=summary.get("mae"),
+                        rmse=summary.get("rmse"),
+                        mape=summary.get("mape"),
+                        **timer.fields(),
+                    )
+
+        # 学習はCPUを占有するため、負荷・温度に応じて並列度を調整する
+        controller = LoadController(args.workers, logger=logger)
+        for (_, code), result in run_adaptive(
+            run_code, enumerate(codes, start=1), controller
+        ):
+            if result is None:
+                failed_count += 1
                 continue
 
-            if int(result["status"]) == 1:
+            summary, rows = result
+            writer.add(code, rows)
+            if int(summary["status"]) == 1:
                 success_count += 1
-                affected_total += int(result["affected"])
-                metrics_rows.append(result)
+                metrics_rows.append(summary)
             else:
                 skipped_count += 1
+        writer.commit()
+        # 保存に失敗した銘柄は成功から失敗に数え直す（予測値を返すのは成功銘柄のみ）
+        success_count -= len(writer.failed_codes)
+        failed_count += len(writer.failed_codes)
 
         logger.info("===== XGBoost終値予測(1-5営業日) 銘柄別処理サマリ =====")
         logger.info("成功: %d", success_count)
         logger.info("スキップ: %d", skipped_count)
         logger.info("失敗: %d", failed_count)
-        logger.info("保存合計(affected rows): %d", affected_total)
+        logger.info("保存合計(affected rows): %d", writer.affected_rows)
 
         if metrics_rows:
             mae_avg = float(np.mean([row["mae"] for row in metrics_rows]))
@@ -598,6 +684,8 @@ def main() -> None:
             else:
                 logger.info("平均mape: N/A (有効値なし)")
     finally:
+        stats.log_summary(limit=args.query_summary_top)
+        pool.close_all()
         conn.close()
 
 
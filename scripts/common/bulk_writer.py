@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""複数銘柄分の行をまとめてDBへ書き込む共通ライター。
+
+行をバッファに溜め、flush_rows 行ごとに複数行INSERT（pymysqlの executemany は
+INSERT文を複数行VALUESへ展開する）を送り、commit_rows 行ごとにコミットする。
+全期間の再計算などの大量投入向けに LOAD DATA LOCAL INFILE での投入も選べる。
+どちらの経路でも NaN・±inf は NULL として書き込み、重複時の扱いも同じにする。
+"""
+
+from __future__ import annotations
+
+import datetime
+import math
+import os
+import tempfile
+from decimal import Decimal
+from typing import Callable, Iterable, List, Optional, Sequence, Tuple
+
+import pymysql
+
+# 1回の送信（複数行INSERTまたはLOAD DATA）で書き込む行数
+DEFAULT_FLUSH_ROWS = 5000
+# コミットする間隔（行数）。0以下なら呼び出し元がコミットする
+DEFAULT_COMMIT_ROWS = 50000
+
+
+def _normalize_row(row: Tuple) -> Tuple:
+    # NaN・±inf は列の型によって扱いがドライバ・投入方法で変わるため NULL にそろえる
+    if any(isinstance(value, float) and not math.isfinite(value) for value in row):
+        return tuple(
+            None if isinstance(value, float) and not math.isfinite(value) else value
+            for value in row
+        )
+    return row
+
+
+def _tsv_value(value) -> str:
+    # LOAD DATA の既定書式（タブ区切り、\ でエスケープ、NULLは \N）に変換する
+    if value is None:
+        return "\\N"
+    if isinstance(value, float):
+        return repr(value)
+    if isinstance(value, (int, Decimal)):
+        return str(value)
+    if isinstance(value, datetime.datetime):
+        return value.isoformat(sep=" ")
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    text = str(value)
+    return (
+        text.replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+class BulkWriter:
+    """行をまとめて INSERT … ON DUPLICATE KEY UPDATE（または INSERT IGNORE）する。
+
+    update_columns を指定すると重複時にその列を更新し、省略時は重複行を無視する。
+    update_condition（SQL式）を指定すると、その式が真の重複行だけを更新する。
+    ON DUPLICATE KEY UPDATE は左から順に評価されるため、式が参照する列は
+    update_columns の最後に置くこと。
+    load_data=True の場合は一時ファイル経由で LOAD DATA LOCAL INFILE を使う。
+    update_columns 指定時は接続ごとの一時テーブルへ読み込んでから
+    INSERT … SELECT … ON DUPLICATE KEY UPDATE で反映するため、REPLACE と違い
+    created_at など対象外の列は保持される（省略時は IGNORE で直接読み込む）。
+    接続は get_connection(local_infile=True) で作成しておくこと。
+    """
+
+    def __init__(
+        self,
+        conn: pymysql.Connection,
+        table: str,
+        columns: Sequence[str],
+        update_columns: Optional[Sequence[str]] = None,
+        flush_rows: int = DEFAULT_FLUSH_ROWS,
+        commit_rows: int = DEFAULT_COMMIT_ROWS,
+        load_data: bool = False,
+        update_condition: Optional[str] = None,
+    ) -> None:
+        if flush_rows <= 0:
+            raise ValueError("flush_rows は1以上を指定してください。")
+        self.conn = conn
+        self.table = table
+        self.columns = list(columns)
+        self.update_columns = list(update_columns) if update_columns else []
+        self.update_condition = update_condition
+        self.flush_rows = flush_rows
+        self.commit_rows = commit_rows
+        self.load_data = load_data
+        self.buffer: List[Tuple] = []
+        self.written_rows = 0
+        self.affected_rows = 0
+        self._uncommitted_rows = 0
+        self._uncommitted_affected = 0
+        self._staging_table: Optional[str] = None
+        self._sql = self._build_insert_sql()
+
+    def _updates_sql(self) -> str:
+        # 複数行INSERTと LOAD DATA の一時テーブル経由で同じ更新式を使う
+        if self.update_condition is None:
+            return ", ".join(f"`{c}` = VALUES(`{c}`)" for c in self.update_columns)
+        return ", ".join(
+            f"`{c}` = IF({self.update_condition}, VALUES(`{c}`), `{c}`)"
+            for c in self.update_columns
+        )
+
+    def _build_insert_sql(self) -> str:
+        cols_sql = ", ".join(f"`{c}`" for c in self.columns)
+        placeholders = ", ".join(["%s"] * len(self.columns))
+        if not self.update_columns:
+            return f"INSERT IGNORE INTO `{self.table}` ({cols_sql}) VALUES ({placeholders})"
+        return (
+            f"INSERT INTO `{self.table}` ({cols_sql}) VALUES ({placeholders}) "
+            f"ON DUPLICATE KEY UPDATE {self._updates_sql()}"
+        )
+
+    def add(self, rows: Iterable[Tuple]) -> None:
+        """行を追加し、flush_rows 行に達するごとに送信する。"""
+        self.buffer.extend(rows)
+        while len(self.buffer) >= self.flush_rows:
+            chunk = self.buffer[:self.flush_rows]
+            del self.buffer[:self.flush_rows]
+            self._write(chunk)
+
+    def flush(self) -> None:
+        """バッファ中の行をすべて送信する（コミットは commit_rows に従う）。"""
+        if self.buffer:
+            chunk = self.buffer
+            self.buffer = []
+            self._write(chunk)
+
+    def commit(self) -> None:
+        """バッファ中の行を送信してコミットする。"""
+        self.flush()
+        self.conn.commit()
+        self._uncommitted_rows = 0
+        self._uncommitted_affected = 0
+
+    def rollback(self) -> None:
+        """未送信の行を破棄し、未コミットの書込を取り消す（件数も戻す）。"""
+        self.buffer = []
+        self.written_rows -= self._uncommitted_rows
+        self.affected_rows -= self._uncommitted_affected
+        self._uncommitted_rows = 0
+        self._uncommitted_affected = 0
+        self.conn.rollback()
+
+    def _write(self, rows: List[Tuple]) -> None:
+        rows = [_normalize_row(row) for row in rows]
+        if self.load_data:
+            affected = self._load_data(rows)
+        else:
+            with self.conn.cursor() as cursor:
+                cursor.executemany(self._sql, rows)
+                affected = cursor.rowcount
+        self.written_rows += len(rows)
+        self.affected_rows += max(affected, 0)
+        self._uncommitted_rows += len(rows)
+        self._uncommitted_affected += max(affected, 0)
+        if self.commit_rows > 0 and self._uncommitted_rows >= self.commit_rows:
+            self.conn.commit()
+            self._uncommitted_rows = 0
+            self._uncommitted_affected = 0
+
+    def _ensure_staging_table(self) -> str:
+        # 重複時に列を更新する場合の読込先。キーを持たないため読込順のまま残り、
+        # 同じキーの行が複数あれば executemany と同じく後の行で更新される。
+        # TEMPORARY の作成・削除は暗黙のコミットを起こさない。
+        if self._staging_table is None:
+            staging = f"_bulk_{self.table}"
+            cols_sql = ", ".join(f"`{c}`" for c in self.columns)
+            with self.conn.cursor() as cursor:
+                cursor.execute(f"DROP TEMPORARY TABLE IF EXISTS `{staging}`")
+                cursor.execute(
+                    f"CREATE TEMPORARY TABLE `{staging}` "
+                    f"SELECT {cols_sql} FROM `{self.table}` LIMIT 0"
+                )
+            self._staging_table = staging
+        return self._staging_table
+
+    def _load_data(self, rows: List[Tuple]) -> int:
+        fd, path = tempfile.mkstemp(prefix="bulk-", suffix=".tsv")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8", newline="\n") as fp:
+                for row in rows:
+                    fp.write("\t".join(_tsv_value(value) for value in row))
+                    fp.write("\n")
+            cols_sql = ", ".join(f"`{c}`" for c in self.columns)
+            if not self.update_columns:
+                sql = (
+                    f"LOAD DATA LOCAL INFILE %s IGNORE INTO TABLE `{self.table}` "
+                    f"CHARACTER SET utf8mb4 ({cols_sql})"
+                )
+                with self.conn.cursor() as cursor:
+                    return cursor.execute(sql, (path,))
+
+            staging = self._ensure_staging_table()
+            with self.conn.cursor() as cursor:
+                cursor.execute(
+                    f"LOAD DATA LOCAL INFILE %s INTO TABLE `{staging}` "
+                    f"CHARACTER SET utf8mb4 ({cols_sql})",
+                    (path,),
+                )
+                affected = cursor.execute(
+                    f"INSERT INTO `{self.table}` ({cols_sql}) "
+                    f"SELECT {cols_sql} FROM `{staging}` "
+                    f"ON DUPLICATE KEY UPDATE {self._updates_sql()}"
+                )
+                cursor.execute(f"DELETE FROM `{staging}`")
+                return affected
+        finally:
+            os.unlink(path)
+
+    def __enter__(self) -> "BulkWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.commit()
+        else:
+            self.rollback()
+
+
+class CodeBatchWriter:
+    """銘柄ごとの行を複数銘柄分まとめて書き込み、失敗時は銘柄単位で書き直す。
+
+    commit_rows 行ごと（と commit() 時）に BulkWriter で送信してコミットする。
+    送信・コミットに失敗した場合はロールバックしてから同じ行を1銘柄ずつ
+    書き込み・コミットし直し、それでも失敗した銘柄だけを on_error(code, exc)
+    に渡して failed_codes に記録する。他の銘柄の行は失われない。
+    """
+
+    def __init__(
+        self,
+        conn: pymysql.Connection,
+        table: str,
+        columns: Sequence[str],
+        update_columns: Optional[Sequence[str]] = None,
+        flush_rows: int = DEFAULT_FLUSH_ROWS,
+        commit_rows: int = DEFAULT_COMMIT_ROWS,
+        on_error: Optional[Callable[[str, Exception], None]] = None,
+    ) -> None:
+        self.writer = BulkWriter(
+            conn, table, columns, update_columns, flush_rows=flush_rows, commit_rows=0
+        )
+        self.commit_rows = commit_rows
+        self.on_error = on_error
+        self.pending: List[Tuple[str, List[Tuple]]] = []
+        self.pending_rows = 0
+        self.failed_codes: List[str] = []
+
+    @property
+    def affected_rows(self) -> int:
+        return self.writer.affected_rows
+
+    def add(self, code: str, rows: Iterable[Tuple]) -> None:
+        """1銘柄分の行を追加し、commit_rows 行に達したらまとめて書き込む。"""
+        rows = list(rows)
+        if not rows:
+            return
+        self.pending.append((code, rows))
+        self.pending_rows += len(rows)
+        if self.commit_rows > 0 and self.pending_rows >= self.commit_rows:
+            self.commit()
+
+    def commit(self) -> None:
+        """保留中の行を書き込んでコミットする（失敗時は銘柄ごとに書き直す）。"""
+        batch = self.pending
+        self.pending = []
+        self.pending_rows = 0
+        if not batch:
+            return
+        try:
+            for _, rows in batch:
+                self.writer.add(rows)
+            self.writer.commit()
+            return
+        except Exception:
+            # 原因の行（NaN・桁あふれなど）や切断を銘柄単位に切り分けるため書き直す
+            self._rollback()
+
+        for code, rows in batch:
+            try:
+                self.writer.add(rows)
+                self.writer.commit()
+            except Exception as exc:
+                self._rollback()
+                self.failed_codes.append(code)
+                if self.on_error is not None:
+                    self.on_error(code, exc)
+
+    def _rollback(self) -> None:
+        # 接続が切れていた場合は再接続し、残りの銘柄の書込を続けられるようにする
+        # （再接続できなければ後続の銘柄もそれぞれ失敗として記録される）
+        try:
+            self.writer.rollback()
+            return
+        except Exception:
+            pass
+        try:
+            self.writer.conn.ping(True)
+        except Exception:
+            pass
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""Yahoo Financeのチャート応答（生JSON）を圧縮して保存するディスクキャッシュ。
+
+本体は内容のSHA-256で命名した gzip ファイル（objects/）として保存し、
+銘柄シンボルと取得期間（period1/period2）からの参照を refs/ に記録する。
+同一内容の応答は1ファイルに集約される。
+"""
+
+from __future__ import annotations
+
+import gzip
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+DEFAULT_CACHE_DIR = Path(__file__).resolve().parents[2] / "cache" / "yahoo_chart"
+
+
+def _atomic_write(path: Path, data: bytes) -> None:
+    # 並列ワーカーや異常終了で壊れたファイルが残らないよう一時ファイル経由で置き換える
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as fp:
+            fp.write(data)
+        os.replace(tmp_name, path)
+    except BaseException:
+        if os.path.exists(tmp_name):
+            os.unlink(tmp_name)
+        raise
+
+
+class ChartPayloadCache:
+    """シンボル・期間をキーに生ペイロードを保存/取得する。"""
+
+    def __init__(self, root: Path = DEFAULT_CACHE_DIR) -> None:
+        self.root = Path(root)
+        self.objects_dir = self.root / "objects"
+        self.refs_dir = self.root / "refs"
+
+    def _object_path(self, digest: str) -> Path:
+        return self.objects_dir / digest[:2] / f"{digest}.json.gz"
+
+    def _ref_path(self, symbol: str, period1: int, period2: int) -> Path:
+        return self.refs_dir / symbol / f"{period1}-{period2}.ref"
+
+    def put(self, symbol: str, period1: int, period2: int, content: bytes) -> str:
+        """生ペイロードを保存し、内容のダイジェストを返す。"""
+        digest = hashlib.sha256(content).hexdigest()
+        object_path = self._object_path(digest)
+        if not object_path.exists():
+            _atomic_write(object_path, gzip.compress(content, compresslevel=6))
+        _atomic_write(self._ref_path(symbol, period1, period2), digest.encode("ascii"))
+        return digest
+
+    def get(self, symbol: str, period1: int, period2: int) -> Optional[bytes]:
+        """キャッシュ済みの生ペイロードを返す（未保存ならNone）。"""
+        ref_path = self._ref_path(symbol, period1, period2)
+        try:
+            digest = ref_path.read_text(encoding="ascii").strip()
+            with gzip.open(self._object_path(digest), "rb") as fp:
+                return fp.read()
+        except (OSError, EOFError):
+            return None
+
+    def symbols(self) -> List[str]:
+        """キャッシュに存在するシンボル一覧を返す。"""
+        if not self.refs_dir.is_dir():
+            return []
+        return sorted(path.name for path in self.refs_dir.iterdir() if path.is_dir())
+
+    def iter_entries(
+        self, symbols: Optional[Iterable[str]] = None
+    ) -> Iterator[Tuple[str, int, int, bytes]]:
+        """(シンボル, period1, period2, 生ペイロード) を期間順に返す。"""
+        targets = self.symbols() if symbols is None else list(symbols)
+        for symbol in targets:
+            symbol_dir = self.refs_dir / symbol
+            if not symbol_dir.is_dir():
+                continue
+            periods = []
+            for ref_path in symbol_dir.glob("*.ref"):
+                start_text, _, end_text = ref_path.stem.partition("-")
+                periods.append((int(start_text), int(end_text)))
+            for period1, period2 in sorted(periods):
+                content = self.get(symbol, period1, period2)
+                if content is not None:
+                    yield symbol, period1, period2, content
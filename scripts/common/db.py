@@ -1,7 +1,39 @@
 #!/usr/bin/env python3
 """Common database connection settings and helpers."""
 
+import logging
+import queue
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Mapping,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+import numpy as np
 import pymysql
+import pymysql.converters
+import pymysql.cursors
+from pymysql.constants import FIELD_TYPE
+
+try:
+    # mysqlclient (Debian: python3-mysqldb) parses the protocol in C.
+    import MySQLdb
+    import MySQLdb.converters
+    import MySQLdb.cursors
+    from MySQLdb.constants import FIELD_TYPE as MYSQLDB_FIELD_TYPE
+except ImportError:
+    MySQLdb = None
 
 DB_HOST = "localhost"
 DB_PORT = 3306
@@ -9,9 +41,41 @@ DB_USER = "root"
 DB_PASSWORD = "password"
 DB_NAME = "tradesystem"
 DB_CHARSET = "utf8mb4"
+# "pymysql" (default) or "mysqldb" selects the driver explicitly;
+# "auto" opts in to mysqlclient when installed and falls back to PyMySQL.
+DB_DRIVER = "pymysql"
+# Rows fetched per round trip by the streaming helpers.
+STREAM_BATCH_ROWS = 5000
+# Statements slower than this are logged by QueryStats (milliseconds).
+SLOW_QUERY_MS = 500.0
+# Statements listed in the end-of-run QueryStats summary.
+QUERY_SUMMARY_TOP = 10
+
+# Decoders that turn DECIMAL columns into float directly from the wire text,
+# so no Decimal object is allocated per value.
+FLOAT_DECIMAL_DECODERS = dict(pymysql.converters.conversions)
+FLOAT_DECIMAL_DECODERS[FIELD_TYPE.DECIMAL] = float
+FLOAT_DECIMAL_DECODERS[FIELD_TYPE.NEWDECIMAL] = float
+
+# Exceptions raised by any of the supported drivers.
+DB_ERRORS: Tuple[type, ...] = (pymysql.Error,)
+if MySQLdb is not None:
+    DB_ERRORS += (MySQLdb.Error,)
+
+
+# Connection returned by get_connection(): a PyMySQL or MySQLdb connection,
+# or an InstrumentedConnection wrapping either. They share the DB-API calls
+# used by the scripts, so callers are typed against this alias.
+DBConnection = Any
 
 
-def get_connection() -> pymysql.Connection:
+class Driver(NamedTuple):
+    name: str
+    connect: Callable[..., Any]
+    ss_cursor: type
+
+
+def _connect_pymysql(local_infile: bool, decimal_as_float: bool) -> Any:
     return pymysql.connect(
         host=DB_HOST,
         port=DB_PORT,
@@ -20,4 +84,423 @@ def get_connection() -> pymysql.Connection:
         database=DB_NAME,
         charset=DB_CHARSET,
         autocommit=False,
+        local_infile=local_infile,
+        conv=FLOAT_DECIMAL_DECODERS if decimal_as_float else None,
     )
+
+
+def _connect_mysqldb(local_infile: bool, decimal_as_float: bool) -> Any:
+    conv = dict(MySQLdb.converters.conversions)
+    if decimal_as_float:
+        conv[MYSQLDB_FIELD_TYPE.DECIMAL] = float
+        conv[MYSQLDB_FIELD_TYPE.NEWDECIMAL] = float
+    return MySQLdb.connect(
+        host=DB_HOST,
+        port=DB_PORT,
+        user=DB_USER,
+        passwd=DB_PASSWORD,
+        db=DB_NAME,
+        charset=DB_CHARSET,
+        autocommit=False,
+        local_infile=1 if local_infile else 0,
+        conv=conv,
+    )
+
+
+def available_drivers() -> List[str]:
+    drivers = ["pymysql"]
+    if MySQLdb is not None:
+        drivers.insert(0, "mysqldb")
+    return drivers
+
+
+def load_driver(name: str = DB_DRIVER) -> Driver:
+    if name == "auto":
+        name = "mysqldb" if MySQLdb is not None else "pymysql"
+    if name == "mysqldb":
+        if MySQLdb is None:
+            raise RuntimeError("mysqlclient (MySQLdb) is not installed")
+        return Driver("mysqldb", _connect_mysqldb, MySQLdb.cursors.SSCursor)
+    if name == "pymysql":
+        return Driver("pymysql", _connect_pymysql, pymysql.cursors.SSCursor)
+    raise ValueError(f"unknown DB driver: {name}")
+
+
+def _ss_cursor_class(conn: Any) -> type:
+    # Server-side (unbuffered) cursor class matching the connection's driver.
+    conn = getattr(conn, "raw", conn)
+    if MySQLdb is not None and isinstance(conn, MySQLdb.connections.Connection):
+        return MySQLdb.cursors.SSCursor
+    return pymysql.cursors.SSCursor
+
+
+# Unbuffered cursor classes; their row counts are taken from fetch*().
+_SS_CURSORS: Tuple[type, ...] = (pymysql.cursors.SSCursor,)
+if MySQLdb is not None:
+    _SS_CURSORS += (MySQLdb.cursors.SSCursor,)
+
+_SQL_STRING = re.compile(r"'(?:[^'\\]|\\.|'')*'")
+_SQL_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_SQL_PLACEHOLDER_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_SQL_SPACE = re.compile(r"\s+")
+
+
+def normalize_sql(sql: str) -> str:
+    """Reduce a statement to its shape so identical queries group together.
+
+    Literals and placeholders become `?` and placeholder lists such as
+    `IN (%s, %s, ...)` or a VALUES tuple collapse to `(...)`.
+    """
+    text = _SQL_STRING.sub("?", sql)
+    text = text.replace("%s", "?")
+    text = _SQL_NUMBER.sub("?", text)
+    text = _SQL_PLACEHOLDER_LIST.sub("(...)", text)
+    return _SQL_SPACE.sub(" ", text).strip()
+
+
+class QueryStat(NamedTuple):
+    sql: str
+    calls: int
+    seconds: float
+    rows: int
+    max_seconds: float
+
+
+class QueryStats:
+    """Thread-safe per-statement timing collector shared by InstrumentedConnection.
+
+    Time spent in fetch*() is added to the statement that produced the
+    result, so streamed reads are charged to their SELECT.
+    """
+
+    def __init__(
+        self,
+        logger: Optional[logging.Logger] = None,
+        slow_ms: float = SLOW_QUERY_MS,
+    ) -> None:
+        self.logger = logger
+        self.slow_seconds = slow_ms / 1000.0 if slow_ms > 0 else None
+        self._lock = threading.Lock()
+        # normalized sql -> [calls, seconds, rows, max_seconds]
+        self._stats: Dict[str, List[Any]] = {}
+
+    def record(self, sql: str, seconds: float, rows: int, calls: int = 1) -> None:
+        with self._lock:
+            entry = self._stats.get(sql)
+            if entry is None:
+                entry = self._stats[sql] = [0, 0.0, 0, 0.0]
+            entry[0] += calls
+            entry[1] += seconds
+            entry[2] += max(rows, 0)
+            if calls:
+                entry[3] = max(entry[3], seconds)
+
+    def check_slow(self, sql: str, seconds: float, rows: int) -> None:
+        if self.logger is None or self.slow_seconds is None:
+            return
+        if seconds >= self.slow_seconds:
+            self.logger.warning(
+                "低速SQL: %.1fms 行数=%d %s", seconds * 1000.0, rows, sql[:300]
+            )
+
+    def top(self, limit: int = QUERY_SUMMARY_TOP) -> List[QueryStat]:
+        with self._lock:
+            stats = [
+                QueryStat(sql, calls, seconds, rows, max_seconds)
+                for sql, (calls, seconds, rows, max_seconds) in self._stats.items()
+            ]
+        stats.sort(key=lambda stat: stat.seconds, reverse=True)
+        return stats[:limit]
+
+    def log_summary(
+        self,
+        logger: Optional[logging.Logger] = None,
+        limit: int = QUERY_SUMMARY_TOP,
+    ) -> None:
+        logger = logger or self.logger
+        if logger is None:
+            return
+        with self._lock:
+            total_calls = sum(entry[0] for entry in self._stats.values())
+            total_seconds = sum(entry[1] for entry in self._stats.values())
+        logger.info(
+            "===== SQL集計: 文種別 %d 実行 %d回 合計 %.3fs（上位%d件） =====",
+            len(self._stats),
+            total_calls,
+            total_seconds,
+            limit,
+        )
+        for rank, stat in enumerate(self.top(limit), start=1):
+            logger.info(
+                "%2d. 合計=%.3fs 回数=%d 平均=%.1fms 最大=%.1fms 行数=%d %s",
+                rank,
+                stat.seconds,
+                stat.calls,
+                stat.seconds * 1000.0 / stat.calls if stat.calls else 0.0,
+                stat.max_seconds * 1000.0,
+                stat.rows,
+                stat.sql[:300],
+            )
+
+
+class InstrumentedCursor:
+    """Cursor wrapper that times execute/executemany/fetch* into QueryStats."""
+
+    def __init__(self, cursor: Any, stats: QueryStats) -> None:
+        self._cursor = cursor
+        self._stats = stats
+        self._sql: Optional[str] = None
+        self._streaming = isinstance(cursor, _SS_CURSORS)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._cursor, name)
+
+    def __iter__(self) -> Iterator[Tuple]:
+        return iter(self.fetchone, None)
+
+    def __enter__(self) -> "InstrumentedCursor":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self._cursor.__exit__(exc_type, exc, tb)
+
+    def _run(self, method: Callable[..., Any], sql: str, *args: Any) -> Any:
+        self._sql = normalize_sql(sql)
+        started = time.perf_counter()
+        try:
+            return method(sql, *args)
+        finally:
+            elapsed = time.perf_counter() - started
+            # Unbuffered cursors report no row count until the result is read.
+            rows = 0 if self._streaming else self._cursor.rowcount
+            self._stats.record(self._sql, elapsed, rows)
+            self._stats.check_slow(self._sql, elapsed, rows)
+
+    def execute(self, sql: str, params: Any = None) -> Any:
+        return self._run(self._cursor.execute, sql, params)
+
+    def executemany(self, sql: str, params: Any) -> Any:
+        return self._run(self._cursor.executemany, sql, params)
+
+    def _fetch(self, method: Callable[..., Any], *args: Any) -> Any:
+        started = time.perf_counter()
+        result = method(*args)
+        if self._sql is not None:
+            rows = 0
+            # Buffered cursors already counted their rows in execute().
+            if self._streaming:
+                rows = len(result)
+            self._stats.record(
+                self._sql, time.perf_counter() - started, rows, calls=0
+            )
+        return result
+
+    def fetchone(self) -> Optional[Tuple]:
+        started = time.perf_counter()
+        row = self._cursor.fetchone()
+        if self._sql is not None:
+            rows = 1 if self._streaming and row is not None else 0
+            self._stats.record(self._sql, time.perf_counter() - started, rows, calls=0)
+        return row
+
+    def fetchmany(self, size: Optional[int] = None) -> Sequence[Tuple]:
+        if size is None:
+            return self._fetch(self._cursor.fetchmany)
+        return self._fetch(self._cursor.fetchmany, size)
+
+    def fetchall(self) -> Sequence[Tuple]:
+        return self._fetch(self._cursor.fetchall)
+
+
+class InstrumentedConnection:
+    """Connection wrapper whose cursors report to a QueryStats collector."""
+
+    def __init__(self, conn: Any, stats: QueryStats) -> None:
+        self.raw = conn
+        self.stats = stats
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.raw, name)
+
+    def cursor(self, *args: Any, **kwargs: Any) -> InstrumentedCursor:
+        return InstrumentedCursor(self.raw.cursor(*args, **kwargs), self.stats)
+
+
+def get_connection(
+    local_infile: bool = False,
+    decimal_as_float: bool = False,
+    driver: str = DB_DRIVER,
+    stats: Optional[QueryStats] = None,
+) -> DBConnection:
+    # local_infile=True is required for LOAD DATA LOCAL INFILE (common.bulk_writer).
+    # decimal_as_float=True returns DECIMAL columns as float instead of Decimal.
+    # stats wraps the connection so every statement is timed into QueryStats.
+    conn = load_driver(driver).connect(local_infile, decimal_as_float)
+    if stats is not None:
+        return InstrumentedConnection(conn, stats)
+    return conn
+
+
+class ConnectionPool:
+    """Small fixed-size pool; connections are opened lazily up to `size`."""
+
+    def __init__(self, size: int, **connect_kwargs: Any) -> None:
+        if size <= 0:
+            raise ValueError("size must be >= 1")
+        self.size = size
+        self.connect_kwargs = connect_kwargs
+        self._idle: "queue.LifoQueue[DBConnection]" = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._opened = 0
+
+    def acquire(self) -> DBConnection:
+        with self._lock:
+            opening = self._idle.empty() and self._opened < self.size
+            if opening:
+                self._opened += 1
+        if opening:
+            try:
+                return get_connection(**self.connect_kwargs)
+            except Exception:
+                with self._lock:
+                    self._opened -= 1
+                raise
+        conn = self._idle.get()
+        # Replace connections dropped by the server while idle (wait_timeout).
+        try:
+            conn.ping()
+        except DB_ERRORS:
+            self.release(conn, discard=True)
+            return self.acquire()
+        return conn
+
+    def release(self, conn: DBConnection, discard: bool = False) -> None:
+        if discard:
+            with self._lock:
+                self._opened -= 1
+            try:
+                conn.close()
+            except DB_ERRORS:
+                pass
+            return
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self) -> Iterator[DBConnection]:
+        conn = self.acquire()
+        try:
+            yield conn
+        except BaseException:
+            # The connection may hold a half-finished transaction or unread result.
+            self.release(conn, discard=True)
+            raise
+        self.release(conn)
+
+    def close_all(self) -> None:
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self.release(conn, discard=True)
+
+
+def stream_batches(
+    conn: DBConnection,
+    sql: str,
+    params: Optional[Sequence[Any]] = None,
+    batch_size: int = STREAM_BATCH_ROWS,
+) -> Iterator[List[Tuple]]:
+    """Yield the result set in lists of up to `batch_size` rows.
+
+    Uses an unbuffered server-side cursor, so only one batch is held in
+    memory. The connection cannot run other statements until the iterator
+    is exhausted or closed.
+    """
+    with conn.cursor(_ss_cursor_class(conn)) as cursor:
+        cursor.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield list(rows)
+
+
+def stream_rows(
+    conn: DBConnection,
+    sql: str,
+    params: Optional[Sequence[Any]] = None,
+    batch_size: int = STREAM_BATCH_ROWS,
+) -> Iterator[Tuple]:
+    """Yield result rows one at a time (see stream_batches)."""
+    for rows in stream_batches(conn, sql, params, batch_size):
+        yield from rows
+
+
+def _to_array(values: Sequence[Any], dtype: Any) -> np.ndarray:
+    # NULL becomes NaN for float dtypes and NaT for datetime64 dtypes.
+    if dtype is None:
+        return np.array(values, dtype=object)
+    return np.array(values, dtype=dtype)
+
+
+def fetch_arrays(
+    conn: DBConnection,
+    sql: str,
+    params: Optional[Sequence[Any]] = None,
+    dtypes: Optional[Mapping[str, Any]] = None,
+) -> Dict[str, np.ndarray]:
+    """Run a query and return each result column as a NumPy array.
+
+    Columns named in `dtypes` are converted to that dtype (e.g. np.float64,
+    "datetime64[D]"); the rest are returned as object arrays. Use a
+    connection opened with decimal_as_float=True to skip Decimal decoding.
+    """
+    dtypes = dtypes or {}
+    with conn.cursor() as cursor:
+        cursor.execute(sql, params)
+        names = [desc[0] for desc in cursor.description]
+        rows = cursor.fetchall()
+    columns = list(zip(*rows)) if rows else [()] * len(names)
+    return {
+        name: _to_array(values, dtypes.get(name))
+        for name, values in zip(names, columns)
+    }
+
+
+def fetch_frame(
+    conn: DBConnection,
+    sql: str,
+    params: Optional[Sequence[Any]] = None,
+    float_columns: Sequence[str] = (),
+    batch_size: int = STREAM_BATCH_ROWS,
+):
+    """Stream a query into a pandas DataFrame with float64 numeric columns.
+
+    Rows are read in batches through a server-side cursor and each batch is
+    converted column-wise, so the full result is never held as tuples.
+    """
+    # pandas is only needed by the callers that build DataFrames.
+    import pandas as pd
+
+    float_set = set(float_columns)
+    names: List[str] = []
+    chunks: Dict[str, List[np.ndarray]] = {}
+    with conn.cursor(_ss_cursor_class(conn)) as cursor:
+        cursor.execute(sql, params)
+        names = [desc[0] for desc in cursor.description]
+        chunks = {name: [] for name in names}
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for name, values in zip(names, zip(*rows)):
+                dtype = np.float64 if name in float_set else None
+                chunks[name].append(_to_array(values, dtype))
+
+    data = {}
+    for name in names:
+        dtype = np.float64 if name in float_set else object
+        parts = chunks[name]
+        data[name] = np.concatenate(parts) if parts else np.array([], dtype=dtype)
+    return pd.DataFrame(data, columns=names)
@@ -3,10 +3,29 @@
 
 from __future__ import annotations
 
+import threading
+from bisect import bisect_left, bisect_right
 from datetime import date, datetime, timedelta
-from typing import Iterable, List, Optional, Set, Union
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Set, Union
+
+import numpy as np
 
 DateLike = Union[date, datetime]
+# 配列APIが受け付ける日付列（date/datetime の列、datetime64 配列、pandas の列など）
+DatesLike = Any
+
+# コンパイル済みカレンダーが最初に保持する範囲（範囲外の照会時は自動で拡張する）
+CALENDAR_START = date(2000, 1, 1)
+CALENDAR_YEARS_AHEAD = 5
+# 範囲を拡張する際に、必要な範囲の前後へ余分に確保する日数
+CALENDAR_EXTEND_DAYS = 366
+# 休場日セットごとに保持するコンパイル済みカレンダーの数
+CALENDAR_CACHE_SIZE = 8
+# 土日・年末年始以外の休場日の定義ファイル（1行1日 YYYY-MM-DD、# 以降はコメント）。
+# trading_calendar テーブルの生成と、テーブルを使わない算出の両方がこの定義を読む。
+EXTRA_HOLIDAYS_FILE = Path(__file__).resolve().with_name("extra_holidays.txt")
 
 
 def _to_date(value: DateLike) -> date:
@@ -15,10 +34,29 @@ def _to_date(value: DateLike) -> date:
     return value
 
 
-def _normalize_holidays(extra_holidays: Optional[Iterable[DateLike]]) -> Set[date]:
+@lru_cache(maxsize=None)
+def load_extra_holidays(path: Path = EXTRA_HOLIDAYS_FILE) -> FrozenSet[date]:
+    """休場日定義ファイルの日付を返す（ファイルがなければ空）。"""
+    if not path.exists():
+        return frozenset()
+    holidays: Set[date] = set()
+    for line in path.read_text(encoding="utf-8").splitlines():
+        value = line.split("#", 1)[0].strip()
+        if value:
+            holidays.add(date.fromisoformat(value))
+    return frozenset(holidays)
+
+
+def _normalize_holidays(
+    extra_holidays: Optional[Iterable[DateLike]],
+) -> FrozenSet[date]:
+    shared = load_extra_holidays()
     if extra_holidays is None:
-        return set()
-    return {_to_date(day) for day in extra_holidays}
+        return shared
+    if isinstance(extra_holidays, frozenset) and shared <= extra_holidays:
+        # ExchangeCalendar が保持する正規化済みのセットはそのまま使う
+        return extra_holidays
+    return shared.union(_to_date(day) for day in extra_holidays)
 
 
 def is_exchange_holiday(
@@ -30,6 +68,7 @@ def is_exchange_holiday(
     休場日の定義:
     - 土日
     - 年末年始（12/31, 1/1, 1/2, 1/3）
+    - EXTRA_HOLIDAYS_FILE に記載された休場日
     - extra_holidays で渡された任意休場日
     """
     day = _to_date(target_date)
@@ -55,6 +94,133 @@ def is_exchange_business_day(
     return not is_exchange_holiday(target_date, extra_holidays)
 
 
+class ExchangeCalendar:
+    """営業日の昇順配列と序数（配列上の位置）を前計算したカレンダー。
+
+    休場日セットと対象範囲ごとに1回だけ作成し、営業日の移動・範囲列挙・
+    件数は二分探索で求める。範囲外の日付は扱えないため、通常は
+    get_exchange_calendar() 経由で必要な範囲を持つものを取得する。
+    """
+
+    def __init__(self, holidays: FrozenSet[date], first: date, last: date) -> None:
+        self.holidays = holidays
+        self.first = first
+        self.last = last
+        self.days: List[date] = []
+        current = first
+        while current <= last:
+            if not is_exchange_holiday(current, holidays):
+                self.days.append(current)
+            current += timedelta(days=1)
+        # bisect 用の序数（date.toordinal）配列
+        self.ordinals: List[int] = [day.toordinal() for day in self.days]
+        self._busdaycal: Optional[np.busdaycalendar] = None
+
+    @property
+    def busdaycal(self) -> np.busdaycalendar:
+        """NumPy の営業日演算用カレンダー（土日以外の休場日を holidays に持つ）。
+
+        first〜last の範囲外の日付は土日のみを休場日として扱うため、
+        配列APIは照会範囲をカバーするカレンダーを取得してから使う。
+        """
+        if self._busdaycal is None:
+            all_days = np.arange(
+                np.datetime64(self.first, "D"),
+                np.datetime64(self.last, "D") + 1,
+            )
+            business = np.array(self.days, dtype="datetime64[D]")
+            weekday_holidays = all_days[
+                np.is_busday(all_days) & ~np.isin(all_days, business)
+            ]
+            self._busdaycal = np.busdaycalendar(
+                weekmask="1111100", holidays=weekday_holidays
+            )
+        return self._busdaycal
+
+    def covers(self, start: date, end: date) -> bool:
+        return self.first <= start and end <= self.last
+
+    def position(self, day: DateLike) -> int:
+        """day 以降で最初の営業日の位置（day が営業日ならその位置）を返す。"""
+        return bisect_left(self.ordinals, _to_date(day).toordinal())
+
+    def is_business_day(self, day: DateLike) -> bool:
+        target = _to_date(day).toordinal()
+        index = bisect_left(self.ordinals, target)
+        return index < len(self.ordinals) and self.ordinals[index] == target
+
+    def shift(self, base_date: DateLike, offset: int) -> Optional[date]:
+        """営業日ベースでoffset日移動した日付。範囲外になる場合はNoneを返す。
+
+        基準日自体が休場日でも、基準日から数えて offset 番目の営業日を返す。
+        """
+        day = _to_date(base_date)
+        if offset == 0:
+            return day
+        target = day.toordinal()
+        if offset > 0:
+            index = bisect_right(self.ordinals, target) + offset - 1
+        else:
+            index = bisect_left(self.ordinals, target) + offset
+        if index < 0 or index >= len(self.days):
+            return None
+        return self.days[index]
+
+    def between(self, start_date: DateLike, end_date: DateLike) -> List[date]:
+        """開始日〜終了日（両端含む）の営業日一覧を返す。"""
+        lo = bisect_left(self.ordinals, _to_date(start_date).toordinal())
+        hi = bisect_right(self.ordinals, _to_date(end_date).toordinal())
+        return self.days[lo:hi]
+
+    def count(self, start_date: DateLike, end_date: DateLike) -> int:
+        """開始日〜終了日（両端含む）の営業日数を返す。"""
+        lo = bisect_left(self.ordinals, _to_date(start_date).toordinal())
+        hi = bisect_right(self.ordinals, _to_date(end_date).toordinal())
+        return max(hi - lo, 0)
+
+
+_calendar_cache: Dict[FrozenSet[date], ExchangeCalendar] = {}
+_calendar_lock = threading.Lock()
+
+
+def get_exchange_calendar(
+    extra_holidays: Optional[Iterable[DateLike]] = None,
+    start_date: Optional[DateLike] = None,
+    end_date: Optional[DateLike] = None,
+) -> ExchangeCalendar:
+    """休場日セットごとにキャッシュしたコンパイル済みカレンダーを返す。
+
+    start_date〜end_date がキャッシュ中の範囲に収まらない場合は、
+    前後に CALENDAR_EXTEND_DAYS 日の余裕を持たせて作り直す。
+    """
+    holidays = _normalize_holidays(extra_holidays)
+    start = _to_date(start_date) if start_date is not None else CALENDAR_START
+    end = _to_date(end_date) if end_date is not None else start
+    if start > end:
+        start, end = end, start
+
+    with _calendar_lock:
+        calendar = _calendar_cache.get(holidays)
+        if calendar is not None and calendar.covers(start, end):
+            return calendar
+
+        if calendar is None:
+            first = min(start, CALENDAR_START)
+            last = max(
+                end, date(date.today().year + CALENDAR_YEARS_AHEAD, 12, 31)
+            )
+        else:
+            first = min(start - timedelta(days=CALENDAR_EXTEND_DAYS), calendar.first)
+            last = max(end + timedelta(days=CALENDAR_EXTEND_DAYS), calendar.last)
+        calendar = ExchangeCalendar(holidays, first, last)
+
+        _calendar_cache.pop(holidays, None)
+        while len(_calendar_cache) >= CALENDAR_CACHE_SIZE:
+            _calendar_cache.pop(next(iter(_calendar_cache)))
+        _calendar_cache[holidays] = calendar
+        return calendar
+
+
 def calculate_exchange_business_days(
     start_date: DateLike,
     end_date: DateLike,
@@ -66,15 +232,7 @@ def calculate_exchange_business_days(
     if start > end:
         return []
 
-    holidays = _normalize_holidays(extra_holidays)
-    output: List[date] = []
-    current = start
-    while current <= end:
-        if not is_exchange_holiday(current, holidays):
-            output.append(current)
-        current += timedelta(days=1)
-
-    return output
+    return get_exchange_calendar(extra_holidays, start, end).between(start, end)
 
 
 def shift_exchange_business_day(
@@ -84,18 +242,118 @@ def shift_exchange_business_day(
 ) -> date:
     """基準日から営業日ベースでoffset日移動した日付を返す。"""
     day = _to_date(base_date)
-    holidays = _normalize_holidays(extra_holidays)
 
     if offset == 0:
         return day
 
-    step = 1 if offset > 0 else -1
-    remaining = abs(offset)
-    current = day
+    # offset 営業日分を含むと見込む暦日幅で探し、足りなければ幅を倍にする
+    span = abs(offset) * 2 + 14
+    while True:
+        calendar = get_exchange_calendar(
+            extra_holidays,
+            day - timedelta(days=span if offset < 0 else 0),
+            day + timedelta(days=span if offset > 0 else 0),
+        )
+        shifted = calendar.shift(day, offset)
+        if shifted is not None:
+            return shifted
+        span *= 2
+
+
+def _to_datetime64(dates: DatesLike) -> np.ndarray:
+    # datetime や datetime64[ns] は日付に切り捨てる
+    values = np.asarray(dates)
+    if values.dtype == object or values.dtype.kind == "M":
+        return values.astype("datetime64[D]")
+    return np.asarray(values, dtype="datetime64[D]")
+
+
+def _calendar_for_dates(
+    extra_holidays: Optional[Iterable[DateLike]],
+    days: np.ndarray,
+    before: int = 0,
+    after: int = 0,
+) -> ExchangeCalendar:
+    # 配列の最小日-before〜最大日+after をカバーするコンパイル済みカレンダーを返す
+    if days.size == 0:
+        return get_exchange_calendar(extra_holidays)
+    lo = days.min().item() - timedelta(days=before)
+    hi = days.max().item() + timedelta(days=after)
+    return get_exchange_calendar(extra_holidays, lo, hi)
+
+
+def shift_exchange_business_days(
+    base_dates: DatesLike,
+    offsets: Any,
+    extra_holidays: Optional[Iterable[DateLike]] = None,
+) -> np.ndarray:
+    """shift_exchange_business_day の配列版（datetime64[D] の配列を返す）。
+
+    base_dates と offsets はブロードキャストされるため、1つの基準日と
+    複数の offset（例: range(1, 6)）や、日付列と offset 列を渡せる。
+    """
+    days = _to_datetime64(base_dates)
+    steps = np.asarray(offsets, dtype=np.int64)
+    days, steps = np.broadcast_arrays(days, steps)
+    if days.size == 0:
+        return days.copy()
+
+    # 休場日の基準日からは、正の移動なら直前の営業日、負の移動なら直後の営業日を
+    # 起点に数えると、スカラー版と同じく基準日から数えた offset 番目になる
+    span = int(np.abs(steps).max()) * 2 + 14
+    while True:
+        calendar = _calendar_for_dates(extra_holidays, days, span, span)
+        busdaycal = calendar.busdaycal
+        forward = np.busday_offset(days, steps, roll="backward", busdaycal=busdaycal)
+        backward = np.busday_offset(days, steps, roll="forward", busdaycal=busdaycal)
+        shifted = np.where(steps > 0, forward, np.where(steps < 0, backward, days))
+        if calendar.covers(shifted.min().item(), shifted.max().item()):
+            return shifted
+        span *= 2
 
-    while remaining > 0:
-        current += timedelta(days=step)
-        if not is_exchange_holiday(current, holidays):
-            remaining -= 1
 
-    return current
+def exchange_business_days_between(
+    start_date: DateLike,
+    end_date: DateLike,
+    extra_holidays: Optional[Iterable[DateLike]] = None,
+) -> np.ndarray:
+    """calculate_exchange_business_days の配列版（datetime64[D] の配列を返す）。"""
+    start = np.datetime64(_to_date(start_date), "D")
+    end = np.datetime64(_to_date(end_date), "D")
+    if start > end:
+        return np.array([], dtype="datetime64[D]")
+    calendar = get_exchange_calendar(
+        extra_holidays, _to_date(start_date), _to_date(end_date)
+    )
+    days = np.arange(start, end + 1)
+    return days[np.is_busday(days, busdaycal=calendar.busdaycal)]
+
+
+def is_exchange_business_days(
+    dates: DatesLike,
+    extra_holidays: Optional[Iterable[DateLike]] = None,
+) -> np.ndarray:
+    """is_exchange_business_day の配列版（bool 配列を返す）。"""
+    days = _to_datetime64(dates)
+    if days.size == 0:
+        return np.zeros(days.shape, dtype=bool)
+    calendar = _calendar_for_dates(extra_holidays, days)
+    return np.is_busday(days, busdaycal=calendar.busdaycal)
+
+
+def count_exchange_business_days(
+    start_dates: DatesLike,
+    end_dates: DatesLike,
+    extra_holidays: Optional[Iterable[DateLike]] = None,
+) -> np.ndarray:
+    """開始日〜終了日（両端含む）の営業日数を要素ごとに返す（開始日>終了日は0）。"""
+    starts = _to_datetime64(start_dates)
+    ends = _to_datetime64(end_dates)
+    starts, ends = np.broadcast_arrays(starts, ends)
+    if starts.size == 0:
+        return np.zeros(starts.shape, dtype=np.int64)
+    calendar = _calendar_for_dates(
+        extra_holidays, np.concatenate([starts.ravel(), ends.ravel()])
+    )
+    counts = np.busday_count(starts, ends + 1, busdaycal=calendar.busdaycal)
+    return np.maximum(counts, 0)
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""移動平均・RSI・MACDを銘柄×日付のパネル（2次元配列）で一括計算するカーネル。
+
+パネルは1行が1銘柄で、終値（NULLを除いたもの）を日付順に左詰めし、
+長さの足りない行の末尾はNaNで埋める。移動平均は累積和の差、EMAと
+Wilder平滑化は1次の線形再帰フィルタ（scipy.signal.lfilter）で計算するため、
+数千銘柄でも数回の配列演算で済む。結果は common.indicators の
+compute_moving_averages・compute_rsi・compute_macd（行ごとのループ）と
+浮動小数点の誤差の範囲で一致する。
+"""
+
+from __future__ import annotations
+
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+from scipy.signal import lfilter
+
+
+def build_panel(series: Sequence[Sequence[float]]) -> Tuple[np.ndarray, np.ndarray]:
+    """系列のリストを (銘柄数, 最大長) のNaN埋めパネルと各行の長さの配列にする。"""
+    lengths = np.array([len(values) for values in series], dtype=np.int64)
+    width = int(lengths.max()) if lengths.size else 0
+    panel = np.full((len(series), width), np.nan)
+    for index, values in enumerate(series):
+        panel[index, : lengths[index]] = values
+    return panel, lengths
+
+
+def rolling_mean(panel: np.ndarray, window: int) -> np.ndarray:
+    """行ごとの window 本の単純移動平均（窓が揃うまではNaN）。"""
+    output = np.full(panel.shape, np.nan)
+    if window <= 0 or panel.shape[1] < window:
+        return output
+    # 桁落ちを抑えるため、行の先頭値を引いてから累積和を取る
+    base = panel[:, :1]
+    cumsum = np.cumsum(panel - base, axis=1)
+    sums = cumsum[:, window - 1 :].copy()
+    sums[:, 1:] -= cumsum[:, : -window]
+    output[:, window - 1 :] = sums / window + base
+    return output
+
+
+def exponential_smoothing(
+    panel: np.ndarray,
+    alpha: float,
+    initial: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """y[t] = alpha * x[t] + (1 - alpha) * y[t-1] を行ごとに計算する。
+
+    initial は行ごとの直前の平滑値で、NaN（または省略）の行は
+    先頭の値をそのまま初期値とする。
+    """
+    if panel.shape[1] == 0:
+        return panel.copy()
+    seed = panel[:, 0]
+    if initial is not None:
+        seed = np.where(np.isnan(initial), seed, initial)
+    decay = 1.0 - alpha
+    output, _ = lfilter(
+        [alpha], [1.0, -decay], panel, axis=1, zi=(decay * seed)[:, np.newaxis]
+    )
+    return output
+
+
+def wilder_average(values: np.ndarray, window: int) -> np.ndarray:
+    """Wilder平滑化（先頭 window 本の単純平均から開始し、以降は 1/window で平滑化）。"""
+    output = np.full(values.shape, np.nan)
+    if window <= 0 or values.shape[1] < window:
+        return output
+    output[:, window - 1] = values[:, :window].sum(axis=1) / window
+    if values.shape[1] > window:
+        output[:, window:] = exponential_smoothing(
+            values[:, window:], 1.0 / window, output[:, window - 1]
+        )
+        # 先頭の窓にNaNを含む行は初期値がないため、以降もNaNのままにする
+        output[np.isnan(output[:, window - 1]), window:] = np.nan
+    return output
+
+
+def rsi(
+    panel: np.ndarray,
+    window: int,
+    prev_close: Optional[np.ndarray] = None,
+    prev_avg_gain: Optional[np.ndarray] = None,
+    prev_avg_loss: Optional[np.ndarray] = None,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(RSI, 平均上昇幅, 平均下落幅) を終値パネルと同じ形で返す（平均が揃うまではNaN）。
+
+    prev_* は保存済みの直前の終値・平均（行ごと、NaNは未保存）で、保存済みの行は
+    先頭の終値から続けて平滑化し、未保存の行は先頭 window 本の単純平均から始める。
+    """
+    avg_gain = np.full(panel.shape, np.nan)
+    avg_loss = np.full(panel.shape, np.nan)
+    if window <= 0 or panel.shape[1] == 0:
+        return np.full(panel.shape, np.nan), avg_gain, avg_loss
+
+    rows = panel.shape[0]
+    prev_close = np.full(rows, np.nan) if prev_close is None else prev_close
+    prev_avg_gain = np.full(rows, np.nan) if prev_avg_gain is None else prev_avg_gain
+    prev_avg_loss = np.full(rows, np.nan) if prev_avg_loss is None else prev_avg_loss
+    resumed = ~(np.isnan(prev_close) | np.isnan(prev_avg_gain) | np.isnan(prev_avg_loss))
+
+    # change[:, t] は t 番目の終値と1つ前（先頭は保存済みの終値）との差
+    change = np.diff(np.column_stack([prev_close, panel]), axis=1)
+    gains = np.where(change > 0, change, 0.0)
+    losses = np.where(change < 0, -change, 0.0)
+    fresh = ~resumed
+    if fresh.any():
+        avg_gain[fresh, 1:] = wilder_average(gains[fresh, 1:], window)
+        avg_loss[fresh, 1:] = wilder_average(losses[fresh, 1:], window)
+    if resumed.any():
+        alpha = 1.0 / window
+        avg_gain[resumed] = exponential_smoothing(
+            gains[resumed], alpha, prev_avg_gain[resumed]
+        )
+        avg_loss[resumed] = exponential_smoothing(
+            losses[resumed], alpha, prev_avg_loss[resumed]
+        )
+    # 末尾のNaN埋めは平均もNaNにする（np.where で0になった分を戻す）
+    padded = np.isnan(change)
+    avg_gain[padded] = np.nan
+    avg_loss[padded] = np.nan
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        values = 100.0 - 100.0 / (1.0 + avg_gain / avg_loss)
+    values = np.where(avg_loss == 0, 100.0, values)
+    values = np.where(avg_gain == 0, 0.0, values)
+    values = np.where((avg_gain == 0) & (avg_loss == 0), 50.0, values)
+    values[np.isnan(avg_gain)] = np.nan
+    return values, avg_gain, avg_loss
+
+
+def macd(
+    panel: np.ndarray,
+    window_short: int,
+    window_long: int,
+    window_signal: int,
+    prev_ema_short: Optional[np.ndarray] = None,
+    prev_ema_long: Optional[np.ndarray] = None,
+    prev_signal: Optional[np.ndarray] = None,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """(短期EMA, 長期EMA, MACD, シグナル, ヒストグラム) のパネルを返す。
+
+    prev_* は保存済みの直前値（行ごと、NaNは未保存）で、続きから計算する。
+    """
+    ema_short = exponential_smoothing(panel, 2.0 / (window_short + 1), prev_ema_short)
+    ema_long = exponential_smoothing(panel, 2.0 / (window_long + 1), prev_ema_long)
+    macd_line = ema_short - ema_long
+    signal = exponential_smoothing(macd_line, 2.0 / (window_signal + 1), prev_signal)
+    return ema_short, ema_long, macd_line, signal, macd_line - signal
@@ -0,0 +1,851 @@
+#!/usr/bin/env python3
+"""移動平均・RSI・MACDをまとめて計算してMySQLに保存する指標エンジン。
+
+銘柄ごとに終値を1回だけ読み込み、有効な指標をすべて同じ終値から計算する。
+計算は既定で panel_codes 銘柄ずつ common.indicator_kernels の配列演算で
+まとめて行い（panel_codes=0 は銘柄ごとの行ループ）、結果は同じになる。
+書込は主スレッドが指標ごとの BulkWriter に振り分け、commit_rows 行ごとに
+全テーブル分をまとめて1回コミットする。calc_indicators.py と、指標ごとの
+calc_moving_averages.py・calc_rsi.py・calc_macd.py から使う。
+"""
+
+from __future__ import annotations
+
+import argparse
+import math
+from bisect import bisect_right
+from collections import deque
+from datetime import date
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+import pymysql
+
+from common.bulk_writer import DEFAULT_COMMIT_ROWS, DEFAULT_FLUSH_ROWS, BulkWriter
+from common.db import (
+    QUERY_SUMMARY_TOP,
+    SLOW_QUERY_MS,
+    ConnectionPool,
+    QueryStats,
+    get_connection,
+    stream_batches,
+)
+from common.indicator_kernels import (
+    build_panel,
+    macd as macd_panel,
+    rolling_mean,
+    rsi as rsi_panel,
+)
+from common.load_control import LoadController, run_adaptive
+
+# 指標の識別子（--indicators で指定する名前）
+INDICATOR_MA = "ma"
+INDICATOR_RSI = "rsi"
+INDICATOR_MACD = "macd"
+ALL_INDICATORS = (INDICATOR_MA, INDICATOR_RSI, INDICATOR_MACD)
+
+# 書込先テーブルの列と、重複時に更新する列
+MA_COLUMNS = ["trade_date", "code", "ma5", "ma25"]
+MA_UPDATE_COLUMNS = ["ma5", "ma25"]
+RSI_COLUMNS = [
+    "trade_date",
+    "code",
+    "window",
+    "rsi",
+    "avg_gain",
+    "avg_loss",
+    "close_price",
+]
+RSI_UPDATE_COLUMNS = ["rsi", "avg_gain", "avg_loss", "close_price"]
+MACD_COLUMNS = [
+    "trade_date",
+    "code",
+    "window_short",
+    "window_long",
+    "window_signal",
+    "ema_short",
+    "ema_long",
+    "macd",
+    "signal",
+    "histogram",
+]
+MACD_UPDATE_COLUMNS = ["ema_short", "ema_long", "macd", "signal", "histogram"]
+# パネルでまとめて計算する銘柄数（0は銘柄ごとに行ごとのループで計算）
+PANEL_CODES = 500
+
+
+class IndicatorOptions(NamedTuple):
+    # 計算する指標（ALL_INDICATORS の部分集合）
+    indicators: Tuple[str, ...] = ALL_INDICATORS
+    codes: str = ""
+    source_table: str = "stock_prices_daily"
+    ma_table: str = "stock_prices_daily_ma"
+    rsi_table: str = "stock_prices_daily_rsi"
+    macd_table: str = "stock_prices_daily_macd"
+    ma_window_short: int = 5
+    ma_window_long: int = 25
+    rsi_window: int = 14
+    macd_window_short: int = 12
+    macd_window_long: int = 26
+    macd_window_signal: int = 9
+    workers: int = 1
+    flush_rows: int = DEFAULT_FLUSH_ROWS
+    commit_rows: int = DEFAULT_COMMIT_ROWS
+    load_data: bool = False
+    panel_codes: int = PANEL_CODES
+    slow_query_ms: float = SLOW_QUERY_MS
+    query_summary_top: int = QUERY_SUMMARY_TOP
+
+
+def resolve_codes(conn: pymysql.Connection, codes_arg: str) -> List[str]:
+    if codes_arg:
+        return [code.strip() for code in codes_arg.split(",") if code.strip()]
+
+    sql = "SELECT DISTINCT code FROM tse_listings ORDER BY code"
+    with conn.cursor() as cursor:
+        cursor.execute(sql)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def fetch_prices(
+    conn: pymysql.Connection,
+    table: str,
+    code: str,
+    start_date: Optional[date] = None,
+) -> List[Tuple]:
+    # start_date 以降（省略時は全期間）の (取引日, 終値) を日付順に返す
+    if start_date is None:
+        sql = f"""
+            SELECT trade_date, `close`
+            FROM `{table}`
+            WHERE code = %s
+            ORDER BY trade_date
+        """
+        # 全期間の読込はサーバー側カーソルで STREAM_BATCH_ROWS 行ずつ受け取る
+        rows: List[Tuple] = []
+        for batch in stream_batches(conn, sql, (code,)):
+            rows.extend(batch)
+        return rows
+
+    sql = f"""
+        SELECT trade_date, `close`
+        FROM `{table}`
+        WHERE code = %s
+          AND trade_date >= %s
+        ORDER BY trade_date
+    """
+    with conn.cursor() as cursor:
+        cursor.execute(sql, (code, start_date))
+        return list(cursor.fetchall())
+
+
+def fetch_window_start_date(
+    conn: pymysql.Connection,
+    table: str,
+    code: str,
+    end_date: date,
+    rows_back: int,
+) -> Optional[date]:
+    # end_date から数えて rows_back 行前の取引日（行数が足りなければNone）
+    sql = f"""
+        SELECT trade_date
+        FROM `{table}`
+        WHERE code = %s
+          AND trade_date <= %s
+        ORDER BY trade_date DESC
+        LIMIT 1 OFFSET %s
+    """
+    with conn.cursor() as cursor:
+        cursor.execute(sql, (code, end_date, rows_back))
+        row = cursor.fetchone()
+        return row[0] if row else None
+
+
+def fetch_latest_ma_date(
+    conn: pymysql.Connection, table: str, code: str
+) -> Optional[date]:
+    sql = f"""
+        SELECT MAX(trade_date)
+        FROM `{table}`
+        WHERE code = %s
+    """
+    with conn.cursor() as cursor:
+        cursor.execute(sql, (code,))
+        row = cursor.fetchone()
+        return row[0] if row and row[0] is not None else None
+
+
+def fetch_latest_rsi_state(
+    conn: pymysql.Connection, table: str, code: str, window: int
+) -> Optional[Tuple]:
+    sql = f"""
+        SELECT trade_date, avg_gain, avg_loss, close_price
+        FROM `{table}`
+        WHERE code = %s
+          AND `window` = %s
+        ORDER BY trade_date DESC
+        LIMIT 1
+    """
+    with conn.cursor() as cursor:
+        cursor.execute(sql, (code, window))
+        return cursor.fetchone()
+
+
+def fetch_latest_macd_state(
+    conn: pymysql.Connection,
+    table: str,
+    code: str,
+    window_short: int,
+    window_long: int,
+    window_signal: int,
+) -> Optional[Tuple]:
+    sql = f"""
+        SELECT trade_date, ema_short, ema_long, `signal`
+        FROM `{table}`
+        WHERE code = %s
+          AND window_short = %s
+          AND window_long = %s
+          AND window_signal = %s
+        ORDER BY trade_date DESC
+        LIMIT 1
+    """
+    with conn.cursor() as cursor:
+        cursor.execute(sql, (code, window_short, window_long, window_signal))
+        return cursor.fetchone()
+
+
+def compute_moving_averages(
+    code: str,
+    rows: Sequence[Tuple],
+    window_short: int,
+    window_long: int,
+) -> List[Tuple]:
+    short_q: deque = deque()
+    long_q: deque = deque()
+    short_sum = 0.0
+    long_sum = 0.0
+    output: List[Tuple] = []
+
+    for trade_date, close_v in rows:
+        if close_v is None:
+            continue
+
+        close_f = float(close_v)
+        short_q.append(close_f)
+        short_sum += close_f
+        if len(short_q) > window_short:
+            short_sum -= short_q.popleft()
+
+        long_q.append(close_f)
+        long_sum += close_f
+        if len(long_q) > window_long:
+            long_sum -= long_q.popleft()
+
+        ma5: Optional[float] = None
+        ma25: Optional[float] = None
+        if len(short_q) == window_short:
+            ma5 = short_sum / window_short
+        if len(long_q) == window_long:
+            ma25 = long_sum / window_long
+
+        output.append((trade_date, code, ma5, ma25))
+
+    return output
+
+
+def compute_rsi(
+    code: str,
+    rows: Iterable[Tuple],
+    window: int,
+    output_from: Optional[date] = None,
+    prev_close: Optional[float] = None,
+    prev_avg_gain: Optional[float] = None,
+    prev_avg_loss: Optional[float] = None,
+) -> List[Tuple]:
+    # output_from を指定した場合はその日付以降の行だけを返す
+    # prev_* は保存済みの直前の終値・平均で、指定時は rows の先頭から続けて平滑化する
+    output: List[Tuple] = []
+    if window <= 0:
+        return output
+
+    gains: List[float] = []
+    losses: List[float] = []
+    avg_gain = prev_avg_gain
+    avg_loss = prev_avg_loss
+
+    for trade_date, close_v in rows:
+        if close_v is None:
+            continue
+
+        close_f = float(close_v)
+        if prev_close is None:
+            prev_close = close_f
+            continue
+
+        change = close_f - prev_close
+        gain = change if change > 0 else 0.0
+        loss = -change if change < 0 else 0.0
+
+        if avg_gain is None:
+            gains.append(gain)
+            losses.append(loss)
+            if len(gains) < window:
+                prev_close = close_f
+                continue
+            avg_gain = sum(gains) / window
+            avg_loss = sum(losses) / window
+        else:
+            avg_gain = ((avg_gain * (window - 1)) + gain) / window
+            avg_loss = ((avg_loss * (window - 1)) + loss) / window
+
+        if avg_loss == 0 and avg_gain == 0:
+            rsi = 50.0
+        elif avg_loss == 0:
+            rsi = 100.0
+        elif avg_gain == 0:
+            rsi = 0.0
+        else:
+            rs = avg_gain / avg_loss
+            rsi = 100 - (100 / (1 + rs))
+
+        if output_from is None or trade_date >= output_from:
+            output.append((trade_date, code, window, rsi, avg_gain, avg_loss, close_f))
+        prev_close = close_f
+
+    return output
+
+
+def compute_macd(
+    code: str,
+    rows: Sequence[Tuple],
+    window_short: int,
+    window_long: int,
+    window_signal: int,
+    prev_ema_short: Optional[float],
+    prev_ema_long: Optional[float],
+    prev_signal: Optional[float],
+) -> List[Tuple]:
+    output: List[Tuple] = []
+    if window_short <= 0 or window_long <= 0 or window_signal <= 0:
+        return output
+
+    alpha_short = 2.0 / (window_short + 1)
+    alpha_long = 2.0 / (window_long + 1)
+    alpha_signal = 2.0 / (window_signal + 1)
+
+    ema_short = prev_ema_short
+    ema_long = prev_ema_long
+    signal = prev_signal
+
+    for trade_date, close_v in rows:
+        if close_v is None:
+            continue
+
+        close_f = float(close_v)
+
+        if ema_short is None:
+            ema_short = close_f
+        else:
+            ema_short = ((close_f - ema_short) * alpha_short) + ema_short
+
+        if ema_long is None:
+            ema_long = close_f
+        else:
+            ema_long = ((close_f - ema_long) * alpha_long) + ema_long
+
+        macd = ema_short - ema_long
+        if signal is None:
+            signal = macd
+        else:
+            signal = ((macd - signal) * alpha_signal) + signal
+
+        histogram = macd - signal
+
+        output.append(
+            (
+                trade_date,
+                code,
+                window_short,
+                window_long,
+                window_signal,
+                ema_short,
+                ema_long,
+                macd,
+                signal,
+                histogram,
+            )
+        )
+
+    return output
+
+
+def _optional_float(value) -> Optional[float]:
+    return float(value) if value is not None else None
+
+
+def _has_rsi_state(state: Optional[Tuple]) -> bool:
+    # 保存済み最終行に差分計算用の状態がある（状態列の追加前の行はNULL）
+    return state is not None and None not in state
+
+
+class CodePrices(NamedTuple):
+    # 1銘柄分の終値（読込開始日以降）と、指標ごとの保存済み状態
+    code: str
+    price_rows: List[Tuple]
+    latest_ma_date: Optional[date]
+    # RSIの保存済み最終行 (取引日, 平均上昇幅, 平均下落幅, 終値)
+    rsi_state: Optional[Tuple]
+    # MACDの保存済み最終行 (取引日, 短期EMA, 長期EMA, シグナル)
+    macd_state: Optional[Tuple]
+
+
+def load_code(
+    conn: pymysql.Connection, options: IndicatorOptions, code: str
+) -> CodePrices:
+    """有効な指標の保存済み状態を読み、必要な期間の終値を1回で読み込む。"""
+    enabled = set(options.indicators)
+
+    # 指標ごとに必要な読込開始日を求め、最も古いものから1回で読む（Noneは全期間）
+    starts: List[Optional[date]] = []
+    latest_ma_date: Optional[date] = None
+    if INDICATOR_MA in enabled:
+        latest_ma_date = fetch_latest_ma_date(conn, options.ma_table, code)
+        ma_start = None
+        if latest_ma_date is not None:
+            # 長期移動平均の窓を満たすよう、保存済み最終日の (窓-1) 行前から読む
+            ma_start = fetch_window_start_date(
+                conn,
+                options.source_table,
+                code,
+                latest_ma_date,
+                max(options.ma_window_long - 1, 0),
+            )
+        starts.append(ma_start)
+
+    rsi_state: Optional[Tuple] = None
+    if INDICATOR_RSI in enabled:
+        rsi_state = fetch_latest_rsi_state(
+            conn, options.rsi_table, code, options.rsi_window
+        )
+        # Wilder平滑化の状態が保存済みなら最終日から、未保存なら初日から読む
+        starts.append(rsi_state[0] if _has_rsi_state(rsi_state) else None)
+
+    macd_state: Optional[Tuple] = None
+    if INDICATOR_MACD in enabled:
+        macd_state = fetch_latest_macd_state(
+            conn,
+            options.macd_table,
+            code,
+            options.macd_window_short,
+            options.macd_window_long,
+            options.macd_window_signal,
+        )
+        starts.append(macd_state[0] if macd_state is not None else None)
+
+    start_date = None if not starts or None in starts else min(starts)
+    price_rows = fetch_prices(conn, options.source_table, code, start_date)
+    return CodePrices(code, price_rows, latest_ma_date, rsi_state, macd_state)
+
+
+def compute_code(
+    options: IndicatorOptions, prices: CodePrices
+) -> Dict[str, List[Tuple]]:
+    """1銘柄分の有効な指標の未保存行を、行ごとのループで計算して指標ごとに返す。"""
+    enabled = set(options.indicators)
+    code = prices.code
+    price_rows = prices.price_rows
+    results: Dict[str, List[Tuple]] = {name: [] for name in options.indicators}
+    if not price_rows:
+        return results
+
+    if INDICATOR_MA in enabled:
+        rows = compute_moving_averages(
+            code, price_rows, options.ma_window_short, options.ma_window_long
+        )
+        if prices.latest_ma_date is not None:
+            rows = [row for row in rows if row[0] > prices.latest_ma_date]
+        results[INDICATOR_MA] = rows
+
+    if INDICATOR_RSI in enabled:
+        state = prices.rsi_state
+        if _has_rsi_state(state):
+            latest_rsi_date, avg_gain, avg_loss, close_price = state
+            results[INDICATOR_RSI] = compute_rsi(
+                code,
+                [row for row in price_rows if row[0] > latest_rsi_date],
+                options.rsi_window,
+                prev_close=float(close_price),
+                prev_avg_gain=float(avg_gain),
+                prev_avg_loss=float(avg_loss),
+            )
+        else:
+            # 状態のない保存済み最終行も書き直し、次回から差分計算できるようにする
+            results[INDICATOR_RSI] = compute_rsi(
+                code, price_rows, options.rsi_window, state[0] if state else None
+            )
+
+    if INDICATOR_MACD in enabled:
+        if prices.macd_state is None:
+            macd_rows = price_rows
+            prev_ema_short = prev_ema_long = prev_signal = None
+        else:
+            latest_macd_date, prev_ema_short, prev_ema_long, prev_signal = (
+                prices.macd_state
+            )
+            macd_rows = [row for row in price_rows if row[0] > latest_macd_date]
+        results[INDICATOR_MACD] = compute_macd(
+            code,
+            macd_rows,
+            options.macd_window_short,
+            options.macd_window_long,
+            options.macd_window_signal,
+            _optional_float(prev_ema_short),
+            _optional_float(prev_ema_long),
+            _optional_float(prev_signal),
+        )
+
+    return results
+
+
+def _panel_values(values: np.ndarray) -> List[Optional[float]]:
+    # パネルの1行分をPythonのfloatのリストにする（NaNはNone）
+    return [None if math.isnan(value) else value for value in values.tolist()]
+
+
+def _state_array(values: Sequence) -> np.ndarray:
+    # 銘柄ごとの保存済み値の配列（未保存はNaN）
+    return np.array(
+        [np.nan if value is None else float(value) for value in values], dtype=float
+    )
+
+
+def compute_panel(
+    options: IndicatorOptions, batch: Sequence[CodePrices]
+) -> List[Dict[str, List[Tuple]]]:
+    """複数銘柄分の指標を銘柄×日付のパネルで一括計算し、銘柄ごとに返す。
+
+    戻り値は compute_code を銘柄ごとに呼んだ結果と同じ（浮動小数点の誤差を除く）。
+    """
+    enabled = set(options.indicators)
+    results: List[Dict[str, List[Tuple]]] = [
+        {name: [] for name in options.indicators} for _ in batch
+    ]
+    # 行ごとのループと同様に、終値がNULLの行は計算から除く
+    dates: List[List[date]] = []
+    closes: List[List[float]] = []
+    for prices in batch:
+        valid = [(row[0], float(row[1])) for row in prices.price_rows if row[1] is not None]
+        dates.append([row[0] for row in valid])
+        closes.append([row[1] for row in valid])
+    panel, lengths = build_panel(closes)
+
+    if INDICATOR_MA in enabled:
+        ma_short = rolling_mean(panel, options.ma_window_short)
+        ma_long = rolling_mean(panel, options.ma_window_long)
+        for index, prices in enumerate(batch):
+            length = lengths[index]
+            latest = prices.latest_ma_date
+            results[index][INDICATOR_MA] = [
+                (trade_date, prices.code, short_v, long_v)
+                for trade_date, short_v, long_v in zip(
+                    dates[index],
+                    _panel_values(ma_short[index, :length]),
+                    _panel_values(ma_long[index, :length]),
+                )
+                if latest is None or trade_date > latest
+            ]
+
+    if INDICATOR_RSI in enabled and options.rsi_window > 0:
+        # 状態が保存済みの銘柄は最終日より後の終値だけを、保存済みの状態から続けて計算する
+        rsi_dates: List[List[date]] = []
+        rsi_closes: List[List[float]] = []
+        rsi_states: List[Tuple] = []
+        for index, prices in enumerate(batch):
+            first = 0
+            state = (None, None, None, None)
+            if _has_rsi_state(prices.rsi_state):
+                state = prices.rsi_state
+                first = bisect_right(dates[index], state[0])
+            rsi_dates.append(dates[index][first:])
+            rsi_closes.append(closes[index][first:])
+            rsi_states.append(state)
+        rsi_prices, rsi_lengths = build_panel(rsi_closes)
+        rsi_values, avg_gain, avg_loss = rsi_panel(
+            rsi_prices,
+            options.rsi_window,
+            _state_array([state[3] for state in rsi_states]),
+            _state_array([state[1] for state in rsi_states]),
+            _state_array([state[2] for state in rsi_states]),
+        )
+        for index, prices in enumerate(batch):
+            length = rsi_lengths[index]
+            # 状態のない保存済み最終行は書き直し、次回から差分計算できるようにする
+            output_from = None
+            if prices.rsi_state is not None and not _has_rsi_state(prices.rsi_state):
+                output_from = prices.rsi_state[0]
+            results[index][INDICATOR_RSI] = [
+                (
+                    trade_date,
+                    prices.code,
+                    options.rsi_window,
+                    rsi_v,
+                    gain_v,
+                    loss_v,
+                    close_v,
+                )
+                for trade_date, rsi_v, gain_v, loss_v, close_v in zip(
+                    rsi_dates[index],
+                    _panel_values(rsi_values[index, :length]),
+                    avg_gain[index, :length].tolist(),
+                    avg_loss[index, :length].tolist(),
+                    rsi_closes[index],
+                )
+                if rsi_v is not None
+                and (output_from is None or trade_date >= output_from)
+            ]
+
+    if INDICATOR_MACD in enabled and min(
+        options.macd_window_short, options.macd_window_long, options.macd_window_signal
+    ) > 0:
+        # 保存済みの銘柄は最終日より後の終値だけを、保存済みの値から続けて計算する
+        macd_dates: List[List[date]] = []
+        macd_closes: List[List[float]] = []
+        for index, prices in enumerate(batch):
+            first = 0
+            if prices.macd_state is not None:
+                first = bisect_right(dates[index], prices.macd_state[0])
+            macd_dates.append(dates[index][first:])
+            macd_closes.append(closes[index][first:])
+        macd_prices, macd_lengths = build_panel(macd_closes)
+        states = [prices.macd_state or (None, None, None, None) for prices in batch]
+        arrays = macd_panel(
+            macd_prices,
+            options.macd_window_short,
+            options.macd_window_long,
+            options.macd_window_signal,
+            _state_array([state[1] for state in states]),
+            _state_array([state[2] for state in states]),
+            _state_array([state[3] for state in states]),
+        )
+        windows = (
+            options.macd_window_short,
+            options.macd_window_long,
+            options.macd_window_signal,
+        )
+        for index, prices in enumerate(batch):
+            length = macd_lengths[index]
+            columns = [array[index, :length].tolist() for array in arrays]
+            results[index][INDICATOR_MACD] = [
+                (trade_date, prices.code, *windows, *values)
+                for trade_date, *values in zip(macd_dates[index], *columns)
+            ]
+
+    return results
+
+
+def log_code(logger, prices: CodePrices, results: Dict[str, List[Tuple]]) -> None:
+    if not prices.price_rows:
+        logger.info("%s 価格データなし", prices.code)
+        return
+    logger.info(
+        "%s 取得レコード数: %5d / 計算: %s",
+        prices.code,
+        len(prices.price_rows),
+        " ".join(f"{name}={len(rows)}" for name, rows in results.items()),
+    )
+
+
+def process_code(
+    conn: pymysql.Connection,
+    options: IndicatorOptions,
+    code: str,
+    logger,
+) -> Dict[str, List[Tuple]]:
+    """1銘柄分の終値を1回読み込み、有効な指標の未保存行を指標ごとに返す。"""
+    prices = load_code(conn, options, code)
+    results = compute_code(options, prices)
+    log_code(logger, prices, results)
+    return results
+
+
+def add_engine_arguments(parser: argparse.ArgumentParser) -> None:
+    """calc_indicators.py と指標ごとのスクリプトに共通の引数を追加する。
+
+    指標の選択・テーブル・窓幅以外（対象銘柄・読込元・並列度・書込・計測）は
+    4つのエントリポイントで同じ引数を受け付ける。
+    """
+    parser.add_argument(
+        "--codes",
+        default="",
+        help="銘柄コードをカンマ区切りで指定。省略時はDBから取得。",
+    )
+    parser.add_argument("--source-table", default="stock_prices_daily")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="同時に計算する銘柄数の上限。負荷に応じて1〜上限で増減する。",
+    )
+    parser.add_argument(
+        "--flush-rows",
+        type=int,
+        default=DEFAULT_FLUSH_ROWS,
+        help="1回の複数行INSERTで書き込む行数（指標ごと）。",
+    )
+    parser.add_argument(
+        "--commit-rows",
+        type=int,
+        default=DEFAULT_COMMIT_ROWS,
+        help="全指標合計でこの行数ごとに、全テーブル分をまとめてコミットする。",
+    )
+    parser.add_argument(
+        "--load-data",
+        action="store_true",
+        help="全期間の再計算向けに LOAD DATA LOCAL INFILE で投入する（一時テーブル経由で重複行は更新）。",
+    )
+    parser.add_argument(
+        "--panel-codes",
+        type=int,
+        default=PANEL_CODES,
+        help="この銘柄数ずつ銘柄×日付の配列でまとめて計算する。0で銘柄ごとに計算。",
+    )
+    parser.add_argument(
+        "--slow-query-ms",
+        type=float,
+        default=SLOW_QUERY_MS,
+        help="この時間（ミリ秒）以上かかったSQLを警告ログに出す。0以下で無効。",
+    )
+    parser.add_argument(
+        "--query-summary-top",
+        type=int,
+        default=QUERY_SUMMARY_TOP,
+        help="終了時に合計時間の多い順で集計表示するSQLの件数。",
+    )
+
+
+def engine_options(args: argparse.Namespace) -> Dict[str, Any]:
+    """add_engine_arguments で追加した引数を IndicatorOptions のキーワード引数にする。"""
+    return {
+        "codes": args.codes,
+        "source_table": args.source_table,
+        "workers": args.workers,
+        "flush_rows": args.flush_rows,
+        "commit_rows": args.commit_rows,
+        "load_data": args.load_data,
+        "panel_codes": args.panel_codes,
+        "slow_query_ms": args.slow_query_ms,
+        "query_summary_top": args.query_summary_top,
+    }
+
+
+def validate_options(options: IndicatorOptions) -> None:
+    unknown = set(options.indicators) - set(ALL_INDICATORS)
+    if unknown or not options.indicators:
+        raise ValueError(
+            f"指標は {', '.join(ALL_INDICATORS)} から指定してください: "
+            f"{', '.join(sorted(unknown))}"
+        )
+    if options.workers <= 0:
+        raise ValueError("--workers は1以上を指定してください。")
+    if options.flush_rows <= 0:
+        raise ValueError("--flush-rows は1以上を指定してください。")
+    if options.panel_codes < 0:
+        raise ValueError("--panel-codes は0以上を指定してください。")
+    if (
+        INDICATOR_MACD in options.indicators
+        and options.macd_window_short >= options.macd_window_long
+    ):
+        raise ValueError("window-short は window-long より小さく指定してください。")
+
+
+def run_indicators(options: IndicatorOptions, logger) -> Dict[str, int]:
+    """全対象銘柄の指標を計算・保存し、指標ごとのインサートレコード数を返す。"""
+    validate_options(options)
+
+    # 全接続のSQLを計測し、低速SQLの警告と終了時の集計に使う
+    stats = QueryStats(logger, options.slow_query_ms)
+    conn = get_connection(local_infile=options.load_data, stats=stats)
+    # ワーカーは読込・計算のみを行い、書込はこのスレッドでまとめて行う
+    # 読込側はDECIMALをfloatで受け取り、Decimalの生成と変換を省く
+    pool = ConnectionPool(options.workers, decimal_as_float=True, stats=stats)
+    try:
+        codes = resolve_codes(conn, options.codes)
+        targets = {
+            INDICATOR_MA: (options.ma_table, MA_COLUMNS, MA_UPDATE_COLUMNS),
+            INDICATOR_RSI: (options.rsi_table, RSI_COLUMNS, RSI_UPDATE_COLUMNS),
+            INDICATOR_MACD: (options.macd_table, MACD_COLUMNS, MACD_UPDATE_COLUMNS),
+        }
+        # コミットは全テーブル分をまとめてこのスレッドで行う
+        writers = {
+            name: BulkWriter(
+                conn,
+                targets[name][0],
+                targets[name][1],
+                targets[name][2],
+                flush_rows=options.flush_rows,
+                commit_rows=0,
+                load_data=options.load_data,
+            )
+            for name in options.indicators
+        }
+        total_rows = {name: 0 for name in options.indicators}
+        uncommitted = 0
+
+        def commit_all() -> None:
+            for writer in writers.values():
+                writer.flush()
+            conn.commit()
+
+        def write_results(results: Dict[str, List[Tuple]]) -> None:
+            nonlocal uncommitted
+            for name, rows in results.items():
+                total_rows[name] += len(rows)
+                uncommitted += len(rows)
+                writers[name].add(rows)
+            if options.commit_rows > 0 and uncommitted >= options.commit_rows:
+                commit_all()
+                uncommitted = 0
+
+        def write_panel(batch: List[CodePrices]) -> None:
+            for prices, results in zip(batch, compute_panel(options, batch)):
+                log_code(logger, prices, results)
+                write_results(results)
+
+        controller = LoadController(options.workers, logger=logger)
+        if options.panel_codes > 0:
+            # ワーカーは読込のみを行い、計算は panel_codes 銘柄ずつこのスレッドで一括で行う
+            def load(code: str) -> CodePrices:
+                with pool.connection() as worker_conn:
+                    return load_code(worker_conn, options, code)
+
+            batch: List[CodePrices] = []
+            for _, prices in run_adaptive(load, codes, controller):
+                batch.append(prices)
+                if len(batch) >= options.panel_codes:
+                    write_panel(batch)
+                    batch = []
+            if batch:
+                write_panel(batch)
+        else:
+
+            def run_code(code: str) -> Dict[str, List[Tuple]]:
+                with pool.connection() as worker_conn:
+                    return process_code(worker_conn, options, code, logger)
+
+            for _, results in run_adaptive(run_code, codes, controller):
+                write_results(results)
+        commit_all()
+
+        logger.info("対象銘柄数: %5d", len(codes))
+        for name in options.indicators:
+            logger.info(
+                "%s 計算レコード数: %5d / インサートレコード数: %5d",
+                name,
+                total_rows[name],
+                writers[name].affected_rows,
+            )
+        return {name: writer.affected_rows for name, writer in writers.items()}
+    finally:
+        stats.log_summary(limit=options.query_summary_top)
+        pool.close_all()
+        conn.close()
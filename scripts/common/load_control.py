@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""システム負荷に応じてバッチの同時実行数を増減させる制御。
+
+Raspberry Pi上でMariaDB・Djangoと同居するため、ロードアベレージ・空きメモリ・
+CPU温度を /proc と /sys から読み取り、逼迫時は同時実行数を減らし、
+余裕があれば上限まで戻す。
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, NamedTuple, Optional, Tuple, TypeVar
+
+LOADAVG_PATH = Path("/proc/loadavg")
+MEMINFO_PATH = Path("/proc/meminfo")
+THERMAL_PATH = Path("/sys/class/thermal/thermal_zone0/temp")
+
+# 負荷を再評価する間隔（秒）
+CHECK_INTERVAL_SEC = 5.0
+# 1CPUあたりのロードアベレージがこれを超えたら同時実行数を減らす
+LOAD_PER_CPU_HIGH = 0.85
+# 1CPUあたりのロードアベレージがこれ未満なら同時実行数を増やす
+LOAD_PER_CPU_LOW = 0.60
+# 空きメモリ比率がこれを下回ったら同時実行数を減らす
+MEM_AVAILABLE_LOW = 0.15
+# CPU温度（℃）がこれ以上なら同時実行数を減らす
+TEMP_HIGH_C = 75.0
+# CPU温度（℃）がこれ以上なら最小まで落とす（Pi 5は約85℃でクロック制限）
+TEMP_CRITICAL_C = 80.0
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class SystemLoad(NamedTuple):
+    # 1分間ロードアベレージ
+    load1: float
+    # 空きメモリ比率（MemAvailable / MemTotal）
+    mem_available_ratio: Optional[float]
+    # CPU温度（℃、取得できない環境ではNone）
+    cpu_temp_c: Optional[float]
+
+
+def read_system_load() -> SystemLoad:
+    """/proc と /sys から現在の負荷を読み取る。"""
+    try:
+        load1 = float(LOADAVG_PATH.read_text().split()[0])
+    except (OSError, ValueError, IndexError):
+        load1 = os.getloadavg()[0] if hasattr(os, "getloadavg") else 0.0
+
+    mem_available_ratio: Optional[float] = None
+    try:
+        meminfo = {}
+        for line in MEMINFO_PATH.read_text().splitlines():
+            key, _, value = line.partition(":")
+            meminfo[key] = int(value.split()[0])
+        if meminfo.get("MemTotal"):
+            mem_available_ratio = meminfo["MemAvailable"] / meminfo["MemTotal"]
+    except (OSError, ValueError, IndexError, KeyError):
+        pass
+
+    cpu_temp_c: Optional[float] = None
+    try:
+        cpu_temp_c = int(THERMAL_PATH.read_text().strip()) / 1000.0
+    except (OSError, ValueError):
+        pass
+
+    return SystemLoad(load1, mem_available_ratio, cpu_temp_c)
+
+
+class LoadController:
+    """負荷に応じて min_workers〜max_workers の範囲で同時実行数を調整する。
+
+    スレッドプールは max_workers で作成し、ワーカーは slot() で実行枠を取得してから
+    処理する。枠の取得時に一定間隔で負荷を再評価するため、専用の監視スレッドは持たない。
+    """
+
+    def __init__(
+        self,
+        max_workers: int,
+        min_workers: int = 1,
+        logger=None,
+        check_interval: float = CHECK_INTERVAL_SEC,
+    ) -> None:
+        if max_workers <= 0:
+            raise ValueError("max_workers は1以上を指定してください。")
+        self.max_workers = max_workers
+        self.min_workers = max(1, min(min_workers, max_workers))
+        self.logger = logger
+        self.check_interval = check_interval
+        self.cpu_count = os.cpu_count() or 1
+        # 起動直後は最小から始め、負荷に余裕があれば段階的に増やす
+        self._limit = self.min_workers
+        self._active = 0
+        self._checked_at = 0.0
+        self._cond = threading.Condition()
+
+    @property
+    def limit(self) -> int:
+        return self._limit
+
+    def _decide(self, load: SystemLoad) -> int:
+        load_per_cpu = load.load1 / self.cpu_count
+        temp = load.cpu_temp_c
+        mem = load.mem_available_ratio
+
+        if temp is not None and temp >= TEMP_CRITICAL_C:
+            return self.min_workers
+        if (
+            (temp is not None and temp >= TEMP_HIGH_C)
+            or (mem is not None and mem < MEM_AVAILABLE_LOW)
+            or load_per_cpu >= LOAD_PER_CPU_HIGH
+        ):
+            return max(self.min_workers, self._limit - 1)
+        if load_per_cpu < LOAD_PER_CPU_LOW:
+            return min(self.max_workers, self._limit + 1)
+        return self._limit
+
+    def _maybe_update(self) -> None:
+        # 呼び出し元で self._cond を保持していること
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return
+        self._checked_at = now
+        load = read_system_load()
+        new_limit = self._decide(load)
+        if new_limit != self._limit:
+            if self.logger is not None:
+                mem = load.mem_available_ratio
+                temp = load.cpu_temp_c
+                self.logger.info(
+                    "同時実行数を変更: %d → %d (load1=%.2f, 空きメモリ=%s, 温度=%s)",
+                    self._limit,
+                    new_limit,
+                    load.load1,
+                    f"{mem:.0%}" if mem is not None else "-",
+                    f"{temp:.1f}℃" if temp is not None else "-",
+                )
+            self._limit = new_limit
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self) -> Iterator[None]:
+        """実行枠を1つ取得する（同時実行数が上限に達している間は待機）。"""
+        with self._cond:
+            self._maybe_update()
+            while self._active >= self._limit:
+                self._cond.wait(timeout=self.check_interval)
+                self._maybe_update()
+            self._active += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._active -= 1
+                self._cond.notify()
+
+
+def run_adaptive(
+    func: Callable[[T], R],
+    items: Iterable[T],
+    controller: LoadController,
+) -> Iterator[Tuple[T, R]]:
+    """func(item) を負荷に応じた並列度で実行し、完了順に (item, 結果) を返す。
+
+    例外は呼び出し元へそのまま送出する。未処理の投入は上限の2倍までに抑え、
+    結果の集計・DB書込は呼び出し元のスレッドで行えるようにする。
+    """
+    if controller.max_workers == 1:
+        for item in items:
+            yield item, func(item)
+        return
+
+    def run(item: T) -> R:
+        with controller.slot():
+            return func(item)
+
+    backlog = controller.max_workers * 2
+    iterator = iter(items)
+    with ThreadPoolExecutor(max_workers=controller.max_workers) as executor:
+        pending = {}
+        for item in iterator:
+            pending[executor.submit(run, item)] = item
+            if len(pending) >= backlog:
+                break
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                item = pending.pop(future)
+                yield item, future.result()
+                for next_item in iterator:
+                    pending[executor.submit(run, next_item)] = next_item
+                    break
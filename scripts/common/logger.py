@@ -3,15 +3,26 @@
 
 from __future__ import annotations
 
+import atexit
+import json
 import logging
+import logging.handlers
+import queue
+import time
 from pathlib import Path
-from typing import Optional
+from typing import Any, Dict
 
 LOG_LEVEL = logging.DEBUG
 
 
-def get_logger(script_name: str, level: int = LOG_LEVEL) -> logging.Logger:
-    """Return a logger that logs to stdout and logs/<script_name>.log."""
+def get_logger(
+    script_name: str, level: int = LOG_LEVEL, queued: bool = False
+) -> logging.Logger:
+    """Return a logger that logs to stdout and logs/<script_name>.log.
+
+    With queued=True the caller only enqueues records; a QueueListener
+    thread does the stdout/file writes and is drained at interpreter exit.
+    """
     logger = logging.getLogger(script_name)
     if logger.handlers:
         logger.setLevel(level)
@@ -34,7 +45,65 @@ def get_logger(script_name: str, level: int = LOG_LEVEL) -> logging.Logger:
     file_handler = logging.FileHandler(log_file, encoding="utf-8")
     file_handler.setFormatter(fmt)
 
-    logger.addHandler(stream_handler)
-    logger.addHandler(file_handler)
+    if queued:
+        log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+        listener = logging.handlers.QueueListener(
+            log_queue, stream_handler, file_handler, respect_handler_level=True
+        )
+        listener.start()
+        # stop() flushes the records still queued when the script exits.
+        atexit.register(listener.stop)
+        logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    else:
+        logger.addHandler(stream_handler)
+        logger.addHandler(file_handler)
 
     return logger
+
+
+def _field_value(value: Any) -> str:
+    if value is None:
+        return "-"
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, float):
+        return "nan" if value != value else f"{value:.6g}"
+    text = str(value)
+    if not text or any(ch in text for ch in ' ="'):
+        return json.dumps(text, ensure_ascii=False)
+    return text
+
+
+def format_fields(event: str, **fields: Any) -> str:
+    """Format `event=<event> key=value ...`; values with spaces are JSON-quoted."""
+    parts = [f"event={_field_value(event)}"]
+    parts.extend(f"{key}={_field_value(value)}" for key, value in fields.items())
+    return " ".join(parts)
+
+
+def log_fields(
+    logger: logging.Logger, event: str, level: int = logging.INFO, **fields: Any
+) -> None:
+    """Log one compact key=value line that can be parsed back later."""
+    if logger.isEnabledFor(level):
+        logger.log(level, format_fields(event, **fields))
+
+
+class StepTimer:
+    """Accumulate elapsed milliseconds per named step for log_fields()."""
+
+    def __init__(self) -> None:
+        self._started = time.perf_counter()
+        self._last = self._started
+        self.steps: Dict[str, float] = {}
+
+    def lap(self, step: str) -> None:
+        # Time since the previous lap is added to `step` (repeated laps sum).
+        now = time.perf_counter()
+        self.steps[step] = self.steps.get(step, 0.0) + (now - self._last) * 1000.0
+        self._last = now
+
+    def fields(self) -> Dict[str, float]:
+        result = {f"{step}_ms": round(ms, 1) for step, ms in self.steps.items()}
+        result["total_ms"] = round((time.perf_counter() - self._started) * 1000.0, 1)
+        return result
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""日足株価テーブルの欠損営業日（銘柄ごとの抜け）を検出する共通関数。
+
+全銘柄の (銘柄コード, 取引日) を配列で読み込み、取引日を営業日の通番に
+変換して銘柄・通番順に並べ、隣接する行の通番の差が2以上の箇所を欠損区間
+とする。各銘柄の最初と最後の行の間のみが対象で、最終日以降の未取得分は
+通常の差分取得で扱う。
+"""
+
+from __future__ import annotations
+
+from datetime import date
+from typing import Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+import pymysql
+
+from common.db import stream_batches
+from common.exchange_calendar import (
+    DateLike,
+    count_exchange_business_days,
+    get_exchange_calendar,
+)
+
+
+class PriceGap(NamedTuple):
+    # 1銘柄の連続した欠損営業日の区間
+    code: str
+    # 最初と最後の欠損営業日（両端含む）
+    start_date: date
+    end_date: date
+    # 区間内の欠損営業日数
+    missing_days: int
+
+
+def load_price_dates(
+    conn: pymysql.Connection,
+    table: str,
+    codes: Optional[Sequence[str]] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """(銘柄コード配列, 取引日 datetime64[D] 配列) を返す（並び順は不定）。"""
+    conditions = []
+    params: List = []
+    if codes:
+        conditions.append(f"code IN ({', '.join(['%s'] * len(codes))})")
+        params.extend(codes)
+    if start_date is not None:
+        conditions.append("trade_date >= %s")
+        params.append(start_date)
+    if end_date is not None:
+        conditions.append("trade_date <= %s")
+        params.append(end_date)
+    where_sql = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    # 並べ替えは配列側で行い、MariaDB でのソートを避ける
+    sql = f"SELECT code, trade_date FROM `{table}` {where_sql}"
+
+    code_chunks: List[np.ndarray] = []
+    date_chunks: List[np.ndarray] = []
+    for rows in stream_batches(conn, sql, params):
+        code_values, trade_dates = zip(*rows)
+        code_chunks.append(np.array(code_values, dtype="U8"))
+        date_chunks.append(np.array(trade_dates, dtype="datetime64[D]"))
+    if not code_chunks:
+        return np.array([], dtype="U8"), np.array([], dtype="datetime64[D]")
+    return np.concatenate(code_chunks), np.concatenate(date_chunks)
+
+
+def find_price_gaps(
+    code_values: np.ndarray,
+    trade_dates: np.ndarray,
+    extra_holidays: Optional[Iterable[DateLike]] = None,
+) -> List[PriceGap]:
+    """全銘柄の欠損区間を銘柄コード・開始日順に返す。"""
+    if trade_dates.size == 0:
+        return []
+
+    first = trade_dates.min().item()
+    last = trade_dates.max().item()
+    calendar = get_exchange_calendar(extra_holidays, first, last)
+    business_days = np.array(calendar.between(first, last), dtype="datetime64[D]")
+    if business_days.size == 0:
+        return []
+
+    # 取引日を営業日の通番に変換する（休場日の行は欠損判定に使わない）
+    seq = np.searchsorted(business_days, trade_dates)
+    valid = seq < business_days.size
+    valid[valid] = business_days[seq[valid]] == trade_dates[valid]
+    codes, code_ids = np.unique(code_values[valid], return_inverse=True)
+    seq = seq[valid]
+
+    order = np.lexsort((seq, code_ids))
+    code_ids = code_ids[order]
+    seq = seq[order]
+    steps = np.diff(seq)
+    gap_index = np.nonzero((code_ids[1:] == code_ids[:-1]) & (steps > 1))[0]
+
+    starts = business_days[seq[gap_index] + 1].tolist()
+    ends = business_days[seq[gap_index + 1] - 1].tolist()
+    missing = (steps[gap_index] - 1).tolist()
+    gap_codes = codes[code_ids[gap_index]].tolist()
+    return [
+        PriceGap(code, start, end, days)
+        for code, start, end, days in zip(gap_codes, starts, ends, missing)
+    ]
+
+
+def scan_price_gaps(
+    conn: pymysql.Connection,
+    table: str,
+    codes: Optional[Sequence[str]] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+) -> List[PriceGap]:
+    """テーブルを1回読み込み、全銘柄（または codes）の欠損区間を返す。"""
+    code_values, trade_dates = load_price_dates(conn, table, codes, start_date, end_date)
+    return find_price_gaps(code_values, trade_dates)
+
+
+def merge_price_gaps(gaps: Sequence[PriceGap], max_distance_days: int) -> List[PriceGap]:
+    """同じ銘柄で間の取得済み営業日が max_distance_days 以下の区間を1つにまとめる。
+
+    まとめた区間を1回で取得すると間の取得済み行も再取得する（重複は無視される）が、
+    リクエスト数を減らせる。missing_days は欠損営業日数の合計のまま保つ。
+    """
+    if not gaps or max_distance_days <= 0:
+        return list(gaps)
+
+    # 前の区間の終了日〜次の区間の開始日の営業日数（両端の欠損日を含む）から、間の日数を求める
+    between = (
+        count_exchange_business_days(
+            [gap.end_date for gap in gaps[:-1]],
+            [gap.start_date for gap in gaps[1:]],
+        )
+        - 2
+    ).tolist()
+    merged: List[PriceGap] = [gaps[0]]
+    for gap, distance in zip(gaps[1:], between):
+        prev = merged[-1]
+        if gap.code == prev.code and distance <= max_distance_days:
+            merged[-1] = PriceGap(
+                prev.code, prev.start_date, gap.end_date, prev.missing_days + gap.missing_days
+            )
+        else:
+            merged.append(gap)
+    return merged
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""複数スレッドで共有するトークンバケット型のレート制限。"""
+
+from __future__ import annotations
+
+import threading
+import time
+
+
+class TokenBucket:
+    """一定レートでトークンを補充し、取得要求ごとに1トークンを消費する。
+
+    いずれかのワーカーがHTTP 429を受けた場合は backoff() で全ワーカーを
+    一斉に待機させ、バケットを空にしてから再開する。
+    """
+
+    def __init__(self, rate: float, capacity: float = 1.0) -> None:
+        if rate <= 0:
+            raise ValueError("rate は0より大きく指定してください。")
+        self.rate = float(rate)
+        self.capacity = max(float(capacity), 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self._updated
+        if elapsed > 0:
+            self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+            self._updated = now
+
+    def acquire(self) -> None:
+        """トークンを1つ取得できるまで待機する。"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    wait_sec = self._paused_until - now
+                else:
+                    self._refill(now)
+                    if self._tokens >= 1.0:
+                        self._tokens -= 1.0
+                        return
+                    wait_sec = (1.0 - self._tokens) / self.rate
+            time.sleep(wait_sec)
+
+    def backoff(self, seconds: float) -> None:
+        """全ワーカーを指定秒数だけ停止させる（429受信時に呼び出す）。"""
+        with self._lock:
+            now = time.monotonic()
+            self._paused_until = max(self._paused_until, now + seconds)
+            # 待機明けに溜まったトークンで一斉送信しないよう空にする
+            self._tokens = 0.0
+            self._updated = self._paused_until
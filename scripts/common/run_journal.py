@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""バッチの実行計画と完了済み項目を記録し、中断後の再開に使うジャーナル。"""
+
+from __future__ import annotations
+
+import json
+from pathlib import Path
+from typing import Any, Dict, Optional, Set, Tuple
+
+DEFAULT_JOURNAL_DIR = Path(__file__).resolve().parents[2] / "logs"
+
+
+class RunJournal:
+    """JSON Lines形式で計画・完了・終了を追記する。
+
+    1行目に計画（plan）、以降に完了した項目（done）を1行ずつ追記し、
+    正常終了時に終了（finished）を記録する。終了記録のないジャーナルは
+    中断された実行として load() で再開に利用できる。
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+        self._fp = None
+
+    @classmethod
+    def for_script(cls, script_name: str) -> "RunJournal":
+        return cls(DEFAULT_JOURNAL_DIR / f"{script_name}.journal")
+
+    def load(self) -> Optional[Tuple[Dict[str, Any], Set[str]]]:
+        """中断された実行の計画と完了済み項目を返す（再開対象がなければNone）。"""
+        if not self.path.exists():
+            return None
+
+        plan: Optional[Dict[str, Any]] = None
+        done: Set[str] = set()
+        with self.path.open("r", encoding="utf-8") as fp:
+            for line in fp:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # 書き込み途中で停止した末尾行は読み飛ばす
+                    continue
+                kind = record.get("type")
+                if kind == "plan":
+                    plan = record.get("plan") or {}
+                    done = set()
+                elif kind == "done":
+                    done.add(record["key"])
+                elif kind == "finished":
+                    return None
+
+        if plan is None:
+            return None
+        return plan, done
+
+    def start(self, plan: Dict[str, Any]) -> None:
+        """新しい実行計画でジャーナルを作り直す。"""
+        self.close()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._fp = self.path.open("w", encoding="utf-8")
+        self._write({"type": "plan", "plan": plan})
+
+    def resume(self) -> None:
+        """既存ジャーナルへの追記を再開する。"""
+        self.close()
+        # 書き込み途中で停止した末尾行があれば改行で区切り、以降の記録と混ざらないようにする
+        partial = False
+        with self.path.open("rb") as fp:
+            if fp.seek(0, 2) > 0:
+                fp.seek(-1, 2)
+                partial = fp.read(1) != b"\n"
+        self._fp = self.path.open("a", encoding="utf-8")
+        if partial:
+            self._fp.write("\n")
+
+    def mark_done(self, key: str) -> None:
+        """項目の完了（DBコミット済み）を記録する。"""
+        self._write({"type": "done", "key": key})
+
+    def finish(self) -> None:
+        """正常終了を記録して閉じる。"""
+        self._write({"type": "finished"})
+        self.close()
+
+    def close(self) -> None:
+        if self._fp is not None:
+            self._fp.close()
+            self._fp = None
+
+    def _write(self, record: Dict[str, Any]) -> None:
+        if self._fp is None:
+            raise RuntimeError("ジャーナルが開かれていません。")
+        self._fp.write(json.dumps(record, ensure_ascii=False) + "\n")
+        # プロセス異常終了に備えて1行ごとにOSへ書き出す（fsyncはSDカード負荷のため行わない）
+        self._fp.flush()
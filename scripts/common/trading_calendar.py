@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""営業日カレンダーテーブル（trading_calendar）の生成用共通関数。
+
+trading_calendar は暦日1日1行で、営業日フラグと営業日通番
+（business_day_seq: その日までの営業日数）を持つ。営業日の移動・件数・
+欠損判定をSQLの結合で行うために使う。休場日は common.exchange_calendar の
+定義（EXTRA_HOLIDAYS_FILE を含む）から算出するため、テーブルが未作成または
+対象期間を網羅していない場合に同モジュールで算出しても結果は一致する。
+"""
+
+from __future__ import annotations
+
+from datetime import date, timedelta
+from typing import List, Tuple
+
+from common.exchange_calendar import get_exchange_calendar
+
+TRADING_CALENDAR_TABLE = "trading_calendar"
+# 書込先テーブルの列
+CALENDAR_COLUMNS = [
+    "cal_date",
+    "is_business_day",
+    "business_day_seq",
+    "prev_business_date",
+    "next_business_date",
+]
+
+
+def build_calendar_rows(start_date: date, end_date: date) -> List[Tuple]:
+    """start_date〜end_date（両端含む）の trading_calendar 行を返す。"""
+    # 期間端の前後営業日も求められるよう、前後に余裕を持つカレンダーを使う
+    calendar = get_exchange_calendar(
+        None, start_date - timedelta(days=31), end_date + timedelta(days=31)
+    )
+    rows: List[Tuple] = []
+    seq = 0
+    current = start_date
+    while current <= end_date:
+        is_business_day = calendar.is_business_day(current)
+        if is_business_day:
+            seq += 1
+        rows.append(
+            (
+                current,
+                1 if is_business_day else 0,
+                seq,
+                calendar.shift(current, -1),
+                calendar.shift(current, 1),
+            )
+        )
+        current += timedelta(days=1)
+    return rows
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""日足株価テーブルの欠損営業日を全銘柄まとめて検出する。"""
+
+import argparse
+from collections import Counter
+from datetime import date
+from pathlib import Path
+
+import numpy as np
+
+from common.db import get_connection
+from common.logger import get_logger
+from common.price_gaps import find_price_gaps, load_price_dates
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="取引所カレンダー上の営業日のうち、銘柄ごとに行が欠けている日を検出する。"
+    )
+    parser.add_argument(
+        "--codes",
+        default="",
+        help="銘柄コードをカンマ区切りで指定。省略時は全銘柄。",
+    )
+    parser.add_argument("--table", default="stock_prices_daily")
+    parser.add_argument(
+        "--start-date",
+        type=date.fromisoformat,
+        default=None,
+        help="検査開始日（YYYY-MM-DD）。省略時は全期間。",
+    )
+    parser.add_argument(
+        "--end-date",
+        type=date.fromisoformat,
+        default=None,
+        help="検査終了日（YYYY-MM-DD）。省略時は最新日まで。",
+    )
+    parser.add_argument(
+        "--top",
+        type=int,
+        default=20,
+        help="欠損営業日数の多い順に表示する銘柄数。",
+    )
+    parser.add_argument(
+        "--output",
+        default="",
+        help="欠損区間をTSV（code, start_date, end_date, missing_days）で保存するパス。",
+    )
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    logger = get_logger("detect_price_gaps")
+
+    codes = [code.strip() for code in args.codes.split(",") if code.strip()]
+    conn = get_connection()
+    try:
+        code_values, trade_dates = load_price_dates(
+            conn, args.table, codes or None, args.start_date, args.end_date
+        )
+    finally:
+        conn.close()
+
+    gaps = find_price_gaps(code_values, trade_dates)
+    missing_by_code: Counter = Counter()
+    for gap in gaps:
+        missing_by_code[gap.code] += gap.missing_days
+        logger.debug(
+            "%s 欠損: %s 〜 %s (%d営業日)",
+            gap.code,
+            gap.start_date,
+            gap.end_date,
+            gap.missing_days,
+        )
+
+    logger.info("検査行数: %d", len(trade_dates))
+    logger.info("検査銘柄数: %d", np.unique(code_values).size)
+    logger.info("欠損のある銘柄数: %d", len(missing_by_code))
+    logger.info("欠損区間数: %d", len(gaps))
+    logger.info("欠損営業日数: %d", sum(missing_by_code.values()))
+    for code, missing_days in missing_by_code.most_common(args.top):
+        logger.info("%s 欠損営業日数: %5d", code, missing_days)
+
+    if args.output:
+        output = Path(args.output)
+        output.parent.mkdir(parents=True, exist_ok=True)
+        with output.open("w", encoding="utf-8") as fp:
+            fp.write("code\tstart_date\tend_date\tmissing_days\n")
+            for gap in gaps:
+                fp.write(
+                    f"{gap.code}\t{gap.start_date}\t{gap.end_date}\t{gap.missing_days}\n"
+                )
+        logger.info("欠損区間を保存: %s", output)
+
+
+if __name__ == "__main__":
+    main()
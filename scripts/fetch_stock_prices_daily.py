@@ -2,21 +2,80 @@
 """日足株価を取得してMySQLに格納する。"""
 
 import argparse
+import json
+import queue
+import threading
 import time
-from datetime import datetime, timedelta, timezone
-from typing import Iterable, List, Optional, Tuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Set, Tuple
 
+import numpy as np
 import pymysql
 import requests
+from requests.adapters import HTTPAdapter
 
+from common.bulk_writer import BulkWriter
+from common.chart_cache import DEFAULT_CACHE_DIR, ChartPayloadCache
 from common.db import get_connection
+from common.exchange_calendar import (
+    calculate_exchange_business_days,
+    shift_exchange_business_day,
+)
+from common.load_control import LoadController
 from common.logger import get_logger
+from common.price_gaps import PriceGap, merge_price_gaps, scan_price_gaps
+from common.rate_limiter import TokenBucket
+from common.run_journal import RunJournal
 
 YAHOO_CHART_URL = "https://query1.finance.yahoo.com/v8/finance/chart/{symbol}"
+YAHOO_SPARK_URL = "https://query1.finance.yahoo.com/v7/finance/spark"
 DEFAULT_HEADERS = {
     "User-Agent": "Mozilla/5.0 (compatible; tradesystem-rpi/1.0)"
 }
 
+# 取得が途切れた際に書込ステージが溜まった行をコミットするまでの待ち時間（秒）
+WRITER_FLUSH_INTERVAL_SEC = 5.0
+
+# 失敗記録の理由（データなし応答）
+FAILURE_REASON_NO_DATA = "no-data"
+# 再試行間隔の上限（日数）
+QUARANTINE_MAX_DAYS = 64
+# 欠損補完で、間の取得済み営業日がこの日数以下の欠損区間は1回の取得にまとめる
+GAP_MERGE_DAYS = 20
+# 欠損補完で途中に行を追加した銘柄の、補完した最古の日以降の行を削除する指標テーブル
+# （指標は保存済みの最終行の状態から続きを計算するため、削除しないと補完分が反映されない）
+INDICATOR_TABLES = "stock_prices_daily_ma,stock_prices_daily_rsi,stock_prices_daily_macd"
+
+# 株価テーブルへ登録する列（重複行は無視する）
+PRICE_COLUMNS = ["trade_date", "code", "open", "high", "low", "close", "volume"]
+# 欠損判定の対象となる四本値・出来高の列
+QUOTE_COLUMNS = ("open", "high", "low", "close", "volume")
+
+
+class IngestTask(NamedTuple):
+    # 1銘柄分の取得計画
+    code: str
+    start_ts: int
+    end_ts: int
+    # 未取得の営業日数（既存データなしの場合はNone）
+    missing_days: Optional[int]
+
+
+# 取得結果（取得計画, 行, データなし応答か）
+FetchResult = Tuple[IngestTask, List[Tuple], bool]
+
+
+def task_key(task: IngestTask) -> str:
+    # ジャーナルの完了記録のキー（欠損補完では1銘柄に複数の計画があるため期間を含める）
+    return f"{task.code}:{task.start_ts}:{task.end_ts}"
+
+
+def remaining_tasks(planned: Iterable[Sequence], done_keys: Set[str]) -> List[IngestTask]:
+    # ジャーナルに記録した計画のうち、完了記録のない取得計画を返す
+    tasks = [IngestTask(*task) for task in planned]
+    return [task for task in tasks if task_key(task) not in done_keys]
+
 
 def parse_args() -> argparse.Namespace:
     # CLI引数を解析
@@ -29,6 +88,115 @@ def parse_args() -> argparse.Namespace:
         help="銘柄コードをカンマ区切りで指定。省略時はDBから取得。")
     parser.add_argument("--table", default="stock_prices_daily")
     parser.add_argument("--timeout", type=int, default=30)
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="同時に取得する銘柄数の上限（並列ワーカー数）。負荷に応じて1〜上限で増減する。",
+    )
+    parser.add_argument(
+        "--rate",
+        type=float,
+        default=5.0,
+        help="全ワーカー合計の最大リクエスト数/秒。0以下で制限なし。",
+    )
+    parser.add_argument(
+        "--burst",
+        type=float,
+        default=5.0,
+        help="レート制限のバースト許容量（リクエスト数）。",
+    )
+    parser.add_argument(
+        "--chart-url",
+        default=YAHOO_CHART_URL,
+        help="チャートAPIのURL（{symbol}を含む）。検証用スタブサーバーを指定する場合に使用。",
+    )
+    parser.add_argument(
+        "--spark-url",
+        default=YAHOO_SPARK_URL,
+        help="複数銘柄取得APIのURL。検証用スタブサーバーを指定する場合に使用。",
+    )
+    parser.add_argument(
+        "--batch-delta",
+        action="store_true",
+        help="直近数日分のみ不足している銘柄を複数銘柄まとめて取得する。",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=20,
+        help="差分取得で1リクエストにまとめる銘柄数。",
+    )
+    parser.add_argument(
+        "--delta-max-days",
+        type=int,
+        default=5,
+        help="差分取得の対象とする未取得営業日数の上限（超える銘柄は個別取得）。",
+    )
+    parser.add_argument(
+        "--insert-batch-rows",
+        type=int,
+        default=5000,
+        help="複数銘柄分をまとめて1回のINSERT・コミットで登録する行数。",
+    )
+    parser.add_argument(
+        "--queue-size",
+        type=int,
+        default=64,
+        help="取得ステージと書込ステージの間のキューに保持する銘柄数の上限。",
+    )
+    parser.add_argument(
+        "--cache",
+        action="store_true",
+        help="取得した生の応答JSONを圧縮してディスクにキャッシュする。",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        default=str(DEFAULT_CACHE_DIR),
+        help="応答キャッシュの保存先ディレクトリ。",
+    )
+    parser.add_argument(
+        "--replay-cache",
+        action="store_true",
+        help="通信を行わず、キャッシュ済みの応答のみからテーブルを再構築する。",
+    )
+    parser.add_argument(
+        "--failure-table",
+        default="stock_prices_daily_fetch_failures",
+        help="データなし応答が続く銘柄の失敗記録テーブル。",
+    )
+    parser.add_argument(
+        "--quarantine-report",
+        action="store_true",
+        help="再試行待ち（隔離中）の銘柄一覧を出力して終了する。",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="中断された前回実行のジャーナルから、未完了の銘柄だけを再開する。",
+    )
+    parser.add_argument(
+        "--backfill-gaps",
+        action="store_true",
+        help="最終日以降ではなく、既存データの途中で欠けている営業日の区間のみを取得する。",
+    )
+    parser.add_argument(
+        "--gap-start-date",
+        type=date.fromisoformat,
+        default=None,
+        help="欠損補完で検査する開始日（YYYY-MM-DD）。省略時は全期間。",
+    )
+    parser.add_argument(
+        "--gap-merge-days",
+        type=int,
+        default=GAP_MERGE_DAYS,
+        help="欠損補完で、間の取得済み営業日がこの日数以下の欠損区間を1回の取得にまとめる。",
+    )
+    parser.add_argument(
+        "--indicator-tables",
+        default=INDICATOR_TABLES,
+        help="欠損補完時に、補完した最古の日以降の行を削除して再計算させる指標テーブル（カンマ区切り）。",
+    )
     return parser.parse_args()
 
 
@@ -43,22 +211,66 @@ def resolve_codes(conn: pymysql.Connection, codes_arg: str) -> List[str]:
         return [row[0] for row in cursor.fetchall()]
 
 
-def resolve_start_timestamp(conn: pymysql.Connection, table: str, code: str) -> int:
-    # 既存データの最終日を起点に取得開始日時を求める
-    sql = f"SELECT MAX(trade_date) FROM `{table}` WHERE code = %s"
+def load_latest_trade_dates(conn: pymysql.Connection, table: str) -> Dict[str, date]:
+    # 全銘柄の既存データ最終日を1クエリでまとめて取得
+    sql = f"SELECT code, MAX(trade_date) FROM `{table}` GROUP BY code"
     with conn.cursor() as cursor:
-        cursor.execute(sql, (code,))
-        result = cursor.fetchone()
-        max_date = result[0] if result else None
+        cursor.execute(sql)
+        return {row[0]: row[1] for row in cursor.fetchall() if row[1] is not None}
+
+
+def to_start_timestamp(day: date) -> int:
+    # 日付をYahoo Financeのperiod指定用UNIX時刻（UTC 0時）に変換
+    return int(datetime.combine(day, datetime.min.time(), tzinfo=timezone.utc).timestamp())
+
+
+def plan_ingest(
+    codes: Iterable[str],
+    latest_dates: Dict[str, date],
+    today: date,
+    end_ts: int,
+) -> List[IngestTask]:
+    # 取引所カレンダー上で未取得の営業日がある銘柄だけを取得対象にする
+    # 当日分は取得期間外のため、前営業日までが揃っていれば取得済みとみなす
+    target_date = shift_exchange_business_day(today, -1)
+    tasks: List[IngestTask] = []
+    for code in codes:
+        max_date = latest_dates.get(code)
+        if max_date is None:
+            tasks.append(IngestTask(code, 0, end_ts, None))
+            continue
 
-    if max_date:
         # 既存データの翌日から取得して重複を避ける
         next_day = max_date + timedelta(days=1)
-        return int(
-            datetime.combine(next_day, datetime.min.time(), tzinfo=timezone.utc).timestamp()
+        missing = calculate_exchange_business_days(next_day, target_date)
+        if not missing:
+            continue
+        tasks.append(IngestTask(code, to_start_timestamp(next_day), end_ts, len(missing)))
+
+    return tasks
+
+
+def plan_backfill(gaps: Iterable[PriceGap]) -> List[IngestTask]:
+    # 欠損区間ごとに、区間の初日から最終日までだけを取得する計画を作る
+    return [
+        IngestTask(
+            gap.code,
+            to_start_timestamp(gap.start_date),
+            to_start_timestamp(gap.end_date + timedelta(days=1)),
+            gap.missing_days,
         )
+        for gap in gaps
+    ]
 
-    return 0
+
+def create_session(pool_size: int) -> requests.Session:
+    # 全ワーカーで共有するKeep-Alive接続プール付きセッションを作成
+    session = requests.Session()
+    session.headers.update(DEFAULT_HEADERS)
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(pool_size, 1))
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
 
 
 def to_yahoo_symbol(code: str) -> str:
@@ -66,97 +278,622 @@ def to_yahoo_symbol(code: str) -> str:
     return f"{code}.T"
 
 
-def fetch_prices(
-    code: str,
-    start_ts: int,
-    end_ts: int,
+def from_yahoo_symbol(symbol: str) -> str:
+    # Yahoo Financeのティッカーを銘柄コードに戻す
+    return symbol[:-2] if symbol.endswith(".T") else symbol
+
+
+def request_payload(
+    label: str,
+    url: str,
+    params: Dict,
     timeout: int,
     logger,
-) -> List[Tuple]:
-    # Yahoo Financeから日足データを取得して整形
-    params = {
-        "period1": start_ts,
-        "period2": end_ts,
-        "interval": "1d",
-        "events": "history",
-    }
-    url = YAHOO_CHART_URL.format(symbol=to_yahoo_symbol(code))
-    # 429/通信エラー時は指数バックオフで再試行し、失敗時は空配列を返す
+    session: Optional[requests.Session] = None,
+    limiter: Optional[TokenBucket] = None,
+) -> Optional[bytes]:
+    # Yahoo Financeの応答（生JSON）を取得する
+    # 429/通信エラー時は指数バックオフで再試行し、失敗時はNoneを返す
+    # 429はレート制限側で全ワーカーを待機させる
+    http = session if session is not None else requests
     retries = 3
     backoff_sec = 2
-    payload = None
     for attempt in range(1, retries + 1):
         try:
-            logger.debug("%s データ取得開始", code)
-            resp = requests.get(url, params=params, timeout=timeout, headers=DEFAULT_HEADERS)
+            if limiter is not None:
+                limiter.acquire()
+            logger.debug("%s データ取得開始", label)
+            resp = http.get(url, params=params, timeout=timeout, headers=DEFAULT_HEADERS)
             if resp.status_code == 429:
-                logger.warning("%s HTTP 429 取得制限のため再試行 (%s/%s)", code, attempt, retries)
+                logger.warning("%s HTTP 429 取得制限のため再試行 (%s/%s)", label, attempt, retries)
                 if attempt == retries:
                     resp.raise_for_status()
-                time.sleep(backoff_sec * attempt)
+                if limiter is not None:
+                    limiter.backoff(backoff_sec * attempt)
+                else:
+                    time.sleep(backoff_sec * attempt)
                 continue
 
-            logger.debug("%s データ取得完了（ステータスコード: %s）", code, resp.status_code)
+            logger.debug("%s データ取得完了（ステータスコード: %s）", label, resp.status_code)
+            if resp.status_code == 404:
+                # 上場廃止などでデータがない銘柄は再試行せず、応答本文で判定する
+                return resp.content
+            if 400 <= resp.status_code < 500:
+                logger.warning("%s HTTP %s のため取得中止", label, resp.status_code)
+                return None
             resp.raise_for_status()
-            payload = resp.json()
-            break
+            return resp.content
         except requests.RequestException:
-            logger.warning("%s 通信エラーのため再試行 (%s/%s)", code, attempt, retries)
+            logger.warning("%s 通信エラーのため再試行 (%s/%s)", label, attempt, retries)
             if attempt == retries:
-                return []
+                return None
             time.sleep(backoff_sec * attempt)
 
-    if payload is None:
-        return []
+    return None
 
+
+def request_chart_payload(
+    code: str,
+    params: Dict,
+    timeout: int,
+    logger,
+    session: Optional[requests.Session] = None,
+    limiter: Optional[TokenBucket] = None,
+    chart_url: str = YAHOO_CHART_URL,
+) -> Optional[bytes]:
+    # 1銘柄分のチャート応答（生JSON）を取得する
+    url = chart_url.format(symbol=to_yahoo_symbol(code))
+    return request_payload(code, url, params, timeout, logger, session, limiter)
+
+
+def chart_quote_arrays(payload: Dict) -> Optional[Dict[str, np.ndarray]]:
+    # チャート応答JSONの時刻・四本値・出来高を列ごとのNumPy配列に変換
     result = payload.get("chart", {}).get("result")
     if not result:
-        return []
+        return None
 
     data = result[0]
-    timestamps = data.get("timestamp") or []
     quote_list = data.get("indicators", {}).get("quote") or []
     if not quote_list:
-        return []
+        return None
 
     quote = quote_list[0]
-    opens = quote.get("open") or []
-    highs = quote.get("high") or []
-    lows = quote.get("low") or []
-    closes = quote.get("close") or []
-    volumes = quote.get("volume") or []
-
-    rows: List[Tuple] = []
-    for idx, ts in enumerate(timestamps):
-        trade_date = datetime.fromtimestamp(ts, tz=timezone.utc).date()
-        open_v = opens[idx] if idx < len(opens) else None
-        high_v = highs[idx] if idx < len(highs) else None
-        low_v = lows[idx] if idx < len(lows) else None
-        close_v = closes[idx] if idx < len(closes) else None
-        volume_v = volumes[idx] if idx < len(volumes) else None
-
-        if None in (open_v, high_v, low_v, close_v, volume_v):
+    columns = {
+        "timestamp": data.get("timestamp") or [],
+        "open": quote.get("open") or [],
+        "high": quote.get("high") or [],
+        "low": quote.get("low") or [],
+        "close": quote.get("close") or [],
+        "volume": quote.get("volume") or [],
+    }
+    # 配列長が揃わない場合は短い列に合わせる（範囲外は欠損扱い）
+    length = min(len(values) for values in columns.values())
+    # Noneはfloat変換でNaNになるため、欠損判定は isnan でまとめて行う
+    return {
+        name: np.array(values[:length], dtype=np.float64)
+        for name, values in columns.items()
+    }
+
+
+def parse_chart_payload(
+    code: str,
+    payload: Dict,
+    start_ts: Optional[int] = None,
+    end_ts: Optional[int] = None,
+) -> List[Tuple]:
+    # チャート応答JSONを登録用の行に整形（欠損のある足は除外）
+    # start_ts/end_ts を指定した場合は、その日（UTC）が取得期間 [start_ts, end_ts) 外の足も除外する
+    arrays = chart_quote_arrays(payload)
+    if arrays is None:
+        return []
+
+    stacked = np.vstack([arrays[name] for name in QUOTE_COLUMNS])
+    complete = ~np.isnan(arrays["timestamp"]) & ~np.isnan(stacked).any(axis=0)
+    if start_ts is not None and end_ts is not None:
+        # 複数銘柄APIの応答は期間が広く当日の途中足も含むため、日単位で期間を絞る
+        with np.errstate(invalid="ignore"):
+            days = np.floor(arrays["timestamp"] / 86400) * 86400
+            complete &= (days >= start_ts) & (days < end_ts)
+    if not complete.any():
+        return []
+
+    # UNIX時刻（UTC）を日付へ一括変換
+    trade_dates = (
+        arrays["timestamp"][complete]
+        .astype("int64")
+        .astype("datetime64[s]")
+        .astype("datetime64[D]")
+        .tolist()
+    )
+    opens, highs, lows, closes = (
+        arrays[name][complete].tolist() for name in ("open", "high", "low", "close")
+    )
+    volumes = arrays["volume"][complete].astype(np.int64).tolist()
+    codes = [code] * len(trade_dates)
+    return list(zip(trade_dates, codes, opens, highs, lows, closes, volumes))
+
+
+def load_chart_json(content: bytes) -> Optional[Dict]:
+    # 応答JSONを解析する（解析できなければNone）
+    try:
+        return json.loads(content)
+    except ValueError:
+        return None
+
+
+def fetch_prices(
+    code: str,
+    start_ts: int,
+    end_ts: int,
+    timeout: int,
+    logger,
+    session: Optional[requests.Session] = None,
+    limiter: Optional[TokenBucket] = None,
+    cache: Optional[ChartPayloadCache] = None,
+    chart_url: str = YAHOO_CHART_URL,
+) -> Optional[List[Tuple]]:
+    # Yahoo Financeから日足データを取得して整形
+    # 銘柄のデータ自体が存在しない応答（上場廃止など）はNone、通信失敗は空配列を返す
+    params = {
+        "period1": start_ts,
+        "period2": end_ts,
+        "interval": "1d",
+        "events": "history",
+    }
+    symbol = to_yahoo_symbol(code)
+    content = cache.get(symbol, start_ts, end_ts) if cache is not None else None
+    payload = load_chart_json(content) if content is not None else None
+    if payload is not None and payload.get("chart", {}).get("result"):
+        logger.debug("%s キャッシュから取得", code)
+    else:
+        # キャッシュがない、またはデータなし応答が残っている場合は通信で取得する
+        content = request_chart_payload(
+            code, params, timeout, logger, session, limiter, chart_url
+        )
+        if content is None:
+            return []
+        payload = load_chart_json(content)
+        if payload is None:
+            logger.warning("%s 応答JSONの解析に失敗", code)
+            return []
+        if not payload.get("chart", {}).get("result"):
+            # データなし応答はキャッシュせず、隔離期間後の再試行で状況を再確認する
+            logger.warning("%s データなし応答", code)
+            return None
+        if cache is not None:
+            # 行の整形処理を変更しても再取得不要なよう、整形前の応答を保存する
+            cache.put(symbol, start_ts, end_ts, content)
+
+    return parse_chart_payload(code, payload, start_ts, end_ts)
+
+
+def spark_range_for(missing_days: int) -> str:
+    # 未取得営業日数を含む最小の取得期間を返す
+    # 取引日の "5d" は当日の途中足を含み、期間で除外すると前日までは4営業日分になるため1日分余裕を持たせる
+    return "5d" if missing_days + 1 <= 5 else "1mo"
+
+
+def covers_period_start(chart_payload: Dict, start_ts: int) -> bool:
+    # 応答の足が取得期間の最初の営業日まで遡っているかを返す
+    # range指定の応答は長期休場をはさむと期間の先頭が欠けるため、欠けた銘柄は個別取得に回す
+    arrays = chart_quote_arrays(chart_payload)
+    if arrays is None:
+        return False
+    timestamps = arrays["timestamp"][~np.isnan(arrays["timestamp"])]
+    if timestamps.size == 0:
+        return False
+    start_date = datetime.fromtimestamp(start_ts, tz=timezone.utc).date()
+    business_days = calculate_exchange_business_days(
+        start_date, start_date + timedelta(days=31)
+    )
+    if not business_days:
+        return True
+    return timestamps.min() < to_start_timestamp(business_days[0]) + 86400
+
+
+def split_spark_payload(payload: Dict) -> Dict[str, Dict]:
+    # 複数銘柄の応答をシンボルごとのチャート応答と同じ形に分解する
+    output: Dict[str, Dict] = {}
+    for item in (payload.get("spark") or {}).get("result") or []:
+        symbol = item.get("symbol")
+        responses = item.get("response") or []
+        if symbol and responses:
+            output[symbol] = {"chart": {"result": [responses[0]], "error": None}}
+    return output
+
+
+def has_full_quote(chart_payload: Dict) -> bool:
+    # 四本値・出来高が全て揃った応答かどうか（終値のみの応答は個別取得に回す）
+    result = chart_payload["chart"]["result"][0]
+    quote_list = result.get("indicators", {}).get("quote") or []
+    if not quote_list:
+        return False
+    return all(quote_list[0].get(name) is not None for name in QUOTE_COLUMNS)
+
+
+def fetch_single(
+    task: IngestTask,
+    timeout: int,
+    logger,
+    session: Optional[requests.Session] = None,
+    limiter: Optional[TokenBucket] = None,
+    cache: Optional[ChartPayloadCache] = None,
+    chart_url: str = YAHOO_CHART_URL,
+    spark_url: str = YAHOO_SPARK_URL,
+) -> Tuple[List[FetchResult], List[IngestTask]]:
+    # 1銘柄を個別リクエストで取得する（戻り値は差分取得と同じ形）
+    rows = fetch_prices(
+        task.code,
+        task.start_ts,
+        task.end_ts,
+        timeout,
+        logger,
+        session=session,
+        limiter=limiter,
+        cache=cache,
+        chart_url=chart_url,
+    )
+    if rows is None:
+        return [(task, [], True)], []
+    return [(task, rows, False)], []
+
+
+def fetch_delta_batch(
+    tasks: List[IngestTask],
+    timeout: int,
+    logger,
+    session: Optional[requests.Session] = None,
+    limiter: Optional[TokenBucket] = None,
+    cache: Optional[ChartPayloadCache] = None,
+    chart_url: str = YAHOO_CHART_URL,
+    spark_url: str = YAHOO_SPARK_URL,
+) -> Tuple[List[FetchResult], List[IngestTask]]:
+    # 直近数日分だけ不足している銘柄を1リクエストでまとめて取得する
+    # 応答に含まれない・四本値が揃わない・取得期間の先頭まで遡らない銘柄は個別取得用に返す
+    symbols = [to_yahoo_symbol(task.code) for task in tasks]
+    params = {
+        "symbols": ",".join(symbols),
+        "range": spark_range_for(max(task.missing_days or 0 for task in tasks)),
+        "interval": "1d",
+    }
+    label = f"{tasks[0].code}..{tasks[-1].code}({len(tasks)}銘柄)"
+    content = request_payload(label, spark_url, params, timeout, logger, session, limiter)
+    if content is None:
+        return [], list(tasks)
+    try:
+        by_symbol = split_spark_payload(json.loads(content))
+    except ValueError:
+        logger.warning("%s 応答JSONの解析に失敗", label)
+        return [], list(tasks)
+
+    results: List[FetchResult] = []
+    fallback: List[IngestTask] = []
+    for task, symbol in zip(tasks, symbols):
+        chart_payload = by_symbol.get(symbol)
+        if (
+            chart_payload is None
+            or not has_full_quote(chart_payload)
+            or not covers_period_start(chart_payload, task.start_ts)
+        ):
+            fallback.append(task)
             continue
+        if cache is not None:
+            cache.put(
+                symbol,
+                task.start_ts,
+                task.end_ts,
+                json.dumps(chart_payload).encode("utf-8"),
+            )
+        # 取得期間（開始日〜前日）外の足は除外する
+        rows = parse_chart_payload(task.code, chart_payload, task.start_ts, task.end_ts)
+        results.append((task, rows, False))
 
-        rows.append((trade_date, code, open_v, high_v, low_v, close_v, volume_v))
+    if fallback:
+        logger.info("%s 個別取得へ切替: %s銘柄", label, len(fallback))
+    return results, fallback
 
-    return rows
+
+def split_delta_tasks(
+    tasks: List[IngestTask], max_days: int, batch_size: int
+) -> Tuple[List[IngestTask], List[List[IngestTask]]]:
+    # 不足が直近max_days営業日以内の銘柄を差分取得のバッチにまとめ、残りは個別取得とする
+    singles = [
+        task
+        for task in tasks
+        if task.missing_days is None or task.missing_days > max_days
+    ]
+    deltas = [
+        task
+        for task in tasks
+        if task.missing_days is not None and task.missing_days <= max_days
+    ]
+    batches = [deltas[idx:idx + batch_size] for idx in range(0, len(deltas), batch_size)]
+    return singles, batches
+
+
+def load_fetch_failures(
+    conn: pymysql.Connection, table: str
+) -> Dict[str, Tuple[int, date]]:
+    # データなし応答が続いている銘柄の失敗回数と次回再試行日を取得
+    sql = f"SELECT code, failure_count, next_retry_date FROM `{table}`"
+    with conn.cursor() as cursor:
+        cursor.execute(sql)
+        return {row[0]: (row[1], row[2]) for row in cursor.fetchall()}
+
+
+def record_failures(
+    conn: pymysql.Connection, table: str, codes: List[str], today: date
+) -> None:
+    # 失敗回数を加算し、次回再試行日を 2^(失敗回数-1) 日後（上限あり）に延ばす
+    # next_retry_date は更新前の failure_count を参照するため failure_count より先に代入する
+    sql = f"""
+    INSERT INTO `{table}`
+    (`code`, `failure_count`, `next_retry_date`, `last_reason`,
+     `first_failed_at`, `last_failed_at`)
+    VALUES (%s, 1, %s + INTERVAL 1 DAY, %s, NOW(), NOW())
+    ON DUPLICATE KEY UPDATE
+        `next_retry_date` = %s + INTERVAL LEAST(POW(2, `failure_count`), %s) DAY,
+        `failure_count` = `failure_count` + 1,
+        `last_reason` = VALUES(`last_reason`),
+        `last_failed_at` = NOW()
+    """
+    params = [
+        (code, today, FAILURE_REASON_NO_DATA, today, QUARANTINE_MAX_DAYS) for code in codes
+    ]
+    with conn.cursor() as cursor:
+        cursor.executemany(sql, params)
+
+
+def clear_failures(conn: pymysql.Connection, table: str, codes: List[str]) -> None:
+    # データを取得できた銘柄の失敗記録を削除
+    placeholders = ", ".join(["%s"] * len(codes))
+    sql = f"DELETE FROM `{table}` WHERE code IN ({placeholders})"
+    with conn.cursor() as cursor:
+        cursor.execute(sql, codes)
 
 
-def insert_rows(
-    conn: pymysql.Connection, table: str, rows: Iterable[Tuple]
+def invalidate_indicators(
+    conn: pymysql.Connection, tables: List[str], start_dates: Dict[str, date]
 ) -> int:
-    # 取得した行をDBへ一括登録（重複は無視）
+    # 銘柄ごとに補完した最古の取引日以降の指標行を削除し、次回の指標計算でその日から再計算させる
+    params = list(start_dates.items())
+    deleted = 0
+    with conn.cursor() as cursor:
+        for table in tables:
+            sql = f"DELETE FROM `{table}` WHERE code = %s AND trade_date >= %s"
+            deleted += cursor.executemany(sql, params) or 0
+    return deleted
+
+
+def report_quarantine(
+    conn: pymysql.Connection, table: str, today: date, logger
+) -> None:
+    # 再試行待ち（隔離中）の銘柄一覧を出力
     sql = f"""
-    INSERT IGNORE INTO `{table}`
-    (`trade_date`, `code`, `open`, `high`, `low`, `close`, `volume`)
-    VALUES (%s, %s, %s, %s, %s, %s, %s)
+    SELECT f.code, f.failure_count, f.next_retry_date, f.last_reason, f.last_failed_at
+    FROM `{table}` f
+    WHERE f.next_retry_date > %s
+    ORDER BY f.failure_count DESC, f.code
     """
     with conn.cursor() as cursor:
-        cursor.executemany(sql, list(rows))
-        inserted = cursor.rowcount
-    conn.commit()
-    return inserted
+        cursor.execute(sql, (today,))
+        rows = cursor.fetchall()
+
+    logger.info("隔離中の銘柄数: %s", len(rows))
+    for code, failure_count, next_retry_date, last_reason, last_failed_at in rows:
+        logger.info(
+            "%s 失敗回数: %3d 次回再試行日: %s 理由: %s 最終失敗: %s",
+            code,
+            failure_count,
+            next_retry_date,
+            last_reason,
+            last_failed_at,
+        )
+
+
+class RowWriter(threading.Thread):
+    """取得済みの行をキューから受け取り、複数銘柄分まとめてDBへ登録する書込ステージ。
+
+    pymysqlの executemany はINSERT文を複数行VALUESへ展開するため、
+    batch_rows 行ごとに大きな複数行INSERTと1回のコミットになる。
+    コミット後に含まれていた取得計画の完了をジャーナルへ記録する。
+    invalidate_tables を指定した場合（欠損補完）は、登録する行の銘柄ごとの
+    最古の取引日以降の指標行を同じトランザクションで削除する。
+    """
+
+    def __init__(
+        self,
+        table: str,
+        row_queue: "queue.Queue[Optional[FetchResult]]",
+        batch_rows: int,
+        flush_interval: float,
+        journal: RunJournal,
+        failure_table: str,
+        failed_codes: Set[str],
+        today: date,
+        logger,
+        invalidate_tables: Optional[List[str]] = None,
+    ) -> None:
+        super().__init__(name="row-writer", daemon=True)
+        self.table = table
+        self.failure_table = failure_table
+        self.failed_codes = failed_codes
+        self.today = today
+        self.row_queue = row_queue
+        self.batch_rows = batch_rows
+        self.flush_interval = flush_interval
+        self.journal = journal
+        self.logger = logger
+        self.invalidate_tables = invalidate_tables or []
+        self.total_rows = 0
+        self.inserted_rows = 0
+        self.invalidated_rows = 0
+        self.error: Optional[BaseException] = None
+        # 書込ステージが異常終了したことを取得ステージへ知らせる
+        self.failed = threading.Event()
+
+    def run(self) -> None:
+        try:
+            conn = get_connection()
+        except BaseException as exc:
+            self.error = exc
+            self.failed.set()
+            self._drain()
+            return
+
+        # コミットは銘柄の完了記録と揃えるため _flush で行う
+        bulk = BulkWriter(
+            conn, self.table, PRICE_COLUMNS, flush_rows=self.batch_rows, commit_rows=0
+        )
+        buffer: List[Tuple] = []
+        tasks: List[IngestTask] = []
+        no_data_codes: List[str] = []
+        try:
+            while True:
+                try:
+                    item = self.row_queue.get(timeout=self.flush_interval)
+                except queue.Empty:
+                    # 取得が滞っている間も完了済み分はコミットして進捗を残す
+                    self._flush(conn, bulk, buffer, tasks, no_data_codes)
+                    continue
+                if item is None:
+                    break
+                task, rows, no_data = item
+                buffer.extend(rows)
+                tasks.append(task)
+                if no_data:
+                    no_data_codes.append(task.code)
+                if len(buffer) >= self.batch_rows:
+                    self._flush(conn, bulk, buffer, tasks, no_data_codes)
+            self._flush(conn, bulk, buffer, tasks, no_data_codes)
+        except BaseException as exc:
+            self.error = exc
+            self.failed.set()
+            # 取得側がキュー待ちで止まらないよう、終了指示まで読み捨てる
+            self._drain()
+        finally:
+            conn.close()
+
+    def _drain(self) -> None:
+        while self.row_queue.get() is not None:
+            pass
+
+    def _flush(
+        self,
+        conn: pymysql.Connection,
+        bulk: BulkWriter,
+        buffer: List[Tuple],
+        tasks: List[IngestTask],
+        no_data_codes: List[str],
+    ) -> None:
+        if not tasks:
+            return
+        codes = [task.code for task in tasks]
+        # 失敗記録の更新は行の登録と同じトランザクションでコミットする
+        if no_data_codes:
+            record_failures(conn, self.failure_table, no_data_codes, self.today)
+        # 失敗記録を消すのは今回実際に行を取得できた銘柄のみ
+        # （通信エラー・5xxなどで行がないまま戻った銘柄は隔離を続ける）
+        fetched_codes = {row[1] for row in buffer}
+        recovered = sorted(fetched_codes & self.failed_codes)
+        if recovered:
+            clear_failures(conn, self.failure_table, recovered)
+            self.failed_codes.difference_update(recovered)
+        if self.invalidate_tables and buffer:
+            start_dates: Dict[str, date] = {}
+            for row in buffer:
+                trade_date, code = row[0], row[1]
+                if code not in start_dates or trade_date < start_dates[code]:
+                    start_dates[code] = trade_date
+            self.invalidated_rows += invalidate_indicators(
+                conn, self.invalidate_tables, start_dates
+            )
+        affected_before = bulk.affected_rows
+        bulk.add(buffer)
+        bulk.commit()
+        inserted = bulk.affected_rows - affected_before
+        self.total_rows += len(buffer)
+        self.inserted_rows += inserted
+        # コミット後に完了を記録し、再開時はこれらの取得計画を飛ばす
+        for task in tasks:
+            self.journal.mark_done(task_key(task))
+        self.logger.info(
+            "書込: %5d銘柄 取得レコード数 %6d / インサートレコード数 %6d",
+            len(set(codes)),
+            len(buffer),
+            inserted,
+        )
+        buffer.clear()
+        tasks.clear()
+        no_data_codes.clear()
+
+
+def produce(
+    fetch_func,
+    target,
+    row_queue: "queue.Queue[Optional[FetchResult]]",
+    controller: LoadController,
+    stop: threading.Event,
+    logger,
+    **fetch_options,
+) -> List[IngestTask]:
+    # 取得ステージ: 取得結果を書込キューへ渡し、個別取得が必要な銘柄を返す
+    # キューが満杯の間は待機し、書込が追いつくまで取得を抑える
+    # 書込ステージが停止した（stop が立った）後は取得もキュー投入も行わない
+    with controller.slot():
+        if stop.is_set():
+            return []
+        results, fallback = fetch_func(target, logger=logger, **fetch_options)
+    for result in results:
+        if stop.is_set():
+            return []
+        logger.info("%s 取得レコード数: %5d", result[0].code, len(result[1]))
+        row_queue.put(result)
+    return fallback
+
+
+def replay_cache(
+    conn: pymysql.Connection,
+    table: str,
+    cache: ChartPayloadCache,
+    codes_arg: str,
+    logger,
+) -> None:
+    # キャッシュ済みの応答だけでテーブルを再構築（重複は無視）
+    if codes_arg:
+        symbols = [to_yahoo_symbol(code) for code in resolve_codes(conn, codes_arg)]
+    else:
+        symbols = cache.symbols()
+
+    total_rows = 0
+    payload_count = 0
+    # 複数応答分をまとめて登録・コミットする
+    writer = BulkWriter(conn, table, PRICE_COLUMNS)
+    for symbol, period1, period2, content in cache.iter_entries(symbols):
+        code = from_yahoo_symbol(symbol)
+        try:
+            payload = json.loads(content)
+        except ValueError:
+            logger.warning("%s キャッシュJSONの解析に失敗 (%s-%s)", code, period1, period2)
+            continue
+        # 複数銘柄APIの応答は取得期間より広いため、キーの期間で絞ってから登録する
+        rows = parse_chart_payload(code, payload, period1, period2)
+        payload_count += 1
+        total_rows += len(rows)
+        writer.add(rows)
+        logger.info(
+            "%s キャッシュ再生 (%s-%s): 取得 %5d",
+            code,
+            period1,
+            period2,
+            len(rows),
+        )
+    writer.commit()
+
+    logger.info("対象銘柄数: %s", len(symbols))
+    logger.info("再生応答数: %s", payload_count)
+    logger.info("取得レコード数: %s", total_rows)
+    logger.info("インサートレコード数: %s", writer.affected_rows)
 
 
 def main() -> None:
@@ -169,34 +906,206 @@ def main() -> None:
         datetime.combine(today_jst, datetime.min.time(), tzinfo=jst).timestamp()
     )
 
+    if args.workers <= 0:
+        raise ValueError("--workers は1以上を指定してください。")
+    if args.batch_size <= 0:
+        raise ValueError("--batch-size は1以上を指定してください。")
+    if args.insert_batch_rows <= 0:
+        raise ValueError("--insert-batch-rows は1以上を指定してください。")
+    if args.queue_size <= 0:
+        raise ValueError("--queue-size は1以上を指定してください。")
+    if not 1 <= args.delta_max_days <= 20:
+        raise ValueError("--delta-max-days は1〜20で指定してください。")
+
+    if args.quarantine_report:
+        conn = get_connection()
+        try:
+            report_quarantine(conn, args.failure_table, today_jst, logger)
+        finally:
+            conn.close()
+        return
+
+    cache = ChartPayloadCache(args.cache_dir) if args.cache or args.replay_cache else None
+    if args.replay_cache:
+        conn = get_connection()
+        try:
+            replay_cache(conn, args.table, cache, args.codes, logger)
+        finally:
+            conn.close()
+        return
+
+    session = create_session(args.workers)
+    limiter = TokenBucket(args.rate, args.burst) if args.rate > 0 else None
+
+    # 欠損補完は通常の取得の再開情報を上書きしないよう別のジャーナルを使う
+    journal = RunJournal.for_script(
+        "fetch_stock_prices_daily_backfill"
+        if args.backfill_gaps
+        else "fetch_stock_prices_daily"
+    )
     conn = get_connection()
     try:
-        codes = resolve_codes(conn, args.codes)
-        total_codes = len(codes)
-        total_rows = 0
-        inserted_rows = 0
-
-        for code in codes:
-            start_ts = resolve_start_timestamp(conn, args.table, code)
-            if start_ts >= end_ts:
-                logger.info("%s データ取得済みのためスキップ", code)
-                continue
-            rows = fetch_prices(code, start_ts, end_ts, args.timeout, logger)
-            fetched_count = len(rows)
-            total_rows += fetched_count
-            if rows:
-                inserted = insert_rows(conn, args.table, rows)
+        failures = load_fetch_failures(conn, args.failure_table)
+        resumed = journal.load() if args.resume else None
+        if resumed is not None and resumed[0].get("table") != args.table:
+            logger.warning(
+                "ジャーナルの対象テーブルが異なるため再開しません: %s",
+                resumed[0].get("table"),
+            )
+            resumed = None
+
+        if resumed is not None:
+            # 中断時の計画をそのまま使い、完了済みの取得計画は再計画・再照会しない
+            plan, done_keys = resumed
+            total_codes = plan["total_codes"]
+            tasks = remaining_tasks(plan["tasks"], done_keys)
+            journal.resume()
+            logger.info(
+                "前回実行を再開: 残り取得数 %s (完了済み: %s)",
+                len(tasks),
+                len(plan["tasks"]) - len(tasks),
+            )
+        else:
+            codes = resolve_codes(conn, args.codes)
+            total_codes = len(codes)
+            if not args.codes:
+                # データなし応答が続く銘柄は再試行日まで取得対象から外す
+                quarantined = {
+                    code
+                    for code, (_, next_retry_date) in failures.items()
+                    if next_retry_date > today_jst
+                }
+                codes = [code for code in codes if code not in quarantined]
+                logger.info("隔離中のため除外した銘柄数: %s", total_codes - len(codes))
+            if args.backfill_gaps:
+                # 全銘柄の欠損区間を1回の読込で検出し、その区間だけを取得する
+                gaps = scan_price_gaps(
+                    conn,
+                    args.table,
+                    codes if args.codes else None,
+                    start_date=args.gap_start_date,
+                )
+                code_set = set(codes)
+                gaps = [gap for gap in gaps if gap.code in code_set]
+                tasks = plan_backfill(merge_price_gaps(gaps, args.gap_merge_days))
             else:
-                inserted = 0
-            inserted_rows += inserted
-            logger.info("%s 取得レコード数: %5d", code, fetched_count)
-            logger.info("%s インサートレコード数: %5d", code, inserted)
+                latest_dates = load_latest_trade_dates(conn, args.table)
+                tasks = plan_ingest(codes, latest_dates, today_jst, end_ts)
+            journal.start(
+                {
+                    "table": args.table,
+                    "total_codes": total_codes,
+                    "tasks": [list(task) for task in tasks],
+                }
+            )
+            if args.backfill_gaps:
+                logger.info(
+                    "欠損補完: 欠損区間数 %s / 取得リクエスト数 %s / 欠損営業日数 %s",
+                    len(gaps),
+                    len(tasks),
+                    sum(gap.missing_days for gap in gaps),
+                )
+            else:
+                logger.info(
+                    "取得対象銘柄数: %s (取得済みスキップ: %s)",
+                    len(tasks),
+                    len(codes) - len(tasks),
+                )
+
+        # 差分取得APIは直近の期間しか指定できないため、欠損補完では使わない
+        if args.batch_delta and not args.backfill_gaps:
+            singles, batches = split_delta_tasks(tasks, args.delta_max_days, args.batch_size)
+            logger.info("個別取得: %s銘柄 / 差分取得: %sバッチ", len(singles), len(batches))
+        else:
+            singles, batches = tasks, []
+
+        fetch_options = {
+            "timeout": args.timeout,
+            "session": session,
+            "limiter": limiter,
+            "cache": cache,
+            "chart_url": args.chart_url,
+            "spark_url": args.spark_url,
+        }
+
+        # 欠損補完で途中に追加した行は保存済み指標の続きからの計算に反映されないため、
+        # 書込時にその日以降の指標行を削除する
+        invalidate_tables = (
+            [table.strip() for table in args.indicator_tables.split(",") if table.strip()]
+            if args.backfill_gaps
+            else None
+        )
+
+        # 取得ステージ（ワーカースレッド）と書込ステージ（専用スレッド）を
+        # 上限付きキューでつなぎ、通信とDB登録を並行させる
+        row_queue: "queue.Queue[Optional[FetchResult]]" = queue.Queue(
+            maxsize=args.queue_size
+        )
+        writer = RowWriter(
+            args.table,
+            row_queue,
+            args.insert_batch_rows,
+            WRITER_FLUSH_INTERVAL_SEC,
+            journal,
+            args.failure_table,
+            set(failures),
+            today_jst,
+            logger,
+            invalidate_tables=invalidate_tables,
+        )
+        writer.start()
+        # DB・Webと同居するため、実際の同時取得数はシステム負荷に応じて調整する
+        controller = LoadController(args.workers, logger=logger)
+        try:
+            with ThreadPoolExecutor(max_workers=args.workers) as executor:
+                def submit(fetch_func, target):
+                    return executor.submit(
+                        produce,
+                        fetch_func,
+                        target,
+                        row_queue,
+                        controller,
+                        writer.failed,
+                        logger,
+                        **fetch_options,
+                    )
+
+                pending = {submit(fetch_single, task) for task in singles}
+                pending.update(submit(fetch_delta_batch, batch) for batch in batches)
+
+                while pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    if writer.failed.is_set():
+                        # 書込ステージが停止したため、未開始の取得を取り消して終了する
+                        for future in pending:
+                            future.cancel()
+                        break
+                    for future in done:
+                        # 差分取得で揃わなかった銘柄は個別取得に回す
+                        fallback = future.result()
+                        pending.update(submit(fetch_single, task) for task in fallback)
+        finally:
+            row_queue.put(None)
+            writer.join()
+
+        if writer.error is not None:
+            raise writer.error
+        total_rows = writer.total_rows
+        inserted_rows = writer.inserted_rows
 
+        journal.finish()
         logger.info("対象銘柄数: %s", total_codes)
         logger.info("取得レコード数: %s", total_rows)
         logger.info("インサートレコード数: %s", inserted_rows)
+        if args.backfill_gaps:
+            logger.info(
+                "無効化した指標レコード数: %s（calc_indicators.py で再計算してください）",
+                writer.invalidated_rows,
+            )
     finally:
+        journal.close()
         conn.close()
+        session.close()
 
 
 if __name__ == "__main__":
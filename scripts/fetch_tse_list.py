@@ -2,14 +2,18 @@
 """JPXの上場銘柄一覧を取得してMySQLに格納する。"""
 
 import argparse
+import hashlib
 import io
-from typing import List
+from pathlib import Path
+from typing import Dict, Optional, Sequence, Tuple
 
+import numpy as np
 import pandas as pd
 from pandas.api.types import is_datetime64_any_dtype, is_numeric_dtype
 import pymysql
 import requests
 
+from common.bulk_writer import BulkWriter
 from common.db import get_connection
 from common.logger import get_logger
 
@@ -24,6 +28,15 @@ ALLOWED_MARKETS = {
     "グロース（外国株式）",
 }
 
+# 前回取り込んだXLSのSHA-256を保存するファイル
+FINGERPRINT_PATH = (
+    Path(__file__).resolve().parents[1] / "cache" / "tse_list" / "data_j.xls.sha256"
+)
+# 1回の複数行INSERT（BulkWriter の flush_rows）で送る行数
+UPSERT_CHUNK_ROWS = 1000
+# 主キー列
+KEY_COLUMNS = ["listing_date", "code"]
+
 COLUMN_MAP = {
     "日付": "listing_date",
     "コード": "code",
@@ -43,15 +56,43 @@ def parse_args() -> argparse.Namespace:
         description="Fetch JPX listed stocks and store into MySQL."
     )
     parser.add_argument("--table", default="tse_listings")
+    parser.add_argument("--current-table", default="tse_listings_current")
     parser.add_argument("--timeout", type=int, default=30)
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="XLSが前回から変わっていなくてもDBと突き合わせて更新する。",
+    )
+    parser.add_argument(
+        "--rebuild-current",
+        action="store_true",
+        help="取得は行わず、既存の上場銘柄一覧から銘柄ごとの最新行を作り直す。",
+    )
     return parser.parse_args()
 
 
-def fetch_dataframe(timeout: int) -> pd.DataFrame:
+def download_xls(timeout: int) -> bytes:
     resp = requests.get(JPX_URL, timeout=timeout)
     resp.raise_for_status()
-    data = io.BytesIO(resp.content)
-    df = pd.read_excel(data)
+    return resp.content
+
+
+def load_file_fingerprint(path: Path = FINGERPRINT_PATH) -> Optional[str]:
+    try:
+        return path.read_text(encoding="ascii").strip() or None
+    except OSError:
+        return None
+
+
+def save_file_fingerprint(digest: str, path: Path = FINGERPRINT_PATH) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+    tmp_path.write_text(digest + "\n", encoding="ascii")
+    tmp_path.replace(path)
+
+
+def read_dataframe(content: bytes) -> pd.DataFrame:
+    df = pd.read_excel(io.BytesIO(content))
     # ヘッダの前後空白や全角スペースを除去して正規化する。
     df.columns = (
         df.columns.astype(str).str.replace("\u3000", " ").str.strip()
@@ -112,19 +153,131 @@ def normalize_dataframe(df: pd.DataFrame) -> pd.DataFrame:
 
 
 
+def row_fingerprints(df: pd.DataFrame, columns: Sequence[str]) -> pd.Series:
+    # 各行の値を文字列化して列単位でハッシュし、行ごとの指紋（uint64）を求める。
+    # 日付はDBから読んだ date 型と同じ "YYYY-MM-DD" 表現になる。
+    frame = df[list(columns)].astype("string").fillna("")
+    return pd.util.hash_pandas_object(frame, index=False)
+
+
+def fetch_existing_fingerprints(
+    conn: pymysql.Connection,
+    table: str,
+    columns: Sequence[str],
+    listing_dates: Sequence,
+) -> Dict[Tuple, int]:
+    # 取込対象の日付分だけ既存行を読み、主キー→行指紋の辞書を返す。
+    if not listing_dates:
+        return {}
+
+    cols_sql = ",".join([f"`{c}`" for c in columns])
+    placeholders = ",".join(["%s"] * len(listing_dates))
+    sql = f"SELECT {cols_sql} FROM `{table}` WHERE `listing_date` IN ({placeholders})"
+    with conn.cursor() as cursor:
+        cursor.execute(sql, list(listing_dates))
+        rows = cursor.fetchall()
+    if not rows:
+        return {}
+
+    existing = pd.DataFrame(list(rows), columns=list(columns))
+    fingerprints = row_fingerprints(existing, columns)
+    keys = zip(*(existing[c].tolist() for c in KEY_COLUMNS))
+    return dict(zip(keys, fingerprints.tolist()))
+
+
+def select_changed_rows(
+    df: pd.DataFrame, existing: Dict[Tuple, int]
+) -> Tuple[pd.DataFrame, int, int]:
+    # 追加行と内容が変わった行だけを返す（追加件数・変更件数も返す）。
+    if df.empty:
+        return df, 0, 0
+
+    fingerprints = row_fingerprints(df, df.columns).to_numpy()
+    keys = list(zip(*(df[c].tolist() for c in KEY_COLUMNS)))
+    previous = [existing.get(key) for key in keys]
+    is_new = np.fromiter((value is None for value in previous), dtype=bool, count=len(keys))
+    previous_values = np.fromiter(
+        (0 if value is None else value for value in previous),
+        dtype=np.uint64,
+        count=len(keys),
+    )
+    is_changed = ~is_new & (previous_values != fingerprints)
+    mask = is_new | is_changed
+    return df[mask], int(is_new.sum()), int(is_changed.sum())
+
+
 def upsert_rows(conn: pymysql.Connection, table: str, df: pd.DataFrame) -> int:
+    # コミットは呼び出し元で行う。
+    if df.empty:
+        return 0
+
     columns = list(df.columns)
-    placeholders = ",".join(["%s"] * len(columns))
-    cols_sql = ",".join([f"`{c}`" for c in columns])
+    writer = BulkWriter(
+        conn,
+        table,
+        columns,
+        [c for c in columns if c not in KEY_COLUMNS],
+        flush_rows=UPSERT_CHUNK_ROWS,
+        commit_rows=0,
+    )
+    # 行単位の走査を避け、列ごとにPythonリストへ変換してからタプルに組み直す。
+    writer.add(zip(*(df[c].tolist() for c in columns)))
+    writer.flush()
+    return writer.affected_rows
+
 
-    sql = f"""
-    INSERT IGNORE INTO `{table}` ({cols_sql})
-    VALUES ({placeholders})
-    """
+def upsert_current_rows(
+    conn: pymysql.Connection, table: str, df: pd.DataFrame
+) -> int:
+    # 銘柄ごとの最新行を更新する（既存より古い日付の行では上書きしない）。
+    # ON DUPLICATE KEY UPDATE は左から順に評価されるため listing_date を最後に更新する。
+    # コミットは呼び出し元で行う。
+    if df.empty:
+        return 0
 
-    values: List[tuple] = [tuple(row[c] for c in columns) for _, row in df.iterrows()]
+    columns = ["code", "listing_date"] + [
+        c for c in df.columns if c not in KEY_COLUMNS
+    ]
+    writer = BulkWriter(
+        conn,
+        table,
+        columns,
+        columns[2:] + ["listing_date"],
+        flush_rows=UPSERT_CHUNK_ROWS,
+        commit_rows=0,
+        update_condition="VALUES(`listing_date`) >= `listing_date`",
+    )
+    current_df = df[df["listing_date"].notna()]
+    writer.add(zip(*(current_df[c].tolist() for c in columns)))
+    writer.flush()
+    return writer.affected_rows
+
+
+def rebuild_current_table(
+    conn: pymysql.Connection, table: str, current_table: str
+) -> int:
+    # 上場銘柄一覧全体から銘柄ごとの最新行を作り直す。
+    columns = ["code", "listing_date"] + [
+        c for c in COLUMN_MAP.values() if c not in KEY_COLUMNS
+    ]
+    cols_sql = ",".join([f"`{c}`" for c in columns])
+    select_sql = ",".join([f"t.`{c}`" for c in columns])
     with conn.cursor() as cursor:
-        cursor.executemany(sql, values)
+        cursor.execute(f"DELETE FROM `{current_table}`")
+        cursor.execute(
+            f"""
+            INSERT INTO `{current_table}` ({cols_sql})
+            SELECT {select_sql}
+            FROM `{table}` t
+            JOIN (
+                SELECT code, MAX(listing_date) AS latest_listing_date
+                FROM `{table}`
+                GROUP BY code
+            ) latest
+              ON latest.code = t.code
+             AND latest.latest_listing_date = t.listing_date
+            """
+        )
         inserted = cursor.rowcount
     conn.commit()
     return inserted
@@ -133,7 +286,25 @@ def upsert_rows(conn: pymysql.Connection, table: str, df: pd.DataFrame) -> int:
 def main() -> None:
     args = parse_args()
     logger = get_logger("fetch_tse_list")
-    raw_df = fetch_dataframe(args.timeout)
+
+    if args.rebuild_current:
+        conn = get_connection()
+        try:
+            inserted = rebuild_current_table(conn, args.table, args.current_table)
+            logger.info("最新上場情報の再構築件数: %s", inserted)
+        finally:
+            conn.close()
+        return
+
+    content = download_xls(args.timeout)
+
+    # 前回取り込んだファイルと同一ならDBには接続しない。
+    digest = hashlib.sha256(content).hexdigest()
+    if not args.force and digest == load_file_fingerprint():
+        logger.info("XLSに変更がないため更新をスキップ: sha256=%s", digest)
+        return
+
+    raw_df = read_dataframe(content)
     total_count = len(raw_df)
     df = normalize_dataframe(raw_df)
     matched_count = len(df)
@@ -141,10 +312,29 @@ def main() -> None:
     conn = get_connection()
 
     try:
-        inserted = upsert_rows(conn, args.table, df)
+        listing_dates = sorted(
+            {value for value in df["listing_date"].tolist() if value is not None}
+        )
+        existing = fetch_existing_fingerprints(
+            conn, args.table, list(df.columns), listing_dates
+        )
+        changed_df, added_count, changed_count = select_changed_rows(df, existing)
+        # 一覧と最新上場情報は同じトランザクションでコミットする。
+        # 片方だけ反映された状態で終わると、次回は変更行として検出されず最新側に届かない。
+        try:
+            affected = upsert_rows(conn, args.table, changed_df)
+            current_affected = upsert_current_rows(conn, args.current_table, changed_df)
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        save_file_fingerprint(digest)
         logger.info("総レコード数: %s", total_count)
         logger.info("該当レコード数: %s", matched_count)
-        logger.info("インサートレコード数: %s", inserted)
+        logger.info("追加レコード数: %s", added_count)
+        logger.info("変更レコード数: %s", changed_count)
+        logger.info("更新レコード数(affected rows): %s", affected)
+        logger.info("最新上場情報の更新件数(affected rows): %s", current_affected)
     finally:
         conn.close()
 
@@ -0,0 +1,205 @@
+"""common.bulk_writer の投入方法間の一致と銘柄単位の書き直しのテスト。"""
+
+import re
+import sys
+import unittest
+from datetime import date
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from common.bulk_writer import BulkWriter, CodeBatchWriter  # noqa: E402
+
+COLUMNS = ["trade_date", "code", "value", "note"]
+UNESCAPE = {"\\\\": "\\", "\\t": "\t", "\\n": "\n", "\\r": "\r"}
+
+
+def text(value):
+    # 列の値をDBに格納された文字列表現としてそろえる
+    return None if value is None else str(value)
+
+
+class FakeTable:
+    """(trade_date, code) を主キーとする表と一時テーブルを模したDB。"""
+
+    def __init__(self, rows=()):
+        self.rows = {}
+        self.staging = []
+        self.uncommitted = None
+        for row in rows:
+            self.rows[tuple(text(v) for v in row[:2])] = [text(v) for v in row]
+
+    def upsert(self, row, sql):
+        row = [text(v) for v in row]
+        key = tuple(row[:2])
+        if key not in self.rows:
+            self.rows[key] = row
+            return 1
+        if "ON DUPLICATE KEY UPDATE" not in sql:
+            return 0
+        updated = self.rows[key]
+        for column in re.findall(r"`(\w+)` = ", sql.split("ON DUPLICATE KEY UPDATE")[1]):
+            updated[COLUMNS.index(column)] = row[COLUMNS.index(column)]
+        return 2
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.rowcount = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def executemany(self, sql, rows):
+        rows = list(rows)
+        if any("BAD" in str(row) for row in rows):
+            raise ValueError("bad row")
+        self.conn.statements.append(sql)
+        self.rowcount = sum(self.conn.table.upsert(row, sql) for row in rows)
+        return self.rowcount
+
+    def execute(self, sql, params=None):
+        self.conn.statements.append(sql)
+        table = self.conn.table
+        if sql.startswith("LOAD DATA"):
+            with open(params[0], encoding="utf-8") as fp:
+                rows = [self.parse(line) for line in fp.read().splitlines()]
+            if "IGNORE INTO" in sql:
+                return sum(table.upsert(row, sql) for row in rows)
+            table.staging.extend(rows)
+            return len(rows)
+        if sql.startswith("INSERT INTO") and "SELECT" in sql:
+            return sum(table.upsert(row, sql) for row in table.staging)
+        if sql.startswith("DELETE FROM"):
+            table.staging = []
+        return 0
+
+    @staticmethod
+    def parse(line):
+        values = []
+        for field in line.split("\t"):
+            if field == "\\N":
+                values.append(None)
+            else:
+                values.append(re.sub(r"\\[\\tnr]", lambda m: UNESCAPE[m.group(0)], field))
+        return values
+
+
+class FakeConnection:
+    def __init__(self, table):
+        self.table = table
+        self.statements = []
+        self.committed = None
+        self.commit_count = 0
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.commit_count += 1
+        self.committed = {key: list(row) for key, row in self.table.rows.items()}
+
+    def rollback(self):
+        if self.committed is not None:
+            self.table.rows = {key: list(row) for key, row in self.committed.items()}
+        self.table.staging = []
+
+
+EXISTING = [(date(2024, 3, 4), "7203", 1.5, "old")]
+ROWS = [
+    (date(2024, 3, 4), "7203", 2.5, "tab\there"),
+    (date(2024, 3, 5), "7203", float("nan"), "back\\slash"),
+    (date(2024, 3, 5), "1301", float("inf"), None),
+    (date(2024, 3, 6), "1301", 3.25, "line\nbreak"),
+]
+
+
+def write(load_data, update_columns):
+    conn = FakeConnection(FakeTable(EXISTING))
+    conn.commit()
+    writer = BulkWriter(
+        conn, "prices", COLUMNS, update_columns, flush_rows=3, load_data=load_data
+    )
+    writer.add(ROWS)
+    writer.commit()
+    return conn, writer
+
+
+class BulkWriterParityTest(unittest.TestCase):
+    def test_load_data_matches_insert_on_duplicate_update(self):
+        insert_conn, insert_writer = write(False, ["value", "note"])
+        load_conn, load_writer = write(True, ["value", "note"])
+        self.assertEqual(load_conn.table.rows, insert_conn.table.rows)
+        self.assertEqual(load_writer.affected_rows, insert_writer.affected_rows)
+        # NaN・±inf はどちらも NULL、既存行は更新される
+        self.assertEqual(insert_conn.table.rows[("2024-03-05", "7203")][2], None)
+        self.assertEqual(insert_conn.table.rows[("2024-03-05", "1301")][2], None)
+        self.assertEqual(insert_conn.table.rows[("2024-03-04", "7203")][3], "tab\there")
+
+    def test_load_data_ignore_matches_insert_ignore(self):
+        insert_conn, _ = write(False, None)
+        load_conn, _ = write(True, None)
+        self.assertEqual(load_conn.table.rows, insert_conn.table.rows)
+        self.assertEqual(insert_conn.table.rows[("2024-03-04", "7203")][3], "old")
+
+    def test_update_condition_wraps_every_update(self):
+        conn = FakeConnection(FakeTable())
+        writer = BulkWriter(
+            conn,
+            "prices",
+            COLUMNS,
+            ["value", "trade_date"],
+            update_condition="VALUES(`trade_date`) >= `trade_date`",
+        )
+        writer.add(ROWS[:1])
+        writer.flush()
+        self.assertIn(
+            "`value` = IF(VALUES(`trade_date`) >= `trade_date`, VALUES(`value`), `value`), "
+            "`trade_date` = IF(VALUES(`trade_date`) >= `trade_date`, "
+            "VALUES(`trade_date`), `trade_date`)",
+            conn.statements[-1],
+        )
+
+    def test_rollback_reverts_uncommitted_counts(self):
+        conn = FakeConnection(FakeTable())
+        writer = BulkWriter(conn, "prices", COLUMNS, commit_rows=0)
+        writer.add(ROWS[:2])
+        writer.commit()
+        writer.add(ROWS[2:])
+        writer.flush()
+        writer.rollback()
+        self.assertEqual((writer.written_rows, writer.affected_rows), (2, 2))
+        self.assertEqual(len(conn.table.rows), 2)
+
+
+class CodeBatchWriterTest(unittest.TestCase):
+    def test_failed_code_is_isolated(self):
+        conn = FakeConnection(FakeTable())
+        errors = []
+        writer = CodeBatchWriter(
+            conn,
+            "prices",
+            COLUMNS,
+            ["value"],
+            commit_rows=100,
+            on_error=lambda code, exc: errors.append(code),
+        )
+        writer.add("1301", [(date(2024, 3, 4), "1301", 1.0, "a")])
+        writer.add("6758", [(date(2024, 3, 4), "6758", 2.0, "BAD")])
+        writer.add("7203", [(date(2024, 3, 4), "7203", 3.0, "c")])
+        writer.commit()
+
+        self.assertEqual(writer.failed_codes, ["6758"])
+        self.assertEqual(errors, ["6758"])
+        self.assertEqual(
+            sorted(key[1] for key in conn.committed), ["1301", "7203"]
+        )
+        self.assertEqual(writer.affected_rows, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+"""common.exchange_calendar の配列APIとスカラーAPIの一致のテスト。"""
+
+import sys
+import unittest
+from datetime import date, timedelta
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from common.exchange_calendar import (  # noqa: E402
+    calculate_exchange_business_days,
+    count_exchange_business_days,
+    exchange_business_days_between,
+    is_exchange_business_day,
+    is_exchange_business_days,
+    is_exchange_holiday,
+    shift_exchange_business_day,
+    shift_exchange_business_days,
+)
+
+# 2019年のゴールデンウィーク（10連休）と年末年始を含む期間
+FIRST = date(2019, 4, 20)
+LAST = date(2020, 1, 10)
+
+
+def all_days(first=FIRST, last=LAST):
+    return [first + timedelta(days=n) for n in range((last - first).days + 1)]
+
+
+def walk(day, offset, extra_holidays=None):
+    # 1日ずつ進めて数える、コンパイル済みカレンダーを使わない参照実装
+    step = 1 if offset > 0 else -1
+    remaining = abs(offset)
+    while remaining:
+        day += timedelta(days=step)
+        if not is_exchange_holiday(day, extra_holidays):
+            remaining -= 1
+    return day
+
+
+class ScalarCalendarTest(unittest.TestCase):
+    def test_business_days_follow_holiday_definition(self):
+        expected = [day for day in all_days() if not is_exchange_holiday(day)]
+        self.assertEqual(calculate_exchange_business_days(FIRST, LAST), expected)
+        self.assertNotIn(date(2019, 5, 1), expected)
+        self.assertNotIn(date(2019, 12, 31), expected)
+
+    def test_shift_matches_walk(self):
+        for day in all_days(date(2019, 4, 25), date(2019, 5, 10)):
+            for offset in (-6, -1, 1, 6):
+                with self.subTest(day=day, offset=offset):
+                    self.assertEqual(shift_exchange_business_day(day, offset), walk(day, offset))
+
+
+class ArrayCalendarTest(unittest.TestCase):
+    def test_between_matches_scalar(self):
+        expected = np.array(calculate_exchange_business_days(FIRST, LAST), dtype="datetime64[D]")
+        np.testing.assert_array_equal(exchange_business_days_between(FIRST, LAST), expected)
+
+    def test_is_business_days_matches_scalar(self):
+        days = all_days()
+        np.testing.assert_array_equal(
+            is_exchange_business_days(days), [is_exchange_business_day(day) for day in days]
+        )
+
+    def test_shift_matches_scalar(self):
+        days = all_days()
+        for offset in (-25, -3, -1, 0, 1, 3, 25):
+            with self.subTest(offset=offset):
+                expected = [shift_exchange_business_day(day, offset) for day in days]
+                np.testing.assert_array_equal(
+                    shift_exchange_business_days(days, offset),
+                    np.array(expected, dtype="datetime64[D]"),
+                )
+
+    def test_count_matches_scalar(self):
+        starts = all_days()[::7]
+        ends = [start + timedelta(days=40) for start in starts]
+        expected = [len(calculate_exchange_business_days(s, e)) for s, e in zip(starts, ends)]
+        np.testing.assert_array_equal(count_exchange_business_days(starts, ends), expected)
+        # 開始日 > 終了日は0
+        self.assertEqual(count_exchange_business_days([LAST], [FIRST]).tolist(), [0])
+
+    def test_extra_holidays_apply_to_both(self):
+        extra = [date(2019, 6, 3)]
+        days = all_days(date(2019, 5, 27), date(2019, 6, 14))
+        np.testing.assert_array_equal(
+            is_exchange_business_days(days, extra),
+            [is_exchange_business_day(day, extra) for day in days],
+        )
+        self.assertEqual(
+            shift_exchange_business_days([date(2019, 5, 31)], 1, extra).tolist(),
+            [walk(date(2019, 5, 31), 1, extra)],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
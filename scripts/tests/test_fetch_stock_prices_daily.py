@@ -0,0 +1,180 @@
+"""fetch_stock_prices_daily の差分取得とキャッシュ再生のテスト。"""
+
+import json
+import logging
+import sys
+import tempfile
+import unittest
+from datetime import date, datetime, timezone
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import fetch_stock_prices_daily as fetch  # noqa: E402
+from common.chart_cache import ChartPayloadCache  # noqa: E402
+
+
+def utc_ts(day: date, hour: int = 0) -> int:
+    return int(datetime(day.year, day.month, day.day, hour, tzinfo=timezone.utc).timestamp())
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.rowcount = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        self.conn.statements.append((" ".join(sql.split()), params))
+        self.rowcount = 0
+
+    def executemany(self, sql, rows):
+        rows = list(rows)
+        self.conn.rows.extend(rows)
+        self.rowcount = len(rows)
+
+
+class FakeConnection:
+    def __init__(self):
+        self.rows = []
+        self.statements = []
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+def spark_payload(symbol: str, timestamps):
+    count = len(timestamps)
+    quote = {
+        "open": [100.0] * count,
+        "high": [110.0] * count,
+        "low": [90.0] * count,
+        "close": [105.0] * count,
+        "volume": [1000] * count,
+    }
+    return {
+        "spark": {
+            "result": [
+                {
+                    "symbol": symbol,
+                    "response": [
+                        {"timestamp": list(timestamps), "indicators": {"quote": [quote]}}
+                    ],
+                }
+            ]
+        }
+    }
+
+
+class ReplaySparkCacheTest(unittest.TestCase):
+    def test_replay_keeps_only_task_period(self):
+        logger = logging.getLogger("test")
+        # 2024-03-04〜03-06 が取得対象、当日は 03-07（JST 0時が period2）
+        start_ts = utc_ts(date(2024, 3, 4))
+        end_ts = utc_ts(date(2024, 3, 6), 15)
+        task = fetch.IngestTask("1301", start_ts, end_ts, 3)
+        # 応答は期間より広く、前週の足と当日の途中足を含む
+        bars = [
+            utc_ts(date(2024, 3, 1)),
+            utc_ts(date(2024, 3, 4)),
+            utc_ts(date(2024, 3, 5)),
+            utc_ts(date(2024, 3, 6)),
+            utc_ts(date(2024, 3, 7), 3),
+        ]
+        content = json.dumps(spark_payload("1301.T", bars)).encode("utf-8")
+
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = ChartPayloadCache(Path(tmp))
+            with mock.patch.object(fetch, "request_payload", return_value=content):
+                results, fallback = fetch.fetch_delta_batch([task], 10, logger, cache=cache)
+            self.assertEqual(fallback, [])
+            live_dates = [row[0] for row in results[0][1]]
+
+            conn = FakeConnection()
+            fetch.replay_cache(conn, "stock_prices_daily", cache, "", logger)
+
+        expected = [date(2024, 3, 4), date(2024, 3, 5), date(2024, 3, 6)]
+        self.assertEqual(live_dates, expected)
+        self.assertEqual([row[0] for row in conn.rows], expected)
+
+
+
+class DeltaCoverageTest(unittest.TestCase):
+    def setUp(self):
+        self.logger = logging.getLogger("test")
+
+    def fetch(self, task, bars):
+        content = json.dumps(spark_payload("1301.T", bars)).encode("utf-8")
+        with mock.patch.object(fetch, "request_payload", return_value=content):
+            return fetch.fetch_delta_batch([task], 10, self.logger)
+
+    def test_range_leaves_room_for_todays_partial_bar(self):
+        self.assertEqual(fetch.spark_range_for(4), "5d")
+        self.assertEqual(fetch.spark_range_for(5), "1mo")
+
+    def test_short_response_falls_back_to_single_fetch(self):
+        # 03-01〜03-07 の5営業日が未取得だが、応答は 03-04 からしかない
+        task = fetch.IngestTask("1301", utc_ts(date(2024, 3, 1)), utc_ts(date(2024, 3, 8)), 5)
+        bars = [utc_ts(date(2024, 3, day)) for day in (4, 5, 6, 7)] + [
+            utc_ts(date(2024, 3, 8), 3)
+        ]
+        results, fallback = self.fetch(task, bars)
+        self.assertEqual(results, [])
+        self.assertEqual(fallback, [task])
+
+    def test_holiday_before_first_bar_is_covered(self):
+        # 取得開始日 02-10（土）〜02-12（振替休日）の翌営業日 02-13 から足がある
+        task = fetch.IngestTask("1301", utc_ts(date(2024, 2, 10)), utc_ts(date(2024, 2, 15)), 2)
+        bars = [utc_ts(date(2024, 2, 13)), utc_ts(date(2024, 2, 14)), utc_ts(date(2024, 2, 15), 3)]
+        results, fallback = self.fetch(task, bars)
+        self.assertEqual(fallback, [])
+        self.assertEqual(
+            [row[0] for row in results[0][1]], [date(2024, 2, 13), date(2024, 2, 14)]
+        )
+
+
+
+class FailureRecoveryTest(unittest.TestCase):
+    def test_only_codes_with_rows_leave_quarantine(self):
+        # 1301 は再試行が通信エラーで行なし、7203 は行を取得できた
+        failed_codes = {"1301", "7203"}
+        journal = mock.Mock()
+        writer = fetch.RowWriter(
+            "stock_prices_daily",
+            None,
+            1000,
+            5.0,
+            journal,
+            "stock_prices_daily_fetch_failures",
+            failed_codes,
+            date(2024, 3, 7),
+            logging.getLogger("test"),
+        )
+        conn = FakeConnection()
+        bulk = fetch.BulkWriter(conn, "stock_prices_daily", fetch.PRICE_COLUMNS, commit_rows=0)
+        tasks = [
+            fetch.IngestTask("1301", 0, 1, 1),
+            fetch.IngestTask("7203", 0, 1, 1),
+        ]
+        row = (date(2024, 3, 6), "7203", 100.0, 110.0, 90.0, 105.0, 1000)
+        writer._flush(conn, bulk, [row], tasks, [])
+
+        deletes = [params for sql, params in conn.statements if sql.startswith("DELETE")]
+        self.assertEqual(deletes, [["7203"]])
+        self.assertEqual(failed_codes, {"1301"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,118 @@
+"""fetch_tse_list のファイル指紋と変更行検出のテスト。"""
+
+import sys
+import tempfile
+import unittest
+from datetime import date
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import fetch_tse_list  # noqa: E402
+
+
+def raw_frame(rows):
+    # JPXのXLSと同じ日本語ヘッダの表を作る
+    return pd.DataFrame(
+        rows,
+        columns=["日付", "コード", "銘柄名", "市場・商品区分", "33業種コード", "33業種区分"],
+    )
+
+
+class FakeCursor:
+    def __init__(self, rows):
+        self.rows = rows
+        self.params = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        self.params = params
+
+    def fetchall(self):
+        return self.rows
+
+
+class FakeConnection:
+    def __init__(self, rows):
+        self.cursor_obj = FakeCursor(rows)
+
+    def cursor(self):
+        return self.cursor_obj
+
+
+class FileFingerprintTest(unittest.TestCase):
+    def test_round_trip_and_missing_file(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "tse_list" / "data_j.xls.sha256"
+            self.assertIsNone(fetch_tse_list.load_file_fingerprint(path))
+            fetch_tse_list.save_file_fingerprint("abc123", path)
+            self.assertEqual(fetch_tse_list.load_file_fingerprint(path), "abc123")
+            self.assertFalse(path.with_suffix(path.suffix + ".tmp").exists())
+
+
+class SelectChangedRowsTest(unittest.TestCase):
+    def setUp(self):
+        self.df = fetch_tse_list.normalize_dataframe(
+            raw_frame(
+                [
+                    [20240329, 1301, "極洋", "プライム（内国株式）", "50", "水産・農林業"],
+                    [20240329, 7203, "トヨタ自動車", "プライム（内国株式）", "3700", "輸送用機器"],
+                    [20240329, 9999, "新規上場", "グロース（内国株式）", "9050", "サービス業"],
+                    [20240329, 1234, "ETF", "ETF・ETN", "-", "-"],
+                ]
+            )
+        )
+        self.columns = list(self.df.columns)
+        # DBから読んだ既存行（日付は date 型、コードは文字列）
+        self.db_rows = [
+            (date(2024, 3, 29), "1301", "極洋", "プライム（内国株式）", "50", "水産・農林業"),
+            (date(2024, 3, 29), "7203", "トヨタ", "プライム（内国株式）", "3700", "輸送用機器"),
+        ]
+
+    def existing(self):
+        conn = FakeConnection(self.db_rows)
+        existing = fetch_tse_list.fetch_existing_fingerprints(
+            conn, "tse_list", self.columns, [date(2024, 3, 29)]
+        )
+        self.assertEqual(conn.cursor_obj.params, [date(2024, 3, 29)])
+        return existing
+
+    def test_detects_new_and_changed_rows_only(self):
+        changed, added_count, changed_count = fetch_tse_list.select_changed_rows(
+            self.df, self.existing()
+        )
+        self.assertEqual(changed["code"].tolist(), ["7203", "9999"])
+        self.assertEqual((added_count, changed_count), (1, 1))
+
+    def test_unchanged_file_selects_nothing(self):
+        self.db_rows[1] = (
+            date(2024, 3, 29), "7203", "トヨタ自動車", "プライム（内国株式）", "3700", "輸送用機器"
+        )
+        self.db_rows.append(
+            (date(2024, 3, 29), "9999", "新規上場", "グロース（内国株式）", "9050", "サービス業")
+        )
+        changed, added_count, changed_count = fetch_tse_list.select_changed_rows(
+            self.df, self.existing()
+        )
+        self.assertTrue(changed.empty)
+        self.assertEqual((added_count, changed_count), (0, 0))
+
+    def test_empty_table_treats_every_row_as_new(self):
+        changed, added_count, changed_count = fetch_tse_list.select_changed_rows(
+            self.df, fetch_tse_list.fetch_existing_fingerprints(
+                FakeConnection([]), "tse_list", self.columns, []
+            )
+        )
+        self.assertEqual(len(changed), 3)
+        self.assertEqual((added_count, changed_count), (3, 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,112 @@
+"""common.indicators の配列カーネルと行ごとのループの一致のテスト。"""
+
+import math
+import random
+import sys
+import unittest
+from datetime import date, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from common.indicators import (  # noqa: E402
+    ALL_INDICATORS,
+    INDICATOR_MACD,
+    INDICATOR_MA,
+    INDICATOR_RSI,
+    CodePrices,
+    IndicatorOptions,
+    compute_code,
+    compute_panel,
+)
+
+START = date(2024, 1, 1)
+
+
+def price_rows(count, seed, null_every=0):
+    rng = random.Random(seed)
+    close = 1000.0
+    rows = []
+    for index in range(count):
+        close = max(1.0, close + rng.uniform(-20.0, 20.0))
+        value = None if null_every and index % null_every == null_every - 1 else round(close, 1)
+        rows.append((START + timedelta(days=index), value))
+    return rows
+
+
+class RowsAssertions(unittest.TestCase):
+    def assertRowsClose(self, actual, expected):
+        self.assertEqual(len(actual), len(expected))
+        for got, want in zip(actual, expected):
+            self.assertEqual(len(got), len(want))
+            for got_value, want_value in zip(got, want):
+                if isinstance(want_value, float):
+                    self.assertIsNotNone(got_value)
+                    self.assertTrue(
+                        math.isclose(got_value, want_value, rel_tol=1e-9, abs_tol=1e-9),
+                        f"{got} != {want}",
+                    )
+                else:
+                    self.assertEqual(got_value, want_value)
+
+
+class PanelMatchesLoopTest(RowsAssertions):
+    def test_panel_matches_row_loop(self):
+        options = IndicatorOptions()
+        long_rows = price_rows(120, seed=1, null_every=17)
+        batch = [
+            CodePrices("1301", [], None, None, None),
+            CodePrices("1332", price_rows(3, seed=2), None, None, None),
+            CodePrices("7203", long_rows, None, None, None),
+            # 保存済みの状態から続けて計算する銘柄
+            CodePrices(
+                "9984",
+                long_rows,
+                long_rows[80][0],
+                (long_rows[90][0], 8.5, 7.25, long_rows[90][1]),
+                (long_rows[70][0], 1010.0, 1005.0, 2.5),
+            ),
+            # 状態列がNULLのRSI保存済み行（書き直し対象）
+            CodePrices(
+                "6758",
+                price_rows(40, seed=3),
+                None,
+                (START + timedelta(days=20), None, None, None),
+                None,
+            ),
+        ]
+        for prices, panel_results in zip(batch, compute_panel(options, batch)):
+            loop_results = compute_code(options, prices)
+            for name in ALL_INDICATORS:
+                with self.subTest(code=prices.code, indicator=name):
+                    self.assertRowsClose(panel_results[name], loop_results[name])
+
+
+class IncrementalMatchesFullTest(RowsAssertions):
+    def test_resuming_from_saved_state_matches_full_recompute(self):
+        options = IndicatorOptions()
+        rows = price_rows(150, seed=4)
+        full = compute_code(options, CodePrices("7203", rows, None, None, None))
+
+        cut = 100
+        cut_date = rows[cut][0]
+        rsi_row = next(row for row in full[INDICATOR_RSI] if row[0] == cut_date)
+        macd_row = next(row for row in full[INDICATOR_MACD] if row[0] == cut_date)
+        resumed = CodePrices(
+            "7203",
+            # 移動平均は長期窓−1行前から読み込む
+            rows[cut - (options.ma_window_long - 1):],
+            cut_date,
+            (cut_date, rsi_row[4], rsi_row[5], rsi_row[6]),
+            (cut_date, macd_row[5], macd_row[6], macd_row[8]),
+        )
+        for compute in (compute_code, lambda o, p: compute_panel(o, [p])[0]):
+            results = compute(options, resumed)
+            for name in (INDICATOR_MA, INDICATOR_RSI, INDICATOR_MACD):
+                with self.subTest(indicator=name):
+                    expected = [row for row in full[name] if row[0] > cut_date]
+                    self.assertRowsClose(results[name], expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
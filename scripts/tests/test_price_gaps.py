@@ -0,0 +1,70 @@
+"""common.price_gaps の欠損区間検出のテスト。"""
+
+import sys
+import unittest
+from datetime import date
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from common.exchange_calendar import calculate_exchange_business_days  # noqa: E402
+from common.price_gaps import PriceGap, find_price_gaps, merge_price_gaps  # noqa: E402
+
+
+def price_dates(rows_by_code):
+    code_values = []
+    trade_dates = []
+    for code, days in rows_by_code.items():
+        code_values.extend([code] * len(days))
+        trade_dates.extend(days)
+    return np.array(code_values, dtype="U8"), np.array(trade_dates, dtype="datetime64[D]")
+
+
+class FindPriceGapsTest(unittest.TestCase):
+    def test_national_holiday_is_not_a_gap(self):
+        # 2024-02-12（振替休日）と 2024-02-23（天皇誕生日）は休場日で、Yahooにも足がない
+        days = calculate_exchange_business_days(date(2024, 2, 5), date(2024, 2, 29))
+        self.assertNotIn(date(2024, 2, 12), days)
+        self.assertNotIn(date(2024, 2, 23), days)
+        self.assertEqual(find_price_gaps(*price_dates({"1301": days})), [])
+
+    def test_finds_holes_across_holiday(self):
+        days = calculate_exchange_business_days(date(2024, 2, 5), date(2024, 2, 29))
+        # 休場日（2/12）をはさむ 2/9〜2/13 と、2/21〜2/22・2/27 を欠損させる
+        held = [
+            day
+            for day in days
+            if day not in (date(2024, 2, 9), date(2024, 2, 13))
+            and day not in (date(2024, 2, 21), date(2024, 2, 22), date(2024, 2, 27))
+        ]
+        gaps = find_price_gaps(*price_dates({"7203": held, "1301": days}))
+        self.assertEqual(
+            gaps,
+            [
+                PriceGap("7203", date(2024, 2, 9), date(2024, 2, 13), 2),
+                PriceGap("7203", date(2024, 2, 21), date(2024, 2, 22), 2),
+                PriceGap("7203", date(2024, 2, 27), date(2024, 2, 27), 1),
+            ],
+        )
+
+    def test_merge_counts_business_days_between(self):
+        gaps = [
+            PriceGap("7203", date(2024, 2, 9), date(2024, 2, 13), 2),
+            PriceGap("7203", date(2024, 2, 21), date(2024, 2, 22), 2),
+            PriceGap("7203", date(2024, 2, 27), date(2024, 2, 27), 1),
+        ]
+        # 2/22〜2/27 の間の取得済み営業日は 2/23（休場）を除いた 2/26 の1日
+        self.assertEqual(merge_price_gaps(gaps, 0), gaps)
+        self.assertEqual(
+            merge_price_gaps(gaps, 1),
+            [
+                PriceGap("7203", date(2024, 2, 9), date(2024, 2, 13), 2),
+                PriceGap("7203", date(2024, 2, 21), date(2024, 2, 27), 3),
+            ],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
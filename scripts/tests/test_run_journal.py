@@ -0,0 +1,109 @@
+"""common.run_journal と fetch_stock_prices_daily の再開処理のテスト。"""
+
+import logging
+import queue
+import sys
+import tempfile
+import unittest
+from datetime import date
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import fetch_stock_prices_daily as fetch  # noqa: E402
+from common.run_journal import RunJournal  # noqa: E402
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.rowcount = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        self.rowcount = 0
+
+    def executemany(self, sql, rows):
+        rows = list(rows)
+        self.conn.rows.extend(rows)
+        self.rowcount = len(rows)
+
+
+class FakeConnection:
+    def __init__(self):
+        self.rows = []
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+def price_row(day, code):
+    return (day, code, 100.0, 110.0, 90.0, 105.0, 1000)
+
+
+class RunJournalTest(unittest.TestCase):
+    def test_load_returns_plan_and_done_until_finished(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            journal = RunJournal(Path(tmp) / "job.journal")
+            self.assertIsNone(journal.load())
+            journal.start({"tasks": [1, 2]})
+            journal.mark_done("a")
+            journal.close()
+            with (Path(tmp) / "job.journal").open("a", encoding="utf-8") as fp:
+                # 書き込み途中で止まった末尾行は無視される
+                fp.write('{"type": "do')
+
+            self.assertEqual(journal.load(), ({"tasks": [1, 2]}, {"a"}))
+            journal.resume()
+            journal.finish()
+            self.assertIsNone(journal.load())
+
+
+class ResumeBackfillTest(unittest.TestCase):
+    def test_resume_keeps_remaining_gaps_of_same_code(self):
+        # 欠損補完では同じ銘柄に複数の取得計画がある
+        first = fetch.IngestTask("7203", 1000, 2000, 2)
+        second = fetch.IngestTask("7203", 5000, 6000, 1)
+        other = fetch.IngestTask("1301", 1000, 2000, 1)
+        tasks = [first, second, other]
+
+        with tempfile.TemporaryDirectory() as tmp:
+            journal = RunJournal(Path(tmp) / "backfill.journal")
+            journal.start({"tasks": [list(task) for task in tasks]})
+            conn = FakeConnection()
+            writer = fetch.RowWriter(
+                "stock_prices_daily",
+                queue.Queue(),
+                1000,
+                5.0,
+                journal,
+                "stock_prices_daily_fetch_failures",
+                set(),
+                date(2024, 3, 7),
+                logging.getLogger("test"),
+            )
+            bulk = fetch.BulkWriter(
+                conn, "stock_prices_daily", fetch.PRICE_COLUMNS, commit_rows=0
+            )
+            # 最初の区間だけをコミットした時点で中断する
+            writer._flush(conn, bulk, [price_row(date(2024, 3, 1), "7203")], [first], [])
+            journal.close()
+
+            plan, done_keys = journal.load()
+            remaining = fetch.remaining_tasks(plan["tasks"], done_keys)
+        self.assertEqual(remaining, [second, other])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""Yahoo Financeチャート互換のローカルスタブサーバー（性能検証用）。"""
+
+import argparse
+import json
+import random
+import threading
+import time
+import zlib
+from datetime import date, datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, NamedTuple
+from urllib.parse import parse_qs, urlparse
+
+CHART_PATH_PREFIX = "/v8/finance/chart/"
+SPARK_PATH = "/v7/finance/spark"
+# 複数銘柄取得APIの range 指定ごとの返却足数
+SPARK_RANGE_BARS = {"1d": 1, "5d": 5, "1mo": 22}
+
+
+class StubConfig(NamedTuple):
+    # 1リクエストあたりの応答遅延（ミリ秒）と揺らぎ幅
+    latency_ms: float
+    jitter_ms: float
+    # HTTP 429を返す確率（0.0〜1.0）
+    rate_429: float
+    # 1応答あたりの最大足数（period1=0の全期間取得時はこの本数を返す）
+    bars: int
+    # 複数銘柄取得APIで終値のみを返す（実APIの簡易応答の再現）
+    spark_close_only: bool = False
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Yahoo Financeチャート互換の合成データを返すスタブサーバーを起動する。"
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--rate-429", type=float, default=0.0)
+    parser.add_argument("--bars", type=int, default=250)
+    parser.add_argument("--spark-close-only", action="store_true")
+    return parser.parse_args()
+
+
+def business_days_between(start: date, end: date, limit: int) -> List[date]:
+    # 開始日〜終了日（終了日は含まない）の平日を末尾から最大limit件返す
+    days: List[date] = []
+    current = end - timedelta(days=1)
+    while current >= start and len(days) < limit:
+        if current.weekday() < 5:
+            days.append(current)
+        current -= timedelta(days=1)
+    days.reverse()
+    return days
+
+
+def build_chart_payload(symbol: str, period1: int, period2: int, bars: int) -> Dict:
+    # 銘柄ごとに再現性のある乱数で日足を合成し、チャートAPIと同じ形で返す
+    start = datetime.fromtimestamp(period1, tz=timezone.utc).date()
+    end = datetime.fromtimestamp(period2, tz=timezone.utc).date()
+    days = business_days_between(start, end, bars)
+
+    rng = random.Random(zlib.crc32(symbol.encode("utf-8")))
+    price = rng.uniform(100.0, 10000.0)
+    timestamps = []
+    opens = []
+    highs = []
+    lows = []
+    closes = []
+    volumes = []
+    for day in days:
+        open_v = price
+        close_v = max(1.0, open_v * (1.0 + rng.gauss(0.0, 0.02)))
+        timestamps.append(
+            int(datetime.combine(day, datetime.min.time(), tzinfo=timezone.utc).timestamp())
+        )
+        opens.append(round(open_v, 2))
+        highs.append(round(max(open_v, close_v) * (1.0 + rng.uniform(0.0, 0.01)), 2))
+        lows.append(round(min(open_v, close_v) * (1.0 - rng.uniform(0.0, 0.01)), 2))
+        closes.append(round(close_v, 2))
+        volumes.append(rng.randint(1000, 5000000))
+        price = close_v
+
+    return {
+        "chart": {
+            "result": [
+                {
+                    "meta": {"currency": "JPY", "symbol": symbol, "dataGranularity": "1d"},
+                    "timestamp": timestamps,
+                    "indicators": {
+                        "quote": [
+                            {
+                                "open": opens,
+                                "high": highs,
+                                "low": lows,
+                                "close": closes,
+                                "volume": volumes,
+                            }
+                        ]
+                    },
+                }
+            ],
+            "error": None,
+        }
+    }
+
+
+def build_spark_payload(symbols: List[str], range_text: str, close_only: bool) -> Dict:
+    # 複数銘柄取得APIと同じ形で、当日までの直近足をシンボルごとに返す
+    bars = SPARK_RANGE_BARS.get(range_text, 5)
+    tomorrow = datetime.now(tz=timezone.utc).date() + timedelta(days=1)
+    period2 = int(
+        datetime.combine(tomorrow, datetime.min.time(), tzinfo=timezone.utc).timestamp()
+    )
+    results = []
+    for symbol in symbols:
+        chart_result = build_chart_payload(symbol, 0, period2, bars)["chart"]["result"][0]
+        if close_only:
+            quote = chart_result["indicators"]["quote"][0]
+            chart_result["indicators"]["quote"] = [{"close": quote["close"]}]
+        results.append({"symbol": symbol, "response": [chart_result]})
+    return {"spark": {"result": results, "error": None}}
+
+
+def make_handler(config: StubConfig):
+    class ChartStubHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # Keep-Alive接続でヘッダと本文の2回の書込が遅延ACK待ち（約40ms）にならないようにする
+        disable_nagle_algorithm = True
+
+        def do_GET(self) -> None:
+            parsed = urlparse(self.path)
+            is_spark = parsed.path == SPARK_PATH
+            if not is_spark and not parsed.path.startswith(CHART_PATH_PREFIX):
+                self._send_json(404, {"chart": {"result": None, "error": {"code": "Not Found"}}})
+                return
+
+            delay_ms = config.latency_ms + random.uniform(0.0, config.jitter_ms)
+            if delay_ms > 0:
+                time.sleep(delay_ms / 1000.0)
+
+            if config.rate_429 > 0 and random.random() < config.rate_429:
+                self._send_json(429, {"finance": {"error": {"code": "Too Many Requests"}}})
+                return
+
+            query = parse_qs(parsed.query)
+            if is_spark:
+                symbols = [
+                    symbol for symbol in query.get("symbols", [""])[0].split(",") if symbol
+                ]
+                range_text = query.get("range", ["5d"])[0]
+                self._send_json(
+                    200, build_spark_payload(symbols, range_text, config.spark_close_only)
+                )
+                return
+
+            symbol = parsed.path[len(CHART_PATH_PREFIX):]
+            period1 = int(query.get("period1", ["0"])[0])
+            period2 = int(query.get("period2", [str(int(time.time()))])[0])
+            self._send_json(200, build_chart_payload(symbol, period1, period2, config.bars))
+
+        def _send_json(self, status: int, body: Dict) -> None:
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args) -> None:
+            # 大量アクセス時のログ出力で計測を歪めないよう抑止する
+            return
+
+    return ChartStubHandler
+
+
+def start_server(host: str, port: int, config: StubConfig) -> ThreadingHTTPServer:
+    # バックグラウンドスレッドでサーバーを起動する（port=0で空きポートを使用）
+    server = ThreadingHTTPServer((host, port), make_handler(config))
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def chart_url_for(server: ThreadingHTTPServer) -> str:
+    host, port = server.server_address[:2]
+    return f"http://{host}:{port}{CHART_PATH_PREFIX}{{symbol}}"
+
+
+def spark_url_for(server: ThreadingHTTPServer) -> str:
+    host, port = server.server_address[:2]
+    return f"http://{host}:{port}{SPARK_PATH}"
+
+
+def main() -> None:
+    args = parse_args()
+    config = StubConfig(
+        args.latency_ms, args.jitter_ms, args.rate_429, args.bars, args.spark_close_only
+    )
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(config))
+    server.daemon_threads = True
+    print(f"chart url: {chart_url_for(server)}")
+    print(f"spark url: {spark_url_for(server)}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()